@@ -1,10 +1,14 @@
 from __future__ import annotations
-from fastapi import Depends, HTTPException
+import json
+from typing import Tuple
+from fastapi import Depends, HTTPException, UploadFile
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.core.db import get_db
 from app.core.security import decode_token
+from app.core.settings import settings
 from app.models.models import User, Club, Subscription
+from app.services.storage import spool_to_storage, discard_tmp, UploadTooLarge
 
 oauth2 = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -27,3 +31,53 @@ def get_club_or_404(db: Session, club_id: str) -> Club:
 def get_club_plan(db: Session, club_id: str) -> str:
     sub = db.query(Subscription).filter(Subscription.club_id==club_id, Subscription.is_active==True).order_by(Subscription.created_at.desc()).first()
     return sub.plan if sub else "free"
+
+def spool_upload(file: UploadFile, min_bytes: int = 1, error: str = "Empty upload") -> Tuple[str, str, int]:
+    """Stream an upload into a storage temp file: ``(tmp_path, sha256, size)``.
+
+    Call from sync (threadpool) handlers so disk I/O never runs on the event loop.
+    """
+    try:
+        tmp, sha, size = spool_to_storage(file.file, max_bytes=settings.UPLOAD_MAX_MB * 1024 * 1024)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+    if size < min_bytes:
+        discard_tmp(tmp)
+        raise HTTPException(status_code=400, detail=error)
+    return tmp, sha, size
+
+# Multipart framing (boundaries, part headers) on top of the file itself.
+MULTIPART_OVERHEAD = 64 * 1024
+
+class UploadLimitMiddleware:
+    """Answer 413 to multipart bodies announced larger than UPLOAD_MAX_MB.
+
+    Starlette spools the whole form to disk before any handler runs, so the
+    check in spool_upload alone comes after the disk and I/O are spent. This
+    rejects on Content-Length before a byte of the body is read; chunked
+    bodies (no Content-Length) are still stopped by spool_upload. The proxy's
+    limit (nginx ``client_max_body_size``) should match UPLOAD_MAX_MB.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self._too_large(scope):
+            body = json.dumps({"detail": "File too large"}).encode()
+            await send({"type": "http.response.start", "status": 413, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), (b"connection", b"close")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _too_large(scope) -> bool:
+        headers = dict(scope.get("headers") or ())
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return False
+        try:
+            length = int(headers.get(b"content-length", b""))
+        except ValueError:
+            return False
+        return length > settings.UPLOAD_MAX_MB * 1024 * 1024 + MULTIPART_OVERHEAD
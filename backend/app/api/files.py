@@ -0,0 +1,115 @@
+from __future__ import annotations
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.core.settings import settings
+from app.services.storage import CHUNK_SIZE
+
+# Stored content never changes for a given id/hash, so clients may keep it forever.
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Return an inclusive (start, end) for a single byte range, or None to send everything.
+
+    Raises ValueError for a syntactically valid but unsatisfiable range.
+    """
+    m = _RANGE_RE.match(header.strip())
+    if not m:
+        # Multi-range or malformed: RFC 9110 allows ignoring it and sending 200.
+        return None
+    first, last = m.group(1), m.group(2)
+    if first == "" and last == "":
+        return None
+    if first == "":
+        n = int(last)
+        if n == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def serve_file(request: Request, path: str, etag_value: str, media_type: str | None = None, filename: str | None = None, cache_control: str = IMMUTABLE) -> Response:
+    """Serve a stored file with ETag/Last-Modified validation and single Range support.
+
+    With STORAGE_SERVE_MODE = "x-accel" or "x-sendfile" only the headers are
+    returned and the fronting proxy sends the bytes itself (sendfile).
+    """
+    st = os.stat(path)
+    etag = f'"{etag_value}"'
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(st.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+    if filename:
+        quoted = quote(filename)
+        if quoted != filename:
+            headers["content-disposition"] = f"attachment; filename*=utf-8''{quoted}"
+        else:
+            headers["content-disposition"] = f'attachment; filename="{filename}"'
+
+    inm = request.headers.get("if-none-match")
+    ims = request.headers.get("if-modified-since")
+    if (inm is not None and _etag_matches(inm, etag)) or (inm is None and ims and _not_modified_since(ims, st.st_mtime)):
+        return Response(status_code=304, headers=headers)
+
+    mode = (settings.STORAGE_SERVE_MODE or "direct").lower()
+    if mode in ("x-accel", "x-sendfile"):
+        # The proxy handles Range itself from the file it serves.
+        if mode == "x-accel":
+            rel = os.path.relpath(path, settings.STORAGE_LOCAL_DIR).replace(os.sep, "/")
+            headers["x-accel-redirect"] = settings.STORAGE_ACCEL_PREFIX.rstrip("/") + "/" + rel
+        else:
+            headers["x-sendfile"] = os.path.abspath(path)
+        return Response(status_code=200, headers=headers, media_type=media_type)
+
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if rng and (if_range is None or if_range.strip() == etag):
+        try:
+            span = _parse_range(rng, st.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{st.st_size}"})
+        if span is not None:
+            start, end = span
+            length = end - start + 1
+            headers["content-range"] = f"bytes {start}-{end}/{st.st_size}"
+            headers["content-length"] = str(length)
+            return StreamingResponse(_iter_file(path, start, length), status_code=206, headers=headers, media_type=media_type)
+
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=st)
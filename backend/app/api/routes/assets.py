@@ -1,38 +1,41 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from app.core.db import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, spool_upload
 from app.models.models import Club, Asset
-from app.services.storage import save_local_file, get_local_path
+from app.api.files import serve_file
+from app.services.renditions import enqueue_renditions, pick_rendition
+from app.services.storage import store_asset_file, get_local_path, presigned_url
 
 router = APIRouter(prefix="/api/assets", tags=["assets"])
 
 @router.post("/{club_id}")
-async def upload_asset(club_id: str, file: UploadFile = File(...), db: Session = Depends(get_db), user=Depends(get_current_user)):
+def upload_asset(club_id: str, file: UploadFile = File(...), db: Session = Depends(get_db), user=Depends(get_current_user)):
     club = db.get(Club, club_id)
     if not club or club.owner_id != user.id:
         raise HTTPException(status_code=404, detail="Club not found")
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty upload")
-    asset_id, _path = save_local_file(content, file.filename or "asset.bin")
-    # Store the logical storage key (asset_id). The storage service knows how to resolve it.
-    asset = Asset(
-        id=asset_id,
-        club_id=club.id,
-        filename=file.filename or "asset.bin",
-        mime=file.content_type or "application/octet-stream",
-        storage_path=asset_id,
-    )
-    db.add(asset); db.commit()
-    return {"id": asset_id, "url": f"/api/assets/file/{asset_id}", "filename": asset.filename, "mime": asset.mime}
+    tmp, sha, size = spool_upload(file)
+    # Identical bytes share one stored blob; every upload still gets its own Asset row.
+    asset = store_asset_file(db, tmp, sha, size, file.filename or "asset.bin", file.content_type or "application/octet-stream", club_id=club.id)
+    db.commit()
+    enqueue_renditions([asset.id])
+    return {"id": asset.id, "url": f"/api/assets/file/{asset.id}", "filename": asset.filename, "mime": asset.mime}
 
 @router.get("/file/{asset_id}")
-def get_asset_file(asset_id: str):
+def get_asset_file(asset_id: str, request: Request, w: int | None = None, db: Session = Depends(get_db)):
+    # ?w=<px>: smallest rendition whose longest side covers the requested width.
+    asset_id = pick_rendition(db, asset_id, w)
+    url = presigned_url(db, asset_id)
+    if url:
+        # Object storage serves the bytes; the API never proxies them.
+        return RedirectResponse(url, status_code=307)
     try:
-        path = get_local_path(asset_id)
+        path = get_local_path(asset_id, db)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Asset not found")
-    return FileResponse(path)
+    asset = db.get(Asset, asset_id)
+    # Content behind an asset id never changes: the blob hash (or the id) is a strong validator.
+    etag = (asset.content_hash if asset else None) or asset_id
+    return serve_file(request, path, etag, media_type=asset.mime if asset else None)
@@ -3,10 +3,11 @@ import time
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 from app.core.db import get_db
-from app.api.deps import get_current_user, get_club_plan
-from app.models.models import Club, Subscription, Asset
+from app.api.deps import get_current_user, get_club_plan, spool_upload
+from app.models.models import Club, Subscription
 from app.schemas.schemas import ClubCreate, ClubOut
-from app.services.storage import save_local_file
+from app.services.storage import store_asset_file
+from app.services.renditions import enqueue_renditions
 
 router = APIRouter(prefix="/api/clubs", tags=["clubs"])
 
@@ -35,18 +36,15 @@ def list_my_clubs(db: Session = Depends(get_db), user=Depends(get_current_user))
     return out
 
 @router.post("/{club_id}/locked-logo", response_model=ClubOut)
-async def upload_locked_logo(club_id: str, file: UploadFile = File(...), db: Session = Depends(get_db), user=Depends(get_current_user)):
+def upload_locked_logo(club_id: str, file: UploadFile = File(...), db: Session = Depends(get_db), user=Depends(get_current_user)):
     club = db.get(Club, club_id)
     if not club or club.owner_id != user.id:
         raise HTTPException(status_code=404, detail="Club not found")
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty upload")
-    asset_id, path = save_local_file(content, file.filename or "logo.png")
-    asset = Asset(id=asset_id, club_id=club.id, filename=file.filename or "logo.png", mime=file.content_type or "image/png", storage_path=path)
-    db.add(asset)
-    club.locked_logo_asset_id = asset_id
+    tmp, sha, size = spool_upload(file)
+    asset = store_asset_file(db, tmp, sha, size, file.filename or "logo.png", file.content_type or "image/png", club_id=club.id, kind="logo")
+    club.locked_logo_asset_id = asset.id
     db.commit(); db.refresh(club)
+    enqueue_renditions([asset.id])
     return ClubOut(id=club.id, name=club.name, sport=club.sport, language=club.language,
                    primary_color=club.primary_color, secondary_color=club.secondary_color,
                    font_primary=club.font_primary, font_secondary=club.font_secondary,
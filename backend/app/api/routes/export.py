@@ -1,21 +1,51 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
-from rq import Queue
-import redis
-
 from app.core.db import get_db
 from app.core.settings import settings
+from app.core.queue import cancel_requested, q, request_cancel
 from app.api.deps import get_current_user, get_club_plan, get_club_or_404
-from app.models.models import Project
-from app.schemas.schemas import ExportRequest
-from app.jobs import export_project_job
-from app.services.storage import get_local_path
+from app.models.models import Project, Asset
+from app.api.files import serve_file
+from app.schemas.schemas import BatchExportRequest, ExportRequest
+from app.jobs import export_batch_job, export_project_job
+from app.services.pdf_exporter import select_pages
+from app.services.export_cache import cached_export, coalesce_export, export_cache_key
+from app.services.storage import get_local_path, presigned_url
 
 router = APIRouter(prefix="/api/export", tags=["export"])
-redis_conn = redis.from_url(settings.REDIS_URL)
-q = Queue("default", connection=redis_conn)
+
+# Cache hits get a synthetic job id ("cached-<export asset id>") that
+# /job/{job_id} reports as finished, so clients keep polling one way.
+CACHED_JOB_PREFIX = "cached-"
+
+# Declared before "/{project_id}" so "batch" is not taken for a project id.
+@router.post("/batch")
+def export_batch(payload: BatchExportRequest, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    club = get_club_or_404(db, payload.club_id)
+    if club.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    query = db.query(Project.id).filter(Project.club_id == club.id)
+    if payload.project_ids is not None:
+        query = query.filter(Project.id.in_(payload.project_ids))
+    found = {pid for (pid,) in query}
+    if payload.project_ids is not None:
+        missing = [pid for pid in payload.project_ids if pid not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Project not found: {missing[0]}")
+        ids = list(dict.fromkeys(payload.project_ids))
+    else:
+        ids = [pid for (pid,) in db.query(Project.id).filter(Project.club_id == club.id).order_by(Project.created_at)]
+    if not ids:
+        raise HTTPException(status_code=400, detail="No projects to export")
+    plan = get_club_plan(db, club.id)
+    watermark = plan != "pro"
+    body = payload.model_dump(exclude={"club_id", "project_ids", "pages", "spread"})
+    body["watermark"] = watermark
+    job = q.enqueue(export_batch_job, club.id, ids, body, settings.DATABASE_URL, job_timeout=300 * len(ids), meta={"club_id": club.id})
+    return {"job_id": job.get_id(), "projects": len(ids), "watermark": watermark, "plan": plan}
 
 @router.post("/{project_id}")
 def export_project(project_id: str, payload: ExportRequest, db: Session = Depends(get_db), user=Depends(get_current_user)):
@@ -30,19 +60,59 @@ def export_project(project_id: str, payload: ExportRequest, db: Session = Depend
     # allow demo export with watermark for free (conversion-friendly)
     body = payload.model_dump()
     body["watermark"] = watermark
-    job = q.enqueue(export_project_job, proj.id, club.id, body, settings.DATABASE_URL, job_timeout=300)
-    return {"job_id": job.get_id(), "watermark": watermark, "plan": plan}
+    if body.get("pages") or body.get("spread"):
+        try:
+            select_pages(len(json.loads(proj.document_json).get("pages") or []), body.get("pages"), body.get("spread"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    key = export_cache_key(proj.document_json, club.locked_logo_asset_id, body, club.font_primary)
+    cached = cached_export(db, key)
+    if cached:
+        return {"job_id": CACHED_JOB_PREFIX + cached, "status": "finished", "export_asset_id": cached, "cached": True, "watermark": watermark, "plan": plan}
+    body["cache_key"] = key
+    job_id, started = coalesce_export(key, lambda jid: q.enqueue(export_project_job, proj.id, club.id, body, settings.DATABASE_URL, job_timeout=300, job_id=jid, meta={"club_id": club.id}))
+    return {"job_id": job_id, "coalesced": not started, "watermark": watermark, "plan": plan}
+
+def _job_progress(job) -> dict:
+    meta = job.meta or {}
+    return {k: meta[k] for k in ("progress", "pages_done", "pages_total") if k in meta}
 
 @router.get("/job/{job_id}")
 def export_status(job_id: str):
+    if job_id.startswith(CACHED_JOB_PREFIX):
+        return {"status": "finished", "progress": 100, "ok": True, "export_asset_id": job_id[len(CACHED_JOB_PREFIX):], "cached": True}
     job = q.fetch_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     if job.is_failed:
         return {"status":"failed", "error": str(job.exc_info)}
+    if job.is_canceled or (job.is_finished and (job.result or {}).get("cancelled")):
+        return {"status":"cancelled", **_job_progress(job)}
     if job.is_finished:
-        return {"status":"finished", **(job.result or {})}
-    return {"status":"queued"}
+        return {"status":"finished", "progress": 100, **(job.result or {})}
+    if job.is_started:
+        status = "cancelling" if cancel_requested(job.id) else "running"
+        return {"status": status, "progress": 0, **_job_progress(job)}
+    return {"status":"queued", "progress": 0}
+
+@router.post("/job/{job_id}/cancel")
+def cancel_export(job_id: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Queued jobs are dropped; running ones stop before their next page."""
+    if job_id.startswith(CACHED_JOB_PREFIX):
+        return export_status(job_id)
+    job = q.fetch_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    club = get_club_or_404(db, (job.meta or {}).get("club_id") or job.args[1])
+    if club.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if job.is_finished or job.is_failed or job.is_canceled:
+        return export_status(job_id)
+    request_cancel(job.id)
+    if not job.is_started:
+        job.cancel()
+        return {"status": "cancelled"}
+    return {"status": "cancelling", **_job_progress(job)}
 
 
 # Backwards-compatible alias (older frontend builds polled /status/{job_id})
@@ -51,9 +121,17 @@ def export_status_alias(job_id: str):
     return export_status(job_id)
 
 @router.get("/download/{asset_id}")
-def download_export(asset_id: str):
+def download_export(asset_id: str, request: Request, db: Session = Depends(get_db)):
+    asset = db.get(Asset, asset_id)
+    # Batch exports can be a ZIP of PDFs.
+    is_zip = bool(asset and asset.mime == "application/zip")
+    filename = "revistas.zip" if is_zip else "revista.pdf"
+    url = presigned_url(db, asset_id, filename=filename)
+    if url:
+        return RedirectResponse(url, status_code=307)
     try:
-        path = get_local_path(asset_id)
+        path = get_local_path(asset_id, db)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(path, media_type="application/pdf", filename="revista.pdf")
+    etag = (asset.content_hash if asset else None) or asset_id
+    return serve_file(request, path, etag, media_type="application/zip" if is_zip else "application/pdf", filename=filename, cache_control="private, max-age=31536000, immutable")
@@ -1,25 +1,61 @@
 from __future__ import annotations
-import json
+import fitz
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from rq import Retry
 from sqlalchemy.orm import Session
 from app.core.db import get_db
-from app.api.deps import get_current_user, get_club_or_404
-from app.models.models import Project
-from app.services.pdf_importer import import_pdf_to_document
+from app.core.queue import q
+from app.core.settings import settings
+from app.api.deps import get_current_user, get_club_or_404, spool_upload
+from app.jobs import import_pdf_job
+from app.services.pdf_importer import IMPORT_MODES
+from app.services.storage import discard_tmp, store_asset_file
 
 router = APIRouter(prefix="/api/import", tags=["import"])
 
+# Worker time budget per page (rasterizing + extraction), on top of a fixed minimum.
+IMPORT_SECONDS_PER_PAGE = 10
+
 @router.post("/{club_id}")
-async def import_pdf(club_id: str, mode: str="safe", preset: str="smart", file: UploadFile = File(...), db: Session = Depends(get_db), user=Depends(get_current_user)):
+def import_pdf(club_id: str, mode: str="safe", preset: str="smart", file: UploadFile = File(...), db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Queue the import; poll /api/import/job/{job_id} for progress and the new project id."""
     club = get_club_or_404(db, club_id)
     if club.owner_id != user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
     if not (file.filename or "").lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF supported")
-    pdf_bytes = await file.read()
-    if not pdf_bytes or len(pdf_bytes) < 500:
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+    tmp, sha, size = spool_upload(file, min_bytes=500, error="Invalid PDF")
+    try:
+        with fitz.open(tmp, filetype="pdf") as pdf:
+            pages = pdf.page_count
+    except Exception:
+        discard_tmp(tmp)
         raise HTTPException(status_code=400, detail="Invalid PDF")
-    document, _assets = import_pdf_to_document(pdf_bytes, mode=mode, preset=preset)
-    proj = Project(club_id=club_id, name=f"Importado - {file.filename}", template_id="import_pdf", document_json=json.dumps(document, ensure_ascii=False))
-    db.add(proj); db.commit(); db.refresh(proj)
-    return {"project_id": proj.id, "pages": len(document.get("pages", [])), "mode": mode, "preset": preset}
+    # Stored like any upload so the worker can fetch it (also from S3); the job deletes it when done.
+    source = store_asset_file(db, tmp, sha, size, file.filename, "application/pdf", club_id=club.id, kind="import_source")
+    db.commit()
+    # Retried jobs (including ones abandoned by a crashed worker) resume from their checkpoints.
+    job = q.enqueue(import_pdf_job, club.id, source.id, file.filename, mode, preset, settings.DATABASE_URL,
+                    job_timeout=max(600, IMPORT_SECONDS_PER_PAGE * pages), retry=Retry(max=2), meta={"club_id": club.id})
+    return {"job_id": job.get_id(), "status": "queued", "pages": pages, "mode": mode, "preset": preset}
+
+@router.get("/job/{job_id}")
+def import_status(job_id: str):
+    job = q.fetch_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    meta = job.meta or {}
+    progress = {k: meta[k] for k in ("progress", "pages_done", "pages_total") if k in meta}
+    if job.is_failed:
+        return {"status":"failed", "error": str(job.exc_info)}
+    if job.is_finished:
+        result = job.result or {}
+        if not result.get("ok"):
+            return {"status":"failed", "error": result.get("error")}
+        return {"status":"finished", "progress": 100, **result}
+    if job.is_started:
+        return {"status":"running", "progress": 0, **progress}
+    # Queued, or waiting to be retried after a failure (progress kept from the last attempt).
+    return {"status":"queued", "progress": 0, **progress}
@@ -3,12 +3,15 @@ import json, time, uuid
 from fastapi import APIRouter, Depends, HTTPException
 from importlib import import_module
 from fastapi.responses import Response
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageOps
 from sqlalchemy.orm import Session
 from app.core.db import get_db
 from app.api.deps import get_current_user
 from app.models.models import Template, Asset
 from app.schemas.schemas import TemplateOut, TemplateGenerateRequest
+from app.services.document_model import IMAGE, SHAPE, TEXT, Document, load_compiled
+from app.services.renditions import rendition_map
+from app.services.storage import resolve_many
 # NOTE:
 # We intentionally avoid importing the template generator at module import time.
 # If the generator module has any runtime error or is partially upgraded, a top-level
@@ -29,7 +32,11 @@ def _get_generate_fn():
 router = APIRouter(prefix="/api/templates", tags=["templates"])
 
 
-def _render_template_thumbnail(document: dict, db: Session, size: int = 320, page_index: int = 0) -> bytes:
+def _rgba8(c) -> tuple:
+    return tuple(int(round(v * 255)) for v in c)
+
+
+def _render_template_thumbnail(document: Document, db: Session, size: int = 320, page_index: int = 0) -> bytes:
     """Render rápido (no perfecto) de la 1ª página como PNG.
 
     - Sirve para que el usuario elija plantilla por 'look & feel' sin abrirla.
@@ -48,7 +55,7 @@ def _render_template_thumbnail(document: dict, db: Session, size: int = 320, pag
     # page
     draw.rounded_rectangle((0, 0, w, h), radius=14, fill=(255, 255, 255, 255), outline=(220, 225, 235, 255), width=2)
 
-    pages = document.get("pages") or []
+    pages = document.pages
     if not pages:
         import io
         out = Image.new("RGBA", (w, h), (255, 255, 255, 255))
@@ -56,12 +63,8 @@ def _render_template_thumbnail(document: dict, db: Session, size: int = 320, pag
         out.save(buf, format="PNG", optimize=True)
         return buf.getvalue()
     page = pages[max(0, min(int(page_index), len(pages) - 1))]
-    layers = page.get("layers") or []
-    items = []
-    for layer in layers:
-        if layer.get("visible") is False:
-            continue
-        items.extend(layer.get("items") or [])
+    # Hidden layers and the imported PDF background (blank as a thumbnail) are skipped.
+    items = [it for it in page.items if it.visible and it.role != "pdf_background"]
 
     # simple font
     try:
@@ -69,47 +72,50 @@ def _render_template_thumbnail(document: dict, db: Session, size: int = 320, pag
     except Exception:
         font = None
 
+    # Only the 256px "thumb" renditions are drawn; originals are never decoded here.
+    refs = [it.asset_ref for it in items if it.kind == IMAGE and it.asset_ref]
+    thumbs = rendition_map(db, refs, "thumb")
+    thumb_paths = resolve_many(db, thumbs.values()) if thumbs else {}
+
     for it in items:
-        r = (it.get("rect") or {})
-        x = int(r.get("x", 0) * scale)
-        y = int(r.get("y", 0) * scale)
-        rw = int(r.get("w", 0) * scale)
-        rh = int(r.get("h", 0) * scale)
+        x = int(it.x * scale)
+        y = int(it.y * scale)
+        rw = int(it.w * scale)
+        rh = int(it.h * scale)
         if rw <= 0 or rh <= 0:
             continue
-        t = it.get("type")
 
-        # Avoid showing PDF background as a giant image (it would be blank anyway).
-        if it.get("role") == "pdf_background":
-            continue
-
-        if t == "Shape":
-            fill = it.get("fill") or "#eef2ff"
-            # crude hex parsing
-            try:
-                if isinstance(fill, str) and fill.startswith("#") and len(fill) in (7, 9):
-                    rr = int(fill[1:3], 16)
-                    gg = int(fill[3:5], 16)
-                    bb = int(fill[5:7], 16)
-                    col = (rr, gg, bb, 255)
-                else:
-                    col = (238, 242, 255, 255)
-            except Exception:
-                col = (238, 242, 255, 255)
-            draw.rounded_rectangle((x, y, x + rw, y + rh), radius=10, fill=col, outline=(210, 215, 225, 255), width=1)
-
-        elif t in ("ImageFrame", "LockedLogoStamp"):
+        if it.kind == SHAPE:
+            col = _rgba8(it.fill) if it.fill else (238, 242, 255, 255)
+            box = (x, y, x + rw, y + rh)
+            if col[3] < 255:
+                # Translucent fill (rgba(), #rrggbbaa, opacity): blend over what is below.
+                layer = Image.new("RGBA", im.size, (0, 0, 0, 0))
+                ImageDraw.Draw(layer).rounded_rectangle(box, radius=10, fill=col, outline=(210, 215, 225, 255), width=1)
+                im.alpha_composite(layer)
+            else:
+                draw.rounded_rectangle(box, radius=10, fill=col, outline=(210, 215, 225, 255), width=1)
+
+        elif it.kind == IMAGE:
+            thumb = thumb_paths.get(thumbs.get(it.asset_ref or "", ""))
+            if thumb:
+                try:
+                    with Image.open(thumb) as src:
+                        im.paste(ImageOps.fit(src.convert("RGBA"), (rw, rh)), (x, y))
+                    continue
+                except Exception:
+                    pass
             draw.rounded_rectangle((x, y, x + rw, y + rh), radius=10, fill=(240, 243, 248, 255), outline=(210, 215, 225, 255), width=1)
             # cross
             draw.line((x + 6, y + 6, x + rw - 6, y + rh - 6), fill=(200, 205, 215, 255), width=2)
             draw.line((x + rw - 6, y + 6, x + 6, y + rh - 6), fill=(200, 205, 215, 255), width=2)
 
-        elif t == "TextFrame":
+        elif it.kind == TEXT:
             draw.rounded_rectangle((x, y, x + rw, y + rh), radius=10, fill=(255, 255, 255, 0), outline=(210, 215, 225, 255), width=1)
-            txt = "".join([(run.get("text") or "") for run in (it.get("richTextRuns") or [])]).strip()
+            txt = it.text
             if txt:
                 sample = (txt[:60] + "…") if len(txt) > 60 else txt
-                draw.text((x + 8, y + 8), sample, fill=(30, 35, 45, 255), font=font)
+                draw.text((x + 8, y + 8), sample, fill=_rgba8(it.color), font=font)
             else:
                 # placeholder lines
                 for k in range(3):
@@ -130,10 +136,8 @@ def get_template_thumbnail(template_id: str, size: int = 320, page: int = 0, db:
     t = db.get(Template, template_id)
     if not t:
         raise HTTPException(status_code=404, detail="Template not found")
-    try:
-        doc = json.loads(t.document_json)
-    except Exception:
-        doc = {}
+    # Compiled once per template version and reused for every size/page request.
+    doc = load_compiled(t.document_json)
     png = _render_template_thumbnail(doc, db, size=max(200, min(int(size), 720)), page_index=page)
     return Response(content=png, media_type="image/png")
 
@@ -0,0 +1,16 @@
+from __future__ import annotations
+import redis
+from rq import Queue
+from app.core.settings import settings
+
+redis_conn = redis.from_url(settings.REDIS_URL)
+q = Queue("default", connection=redis_conn)
+
+# Cooperative cancellation: the API raises the flag, long jobs poll it between units of work.
+CANCEL_TTL = 24 * 3600
+
+def request_cancel(job_id: str) -> None:
+    redis_conn.set(f"job:cancel:{job_id}", 1, ex=CANCEL_TTL)
+
+def cancel_requested(job_id: str) -> bool:
+    return bool(redis_conn.exists(f"job:cancel:{job_id}"))
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.core.db import Base
+from app.models import models  # noqa: F401  (registers the tables on Base)
+
+# create_all() only creates missing tables; columns added to existing tables
+# after the first release are added here. Every step is idempotent, so this
+# runs on each API start and as the first step of scripts/migrate_storage.py.
+_ASSET_COLUMNS = (
+    ("content_hash", "VARCHAR(64) REFERENCES blobs (sha256)"),
+    ("kind", "VARCHAR(16) NOT NULL DEFAULT 'upload'"),
+    ("parent_id", "VARCHAR(64)"),
+    ("rendition", "VARCHAR(16)"),
+    ("width", "INTEGER"),
+    ("height", "INTEGER"),
+)
+_ASSET_INDEXES = ("content_hash", "kind", "parent_id")
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """Create missing tables and add missing ``assets`` columns; returns the columns added."""
+    Base.metadata.create_all(bind=engine)
+    have = {c["name"] for c in inspect(engine).get_columns("assets")}
+    added: List[str] = []
+    with engine.begin() as conn:
+        for name, ddl in _ASSET_COLUMNS:
+            if name not in have:
+                conn.execute(text(f"ALTER TABLE assets ADD COLUMN {name} {ddl}"))
+                added.append(name)
+        if "kind" in added:
+            # Catalog rows predate 'kind'; everything else is treated as an upload.
+            conn.execute(text("UPDATE assets SET kind = 'catalog' WHERE is_catalog"))
+        for name in _ASSET_INDEXES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_assets_{name} ON assets ({name})"))
+    return added
@@ -10,5 +10,42 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://redis:6379/0"
     STORAGE_MODE: str = "local"
     STORAGE_LOCAL_DIR: str = "./data/storage"
+    UPLOAD_MAX_MB: int = 300
+    # "direct" streams from the app; "x-accel" (nginx) / "x-sendfile" hand the file to the proxy.
+    STORAGE_SERVE_MODE: str = "direct"
+    STORAGE_ACCEL_PREFIX: str = "/_storage/"
+    # STORAGE_MODE=s3: any S3-compatible endpoint (AWS, MinIO).
+    S3_BUCKET: str = "magazine"
+    S3_PREFIX: str = ""
+    S3_REGION: str = "us-east-1"
+    S3_ENDPOINT_URL: str = ""
+    S3_PUBLIC_ENDPOINT_URL: str = ""
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    S3_PRESIGN_SECONDS: int = 3600
+    STORAGE_CACHE_DIR: str = "./data/cache"
+    STORAGE_CACHE_MB: int = 2048
+    EXPORT_IMAGE_CACHE_MB: int = 1024
+    # Processes used to render one export (export_project_job payload "parallelism" overrides).
+    EXPORT_PARALLELISM: int = 1
+    # Processes used to extract pages of one imported PDF (0 = one per CPU core).
+    # Each RQ worker runs its own pool: raise it only with spare cores per worker.
+    IMPORT_PARALLELISM: int = 1
+    # Imported page backgrounds: resolution (long side capped in px) and the
+    # lossy format/quality used for photographic pages ("jpeg" or "webp").
+    IMPORT_RASTER_DPI: int = 150
+    IMPORT_RASTER_MAX_PX: int = 2480
+    IMPORT_PHOTO_FORMAT: str = "jpeg"
+    IMPORT_PHOTO_QUALITY: int = 82
+    # TTF/OTF files used by the exporter for document font families (os.pathsep-separated).
+    FONT_DIRS: str = "./fonts:/usr/share/fonts"
+    # Font bytes the RQ worker reads up front, before forking jobs (the index is always built).
+    FONT_PRELOAD_MB: int = 64
+    # Storage garbage collection (scripts/gc_storage.py / app.jobs.storage_gc_job)
+    GC_BATCH_SIZE: int = 500
+    GC_MIN_AGE_HOURS: int = 24
+    EXPORT_TTL_HOURS: int = 72
+    # Cached page fragments (incremental export) unused for this long are removed.
+    FRAGMENT_TTL_HOURS: int = 336
 
 settings = Settings()
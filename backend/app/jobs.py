@@ -1,35 +1,269 @@
 from __future__ import annotations
 import json
-from typing import Dict, Any
+import os
+import re
+import zipfile
+from contextlib import ExitStack
+from functools import partial
+from typing import Dict, Any, Iterable, Set
+import fitz
+from rq import get_current_job
 from sqlalchemy.orm import Session
-from app.models.models import Project, Club
-from app.services.pdf_exporter import export_document_to_pdf
-from app.services.storage import get_local_path, save_local_file
+from app.core.queue import cancel_requested
+from app.core.settings import settings
+from app.models.models import Project, Club, Asset
+from app.services.pdf_exporter import ExportCancelled, export_document_to_file, select_pages
+from app.services.storage import delete_asset, discard_tmp, get_local_path, hash_file, new_tmp_path, pinned_local_path, resolve_many, store_asset_file
+from app.services.storage_gc import GCAlreadyRunning, collect_garbage, gc_lock
+from app.services.document_model import Document, Page, load_compiled
+from app.services.export_cache import PageFragmentCache, cached_export, export_cache_key, remember_export
+from app.services.renditions import enqueue_renditions, generate_renditions, rendition_map
+from app.services.pdf_importer import import_pdf_to_document
+from app.services import import_checkpoint
 
-def resolve_asset_path(asset_id: str) -> str:
-    return get_local_path(asset_id)
+def collect_asset_refs(pages: Iterable[Page]) -> Set[str]:
+    refs: Set[str] = set()
+    for page in pages:
+        refs |= page.asset_refs
+    return refs
 
-def export_project_job(project_id: str, club_id: str, payload: Dict[str, Any], db_url: str):
+def make_resolver(db: Session, asset_ids: Iterable[str], rendition: str | None = None):
+    """Resolve every asset used by a document with one indexed query up front.
+
+    With ``rendition`` (e.g. "screen" for web exports) ids are swapped for that
+    rendition when one exists, so the exporter never decodes huge originals.
+    """
+    asset_ids = list(asset_ids)
+    swap = rendition_map(db, asset_ids, rendition) if rendition else {}
+    resolved = resolve_many(db, [swap.get(a, a) for a in asset_ids])
+    paths = {a: resolved[swap.get(a, a)] for a in asset_ids if swap.get(a, a) in resolved}
+    def _resolve(asset_id: str) -> str | None:
+        p = paths.get(asset_id)
+        if p is None:
+            try:
+                p = get_local_path(asset_id, db)
+            except FileNotFoundError:
+                return None
+            paths[asset_id] = p
+        return p
+    return _resolve
+
+def export_parallelism(payload: Dict[str, Any]) -> int:
+    n = int(payload.get("parallelism") or settings.EXPORT_PARALLELISM or 1)
+    return max(1, min(n, os.cpu_count() or 1))
+
+class JobProgress:
+    """Publishes page progress of the current RQ job into job.meta (no-op outside a worker)."""
+
+    def __init__(self, total: int):
+        self.job = get_current_job()
+        self.total = max(1, total)
+        self.done = 0
+        self._published = -1
+        self.publish()
+
+    def __call__(self, pages: int) -> None:
+        self.done += pages
+        self.publish()
+
+    def publish(self) -> None:
+        percent = min(100, int(self.done * 100 / self.total))
+        if self.job is None or percent == self._published:
+            return
+        self._published = percent
+        self.job.meta.update({"progress": percent, "pages_done": self.done, "pages_total": self.total})
+        self.job.save_meta()
+
+def job_cancelled(job_id: str) -> bool:
+    """should_stop hook for the exporter (module-level so process pools can pickle it)."""
+    return cancel_requested(job_id)
+
+def _selection_suffix(payload: Dict[str, Any]) -> str:
+    parts = []
+    if payload.get("pages"):
+        parts.append(f"p{str(payload['pages']).replace(' ', '')}")
+    if payload.get("spread"):
+        parts.append(f"spread{int(payload['spread'])}")
+    return f" ({', '.join(parts)})" if parts else ""
+
+def _render_export(db: Session, doc: Document, filename: str, club: Club, payload: Dict[str, Any], resolver, fragments: PageFragmentCache, progress, should_stop, page_indices=None) -> Asset:
+    """Render ``doc`` into a new export asset (not committed). Raises ExportCancelled."""
+    # Written to a temp file inside the storage dir and moved into place as a blob.
+    tmp = new_tmp_path(".pdf")
+    try:
+        export_document_to_file(doc, resolver, tmp, quality=payload.get("quality","web"), bleed_mm=float(payload.get("bleed_mm",3.0)), crop_marks=bool(payload.get("crop_marks",True)), watermark=bool(payload.get("watermark",False)), workers=export_parallelism(payload), fragments=fragments, page_indices=page_indices, progress=progress, should_stop=should_stop)
+        sha, size = hash_file(tmp)
+        return store_asset_file(db, tmp, sha, size, filename, "application/pdf", club_id=club.id, kind="export")
+    finally:
+        discard_tmp(tmp)
+
+def _session(db_url: str) -> Session:
     from sqlalchemy import create_engine
     from sqlalchemy.orm import sessionmaker
     engine = create_engine(db_url, pool_pre_ping=True)
     SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-    db: Session = SessionLocal()
+    return SessionLocal()
+
+def export_project_job(project_id: str, club_id: str, payload: Dict[str, Any], db_url: str):
+    db: Session = _session(db_url)
     try:
         proj: Project | None = db.get(Project, project_id)
         club: Club | None = db.get(Club, club_id)
         if not proj or not club:
             return {"ok": False, "error": "Project/Club not found"}
-        doc = json.loads(proj.document_json)
-        locked = club.locked_logo_asset_id
-        if locked:
-            for p in doc.get("pages", [])[:1]:
-                for layer in p.get("layers", []):
-                    for it in layer.get("items", []):
-                        if it.get("type")=="LockedLogoStamp" and str(it.get("assetRef","")).startswith("{{"):
-                            it["assetRef"] = locked
-        pdf_bytes = export_document_to_pdf(doc, resolve_asset_path, quality=payload.get("quality","web"), bleed_mm=float(payload.get("bleed_mm",3.0)), crop_marks=bool(payload.get("crop_marks",True)), watermark=bool(payload.get("watermark",False)))
-        export_id, _ = save_local_file(pdf_bytes, f"{proj.name}.pdf")
-        return {"ok": True, "export_asset_id": export_id}
+        doc = load_compiled(proj.document_json, club.locked_logo_asset_id, club.font_primary)
+        page_indices = select_pages(len(doc.pages), payload.get("pages"), payload.get("spread"))
+        selected = doc.pages if page_indices is None else [doc.pages[i] for i in page_indices]
+        quality = payload.get("quality","web")
+        resolver = make_resolver(db, collect_asset_refs(selected), rendition="screen" if quality == "web" else None)
+        fragments = PageFragmentCache()
+        progress = JobProgress(len(selected))
+        should_stop = partial(job_cancelled, progress.job.id) if progress.job else None
+        try:
+            export = _render_export(db, doc, f"{proj.name}{_selection_suffix(payload)}.pdf", club, payload, resolver, fragments, progress, should_stop, page_indices)
+        except ExportCancelled:
+            return {"ok": False, "cancelled": True, "pages_done": progress.done}
+        db.commit()
+        if payload.get("cache_key"):
+            remember_export(payload["cache_key"], export.id)
+        return {"ok": True, "export_asset_id": export.id, "pages": len(selected), **fragments.stats()}
+    finally:
+        db.close()
+
+def export_batch_job(club_id: str, project_ids: list[str], payload: Dict[str, Any], db_url: str):
+    """Export several projects of one club (e.g. a season) in one job.
+
+    Projects are loaded in one query; the logo, asset resolution, page
+    fragments, fonts and resampled images are shared across all of them, and
+    exports already in the export cache are reused. With ``payload["zip"]``
+    the PDFs are also bundled into one ZIP asset.
+    """
+    db: Session = _session(db_url)
+    try:
+        club: Club | None = db.get(Club, club_id)
+        if not club:
+            return {"ok": False, "error": "Club not found"}
+        rows = {p.id: p for p in db.query(Project).filter(Project.club_id == club.id, Project.id.in_(project_ids))}
+        projects = [rows[i] for i in project_ids if i in rows]
+        docs = {p.id: load_compiled(p.document_json, club.locked_logo_asset_id, club.font_primary) for p in projects}
+        refs: Set[str] = set()
+        for doc in docs.values():
+            refs |= collect_asset_refs(doc.pages)
+        resolver = make_resolver(db, refs, rendition="screen" if payload.get("quality","web") == "web" else None)
+        fragments = PageFragmentCache()
+        progress = JobProgress(sum(len(d.pages) for d in docs.values()))
+        should_stop = partial(job_cancelled, progress.job.id) if progress.job else None
+
+        exports = []
+        for proj in projects:
+            doc = docs[proj.id]
+            key = export_cache_key(proj.document_json, club.locked_logo_asset_id, payload, club.font_primary)
+            export_id = cached_export(db, key)
+            if export_id:
+                progress(len(doc.pages))
+            else:
+                try:
+                    export = _render_export(db, doc, f"{proj.name}.pdf", club, payload, resolver, fragments, progress, should_stop)
+                except ExportCancelled:
+                    db.commit()
+                    return {"ok": False, "cancelled": True, "exports": exports, "pages_done": progress.done}
+                db.commit()
+                remember_export(key, export.id)
+                export_id = export.id
+            exports.append({"project_id": proj.id, "name": proj.name, "export_asset_id": export_id})
+
+        result = {"ok": True, "exports": exports, "missing": [i for i in project_ids if i not in rows], **fragments.stats()}
+        if payload.get("zip") and exports:
+            result["zip_asset_id"] = _zip_exports(db, club, exports).id
+            db.commit()
+        return result
+    finally:
+        db.close()
+
+def _zip_exports(db: Session, club: Club, exports: list[Dict[str, Any]]) -> Asset:
+    tmp = new_tmp_path(".zip")
+    try:
+        # PDFs are already compressed: store them as-is, streaming file to file.
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for n, e in enumerate(exports, start=1):
+                name = re.sub(r'[\\/:*?"<>|]+', "_", e["name"] or e["project_id"]).strip() or e["project_id"]
+                zf.write(get_local_path(e["export_asset_id"], db), f"{n:02d} {name}.pdf")
+        sha, size = hash_file(tmp)
+        return store_asset_file(db, tmp, sha, size, f"{club.name}.zip", "application/zip", club_id=club.id, kind="export")
+    finally:
+        discard_tmp(tmp)
+
+def import_pdf_job(club_id: str, source_asset_id: str, filename: str, mode: str, preset: str, db_url: str):
+    """Import an uploaded PDF (stored as asset ``source_asset_id``) into a new project.
+
+    Each page is committed and checkpointed as soon as it is built; a retried
+    job resumes after the last checkpointed page instead of starting over.
+    """
+    db: Session = _session(db_url)
+    try:
+        job = get_current_job()
+        resume, done = import_checkpoint.load_checkpoint(db, job.id) if job else ({}, None)
+        if done:
+            return done
+        club: Club | None = db.get(Club, club_id)
+        if not club:
+            return {"ok": False, "error": "Club not found"}
+        with ExitStack() as stack:
+            # Pool tasks re-open the PDF by path for the whole import: pin it
+            # (with S3 it is a cache entry the LRU could evict meanwhile).
+            try:
+                path = stack.enter_context(pinned_local_path(source_asset_id, db))
+            except FileNotFoundError:
+                return {"ok": False, "error": "Uploaded PDF not found"}
+            with fitz.open(path, filetype="pdf") as pdf:
+                progress = JobProgress(pdf.page_count)
+            progress(len(resume))
+
+            def on_page(index: int, page: Dict[str, Any], asset_ids: list[str]) -> None:
+                db.commit()
+                if job:
+                    import_checkpoint.save_page(job.id, index, page, asset_ids)
+                progress(1)
+
+            document, asset_ids = import_pdf_to_document(db, club.id, path, mode=mode, preset=preset, resume=resume, on_page=on_page)
+        proj = Project(club_id=club.id, name=f"Importado - {filename}", template_id="import_pdf", document_json=json.dumps(document, ensure_ascii=False))
+        db.add(proj)
+        db.commit()
+        result = {"ok": True, "project_id": proj.id, "pages": len(document.get("pages", [])), "mode": mode, "preset": preset, "resumed_pages": len(resume)}
+        if job:
+            import_checkpoint.save_result(job.id, result)
+        # The upload is no longer needed (if this step is lost, the GC sweeps it).
+        source = db.get(Asset, source_asset_id)
+        if source is not None:
+            delete_asset(db, source)
+            db.commit()
+        enqueue_renditions(asset_ids)
+        return result
+    finally:
+        db.close()
+
+def storage_gc_job(db_url: str, max_batches: int | None = None, dry_run: bool = False):
+    try:
+        with gc_lock():
+            db: Session = _session(db_url)
+            try:
+                return {"ok": True, **collect_garbage(db, max_batches=max_batches, dry_run=dry_run)}
+            finally:
+                db.close()
+    except GCAlreadyRunning as e:
+        return {"ok": False, "error": str(e)}
+
+def renditions_job(asset_ids: list[str], db_url: str):
+    db: Session = _session(db_url)
+    created = 0
+    try:
+        for aid in asset_ids:
+            asset = db.get(Asset, aid)
+            if not asset:
+                continue
+            created += len(generate_renditions(db, asset))
+            # Commit per original so a crash keeps the work already done.
+            db.commit()
+        return {"ok": True, "renditions": created}
     finally:
         db.close()
@@ -6,7 +6,9 @@ import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.core.db import engine, Base, SessionLocal
+from app.core.db import engine, SessionLocal
+from app.core.schema import upgrade_schema
+from app.api.deps import UploadLimitMiddleware
 from app.api.routes.auth import router as auth_router
 from app.api.routes.clubs import router as clubs_router
 from app.api.routes.assets import router as assets_router
@@ -21,6 +23,8 @@ logger = logging.getLogger("magazine")
 
 def create_app() -> FastAPI:
     app = FastAPI(title="Sports Magazine SaaS", version="10.3.1")
+    # Added first so it runs inside CORS (413 answers keep their CORS headers).
+    app.add_middleware(UploadLimitMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -35,7 +39,7 @@ def create_app() -> FastAPI:
         last_err: Exception | None = None
         for _ in range(30):
             try:
-                Base.metadata.create_all(bind=engine)
+                upgrade_schema(engine)
                 last_err = None
                 break
             except Exception as e:
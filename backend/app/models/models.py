@@ -1,7 +1,7 @@
 from __future__ import annotations
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, Boolean, ForeignKey, Text, Integer
+from sqlalchemy import String, DateTime, Boolean, ForeignKey, Text, Integer, BigInteger
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.db import Base
 
@@ -73,5 +73,22 @@ class Asset(Base):
     filename: Mapped[str] = mapped_column(String(255))
     mime: Mapped[str] = mapped_column(String(128))
     storage_path: Mapped[str] = mapped_column(String(512))
+    content_hash: Mapped[str | None] = mapped_column(String(64), ForeignKey("blobs.sha256"), index=True, nullable=True)
+    # upload | logo | import | catalog | export | rendition  (exports expire by TTL, see storage_gc)
+    kind: Mapped[str] = mapped_column(String(16), default="upload", index=True)
+    # Renditions are Asset rows of their own, linked to the original.
+    parent_id: Mapped[str | None] = mapped_column(String(64), index=True, nullable=True)
+    rendition: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    width: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    height: Mapped[int | None] = mapped_column(Integer, nullable=True)
     is_catalog: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class Blob(Base):
+    """Content-addressed file shared by every Asset row with the same bytes."""
+    __tablename__ = "blobs"
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    storage_path: Mapped[str] = mapped_column(String(512))
+    size: Mapped[int] = mapped_column(BigInteger, default=0)
+    refcount: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from pydantic import BaseModel, Field
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, List
 
 class TokenOut(BaseModel):
     access_token: str
@@ -63,11 +63,18 @@ class ProjectUpdate(BaseModel):
     document: Dict[str, Any]
 
 class ExportRequest(BaseModel):
-    quality: str = "web"
+    quality: str = "web"  # web | screen | print (see pdf_exporter.QUALITY_PROFILES)
     color_mode: str = "rgb"
     bleed_mm: float = 3.0
     crop_marks: bool = True
     watermark: bool = False
+    pages: Optional[str] = None  # 1-based ranges, e.g. "1-4,12"; None = whole document
+    spread: Optional[int] = None  # export the spread containing this 1-based page
+
+class BatchExportRequest(ExportRequest):
+    club_id: str
+    project_ids: Optional[List[str]] = None  # None = every project of the club
+    zip: bool = False
 
 class ImportPdfRequest(BaseModel):
     mode: str = "safe"
@@ -6,7 +6,8 @@ from PIL import Image, ImageDraw, ImageFont
 
 from sqlalchemy.orm import Session
 from app.models.models import Asset
-from app.services.storage import save_local_file
+from app.services.storage import store_asset
+from app.services.renditions import enqueue_renditions
 
 # Simple, copyright-safe placeholder assets that look "editorial".
 # These are NOT real photos; they are generated compositions.
@@ -105,11 +106,8 @@ def ensure_catalog_assets(db: Session) -> Dict[str, List[str]]:
     accents = [(91,140,255),(255,77,109),(45,212,191),(226,183,20),(155,116,255)]
     # create a few per pool
     def add_asset(name: str, content: bytes) -> str:
-        # Use the same id for DB + disk so any consumer (editor/exporter) can resolve paths reliably.
-        asset_id, _path = save_local_file(content, f"{name}.png")
-        a = Asset(id=asset_id, club_id=None, filename=f"{name}.png", mime="image/png", storage_path=asset_id, is_catalog=True)
-        db.add(a)
-        return asset_id
+        # Generation is deterministic, so re-seeding reuses the blobs already on disk.
+        return store_asset(db, content, f"{name}.png", "image/png", is_catalog=True, kind="catalog").id
 
     for i in range(6):
         pools["hero_football"].append(add_asset(f"hero-football-{i+1}", _hero("football", accents[i % len(accents)])))
@@ -125,4 +123,5 @@ def ensure_catalog_assets(db: Session) -> Dict[str, List[str]]:
         pools["bg"].append(add_asset(f"bg-{i+1}", _hero("background", accents[(i+1) % len(accents)])))
 
     db.commit()
+    enqueue_renditions([a for ids in pools.values() for a in ids])
     return pools
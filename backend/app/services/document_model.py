@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from app.services.styles import BLACK, StyleResolver, opacity_of
+
+# Compiled, read-only form of a scene-graph document for the renderers (PDF
+# exporter, template thumbnails). The JSON is validated and coerced once:
+# rects are floats, item types are dispatched to small __slots__ records,
+# text is joined and styled and colors are resolved to RGBA (app.services.styles),
+# so render loops do no dict walking or color parsing.
+
+DEFAULT_PAGE_W = 595.0
+DEFAULT_PAGE_H = 842.0
+
+SHAPE, LINE, IMAGE, TEXT = range(4)
+
+_KINDS = {
+    "Shape": SHAPE, "Rect": SHAPE, "Rectangle": SHAPE,
+    "Line": LINE,
+    "ImageFrame": IMAGE, "LockedLogoStamp": IMAGE,
+    "TextFrame": TEXT,
+}
+_ALIGN = {"left": 0, "center": 1, "right": 2, "justify": 3}
+
+
+def _num(v: Any, default: float = 0.0) -> float:
+    try:
+        return float(v) if v is not None and v != "" else default
+    except (TypeError, ValueError):
+        return default
+
+
+class Item:
+    """Common frame fields; x/y/w/h in points relative to the trim box."""
+
+    __slots__ = ("kind", "x", "y", "w", "h", "visible", "role")
+
+    def __init__(self, kind: int, raw: Dict[str, Any], visible: bool):
+        rect = raw.get("rect") if isinstance(raw.get("rect"), dict) else {}
+        self.kind = kind
+        self.x = _num(rect.get("x"))
+        self.y = _num(rect.get("y"))
+        self.w = _num(rect.get("w"))
+        self.h = _num(rect.get("h"))
+        self.visible = visible
+        self.role = raw.get("role")
+
+
+class ShapeItem(Item):
+    """fill / stroke are RGBA tuples (item opacity folded in) or None."""
+
+    __slots__ = ("fill", "stroke", "stroke_width")
+
+    def __init__(self, raw: Dict[str, Any], visible: bool, styles: StyleResolver):
+        super().__init__(SHAPE, raw, visible)
+        opacity = opacity_of(raw)
+        self.fill = styles.color(raw.get("fill"), opacity)
+        self.stroke = styles.color(raw.get("stroke"), opacity)
+        self.stroke_width = _num(raw.get("strokeWidth"))
+
+
+class LineItem(Item):
+    __slots__ = ("stroke", "stroke_width", "x2", "y2")
+
+    def __init__(self, raw: Dict[str, Any], visible: bool, styles: StyleResolver):
+        super().__init__(LINE, raw, visible)
+        self.stroke = styles.color(raw.get("stroke"), opacity_of(raw), BLACK)
+        self.stroke_width = _num(raw.get("strokeWidth"), 1.0) or 1.0
+        # Absolute end point when given; renderers default to the rect's far corner.
+        self.x2 = _num(raw.get("x2")) or None
+        self.y2 = _num(raw.get("y2")) or None
+
+
+class ImageItem(Item):
+    __slots__ = ("asset_ref",)
+
+    def __init__(self, raw: Dict[str, Any], visible: bool, asset_ref: Optional[str]):
+        super().__init__(IMAGE, raw, visible)
+        self.asset_ref = asset_ref
+
+
+class TextItem(Item):
+    __slots__ = ("text", "color", "font_size", "font_family", "font_weight", "italic", "align")
+
+    def __init__(self, raw: Dict[str, Any], visible: bool, styles: StyleResolver):
+        super().__init__(TEXT, raw, visible)
+        style = styles.text_style(raw)
+        self.text = collect_text(raw)
+        self.color = styles.color(style.get("color"), opacity_of(raw), BLACK)
+        self.font_size = _num(style.get("fontSize"), 12.0) or 12.0
+        self.font_family = style.get("fontFamily")
+        self.font_weight = style.get("fontWeight")
+        self.italic = str(style.get("fontStyle") or "").lower() == "italic"
+        self.align = _ALIGN.get(str(raw.get("align") or "left").lower(), 0)
+
+
+class Page:
+    __slots__ = ("source", "background", "items", "asset_refs")
+
+    def __init__(self, source: Dict[str, Any], background: Any, items: Tuple[Item, ...], asset_refs: FrozenSet[str]):
+        self.source = source
+        self.background = background
+        self.items = items
+        self.asset_refs = asset_refs
+
+
+class Document:
+    """``font``: family for text whose own family is not installed (the club's font_primary)."""
+
+    __slots__ = ("width", "height", "styles", "pages", "font")
+
+    def __init__(self, width: float, height: float, styles: Dict[str, Any], pages: Tuple[Page, ...], font: Optional[str] = None):
+        self.width = width
+        self.height = height
+        self.styles = styles
+        self.pages = pages
+        self.font = font
+
+    def with_pages(self, pages) -> "Document":
+        """Same document settings with another page tuple (e.g. a chunk for a worker)."""
+        return Document(self.width, self.height, self.styles, tuple(pages), self.font)
+
+
+def collect_text(item: Dict[str, Any]) -> str:
+    runs = item.get("richTextRuns") or []
+    if not runs and isinstance(item.get("text"), list):
+        # Templates and the importer store text as runs: [{"text": ..., "marks": {}}]
+        runs = item["text"]
+    if isinstance(runs, list) and runs:
+        parts = []
+        for r in runs:
+            t = r.get("text") if isinstance(r, dict) else ""
+            if t:
+                parts.append(str(t))
+        return "".join(parts).strip()
+    return str(item.get("text") or "").strip()
+
+
+def _compile_page(raw: Dict[str, Any], styles: StyleResolver, locked_logo: Optional[str]) -> Page:
+    items = []
+    refs = set()
+    for layer in (raw.get("layers") or []):
+        if not isinstance(layer, dict):
+            continue
+        visible = layer.get("visible") is not False
+        for it in (layer.get("items") or []):
+            if not isinstance(it, dict):
+                continue
+            kind = _KINDS.get(it.get("type"))
+            if kind == SHAPE:
+                items.append(ShapeItem(it, visible, styles))
+            elif kind == LINE:
+                items.append(LineItem(it, visible, styles))
+            elif kind == IMAGE:
+                ref = it.get("assetRef") or it.get("assetId")
+                ref = str(ref) if ref else None
+                if ref and ref.startswith("{{"):
+                    # Placeholder ("{{club.lockedLogo}}") stamped with the club's locked logo.
+                    ref = locked_logo if it.get("type") == "LockedLogoStamp" else None
+                if ref:
+                    refs.add(ref)
+                items.append(ImageItem(it, visible, ref))
+            elif kind == TEXT:
+                items.append(TextItem(it, visible, styles))
+    bg = raw.get("background")
+    background = styles.color(bg.get("fill")) if isinstance(bg, dict) else None
+    return Page(raw, background, tuple(items), frozenset(refs))
+
+
+def compile_document(document: Dict[str, Any], locked_logo: Optional[str] = None, font: Optional[str] = None) -> Document:
+    """Validate and compile a document dict.
+
+    ``locked_logo`` fills logo placeholders on the first page; ``font`` is the
+    fallback text family (Document.font).
+    """
+    settings = document.get("settings") or {}
+    styles = document.get("styles") if isinstance(document.get("styles"), dict) else {}
+    # One resolver per document: each styleRef / color value is resolved once.
+    resolver = StyleResolver(styles)
+    pages = []
+    for n, raw in enumerate(document.get("pages") or []):
+        if isinstance(raw, dict):
+            pages.append(_compile_page(raw, resolver, locked_logo if n == 0 else None))
+    return Document(
+        _num(settings.get("pageWidth"), DEFAULT_PAGE_W) or DEFAULT_PAGE_W,
+        _num(settings.get("pageHeight"), DEFAULT_PAGE_H) or DEFAULT_PAGE_H,
+        styles,
+        tuple(pages),
+        font or None,
+    )
+
+
+# Per-process LRU keyed by document version (hash of the stored JSON) + logo + font.
+# It pays off in long-lived processes (the API: template thumbnails). RQ's
+# default Worker forks a fresh work horse per job, so an export job always
+# starts empty and compiles each document once; within the job that compiled
+# form is then shared by page selection, fingerprinting and the render pool.
+COMPILED_CACHE_SIZE = 32
+_compiled: "OrderedDict[Tuple[str, Optional[str], Optional[str]], Document]" = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def load_compiled(document_json: str, locked_logo: Optional[str] = None, font: Optional[str] = None) -> Document:
+    """compile_document() for stored JSON, reusing the compiled form while the JSON is unchanged (same process)."""
+    key = (hashlib.sha1((document_json or "").encode("utf-8")).hexdigest(), locked_logo, font)
+    with _compiled_lock:
+        doc = _compiled.get(key)
+        if doc is not None:
+            _compiled.move_to_end(key)
+            return doc
+    try:
+        parsed = json.loads(document_json or "{}")
+    except ValueError:
+        parsed = {}
+    doc = compile_document(parsed if isinstance(parsed, dict) else {}, locked_logo, font)
+    with _compiled_lock:
+        _compiled[key] = doc
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return doc
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.models import Asset
+from app.services.pdf_exporter import RENDERER_VERSION
+from app.services.storage_backends import get_backend
+
+logger = logging.getLogger("magazine")
+
+# Storage key prefix of rendered page fragments (outside the blob shards).
+FRAGMENT_PREFIX = "fragments"
+
+class PageFragmentCache:
+    """Rendered single-page PDFs in storage, keyed by page fingerprint.
+
+    Passed as ``fragments`` to export_document_to_pdf; counts hits and misses
+    so the export job can report them. Writes are best effort.
+    """
+
+    def __init__(self):
+        self.backend = get_backend()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(page_hash: str) -> str:
+        return f"{FRAGMENT_PREFIX}/{page_hash[:2]}/{page_hash}.pdf"
+
+    def get(self, page_hash: str) -> Optional[str]:
+        """Local path of the cached fragment, or None."""
+        path = self.backend.fetch(self.key(page_hash))
+        if path:
+            try:
+                # mtime = last use, for sweep_fragments.
+                os.utime(path)
+                self.hits += 1
+                return path
+            except FileNotFoundError:
+                pass
+        self.misses += 1
+        return None
+
+    def put(self, page_hash: str, data: bytes) -> None:
+        try:
+            self.backend.put_bytes(self.key(page_hash), data)
+        except Exception:
+            logger.exception("Could not store page fragment %s", page_hash)
+
+    def stats(self) -> Dict[str, int]:
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
+
+def sweep_fragments(dry_run: bool = False) -> int:
+    """Remove local fragments not used for FRAGMENT_TTL_HOURS; returns the count.
+
+    Only the local layout is walked; on S3 use a bucket lifecycle rule on the
+    ``fragments/`` prefix (the worker copies are bounded by the DiskCache).
+    """
+    root = os.path.join(settings.STORAGE_LOCAL_DIR, FRAGMENT_PREFIX)
+    cutoff = time.time() - settings.FRAGMENT_TTL_HOURS * 3600
+    n = 0
+    for dirpath, _dirs, files in os.walk(root):
+        for fn in files:
+            p = os.path.join(dirpath, fn)
+            try:
+                if os.stat(p).st_mtime >= cutoff:
+                    continue
+                n += 1
+                if not dry_run:
+                    os.remove(p)
+            except FileNotFoundError:
+                pass
+    return n
+
+# Whole-export cache and in-flight coalescing (Redis). Values are export asset
+# ids / RQ job ids; the assets table stays the source of truth.
+EXPORT_KEY_FIELDS = ("quality", "color_mode", "bleed_mm", "crop_marks", "watermark", "pages", "spread")
+INFLIGHT_TTL = 600
+
+def export_cache_key(document_json: str, logo_asset_id: str | None, options: Dict[str, Any], font: str | None = None) -> str:
+    """Hash of the canonical document, the club logo and font and the output-affecting options."""
+    canonical = json.dumps(json.loads(document_json or "{}"), sort_keys=True, separators=(",", ":"))
+    payload = {
+        "v": RENDERER_VERSION,
+        "doc": hashlib.sha256(canonical.encode("utf-8")).hexdigest(),
+        "logo": logo_asset_id,
+        "font": font,
+        "options": {k: options.get(k) for k in EXPORT_KEY_FIELDS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _redis():
+    from app.core.queue import redis_conn
+    return redis_conn
+
+def _text(v) -> Optional[str]:
+    return v.decode() if isinstance(v, bytes) else v
+
+def cached_export(db: Session, key: str) -> Optional[str]:
+    """Id of a still-stored export for ``key``, or None."""
+    try:
+        asset_id = _text(_redis().get(f"export:done:{key}"))
+    except Exception:
+        logger.exception("Export cache unavailable")
+        return None
+    if asset_id and db.get(Asset, asset_id) is not None:
+        return asset_id
+    return None
+
+def remember_export(key: str, asset_id: str) -> None:
+    """Record a finished export and release the in-flight slot. Best effort."""
+    try:
+        r = _redis()
+        r.set(f"export:done:{key}", asset_id, ex=settings.EXPORT_TTL_HOURS * 3600)
+        r.delete(f"export:inflight:{key}")
+    except Exception:
+        logger.exception("Could not record export %s", asset_id)
+
+def coalesce_export(key: str, enqueue: Callable[[str], None]) -> Tuple[str, bool]:
+    """Return ``(job_id, started)`` for ``key``.
+
+    The first caller claims the key (SET NX) and ``enqueue(job_id)`` is called;
+    identical concurrent requests get the job id already running. A failed or
+    cancelled job (or one that finished without an export) releases the slot.
+    """
+    from app.core.queue import q
+    r = _redis()
+    slot = f"export:inflight:{key}"
+    for _ in range(2):
+        job_id = uuid.uuid4().hex
+        if r.set(slot, job_id, nx=True, ex=INFLIGHT_TTL):
+            try:
+                enqueue(job_id)
+            except BaseException:
+                r.delete(slot)
+                raise
+            return job_id, True
+        running = _text(r.get(slot))
+        if not running:
+            continue
+        job = q.fetch_job(running)
+        # None: the claiming request has not finished enqueueing yet.
+        if job is None or not (job.is_failed or job.is_finished or job.is_canceled):
+            return running, False
+        # Stale slot: the job failed or finished without recording its export.
+        r.delete(slot)
+    job_id = uuid.uuid4().hex
+    enqueue(job_id)
+    return job_id, True
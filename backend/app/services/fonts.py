@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from app.core.settings import settings
+
+# Font registry for the exporter. Font files under FONT_DIRS are indexed once
+# per process by family / weight / italic and their bytes are read once;
+# FontEmbedder then embeds each file once per output PDF. The RQ worker builds
+# both before it starts forking work horses (preload_fonts), so jobs inherit
+# them instead of rescanning FONT_DIRS each time.
+
+FONT_EXTS = (".ttf", ".otf")
+
+_WEIGHTS = {
+    "thin": 100, "hairline": 100, "extralight": 200, "ultralight": 200, "light": 300,
+    "regular": 400, "normal": 400, "book": 400, "roman": 400, "medium": 500,
+    "semibold": 600, "demibold": 600, "bold": 700, "extrabold": 800, "ultrabold": 800,
+    "black": 900, "heavy": 900,
+}
+_ITALIC = {"italic", "oblique"}
+_PREFIXES = {"extra", "ultra", "semi", "demi"}
+
+# (family key, weight, italic, path)
+_index: Optional[List[Tuple[str, int, bool, str]]] = None
+_faces: Dict[str, List[Tuple[str, int, bool, str]]] = {}
+_buffers: Dict[str, bytes] = {}
+_lock = threading.Lock()
+
+def family_key(name: str) -> str:
+    """'DejaVu Sans', 'DejaVuSans', 'dejavu-sans' -> 'dejavusans'."""
+    return re.sub(r"[^a-z0-9]", "", (name or "").lower())
+
+def _describe(font_name: str, is_bold: bool, is_italic: bool) -> Tuple[str, int, bool]:
+    """(family key, weight, italic) from a font name like 'Inter Semi Bold Italic'."""
+    tokens = re.split(r"[\s\-_,]+", font_name.strip())
+    word, italic = "", bool(is_italic)
+    while len(tokens) > 1:
+        tok = tokens[-1].lower()
+        if tok in _ITALIC:
+            italic = True
+        elif tok.endswith("italic") and tok[:-6] in _WEIGHTS:
+            italic, word = True, word or tok[:-6]
+        elif tok in _WEIGHTS and not word:
+            word = tok
+        elif tok in _PREFIXES and tok + word in _WEIGHTS:
+            word = tok + word
+        else:
+            break
+        tokens.pop()
+    weight = _WEIGHTS[word] if word else (700 if is_bold else 400)
+    return family_key(" ".join(tokens)), weight, italic
+
+def _scan() -> List[Tuple[str, int, bool, str]]:
+    out = []
+    for root in (settings.FONT_DIRS or "").split(os.pathsep):
+        if not root or not os.path.isdir(root):
+            continue
+        for dirpath, _dirs, files in os.walk(root):
+            for fn in sorted(files):
+                if not fn.lower().endswith(FONT_EXTS):
+                    continue
+                path = os.path.join(dirpath, fn)
+                try:
+                    f = fitz.Font(fontfile=path)
+                except Exception:
+                    continue
+                family, weight, italic = _describe(f.name or os.path.splitext(fn)[0], bool(f.is_bold), bool(f.is_italic))
+                out.append((family, weight, italic, path))
+    return out
+
+def font_index() -> List[Tuple[str, int, bool, str]]:
+    if _index is None:
+        with _lock:
+            if _index is None:
+                install_index(_scan())
+    return _index
+
+def install_index(index: List[Tuple[str, int, bool, str]]) -> None:
+    """Use an index built elsewhere (export pool initializer: children reuse the parent's scan)."""
+    global _index, _faces
+    faces: Dict[str, List[Tuple[str, int, bool, str]]] = {}
+    for face in index:
+        faces.setdefault(face[0], []).append(face)
+    _faces = faces
+    _index = index
+    _resolve.cache_clear()
+
+def preload_fonts(max_bytes: int) -> int:
+    """Index FONT_DIRS and read font files (up to ``max_bytes`` in total); returns bytes read."""
+    total = 0
+    for _family, _weight, _italic, path in font_index():
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        if total + size > max_bytes:
+            continue
+        font_buffer(path)
+        total += size
+    return total
+
+def resolve_font(family: str | None, weight: int | str | None = 400, italic: bool = False) -> Optional[str]:
+    """Path of the closest installed face of ``family`` (None if the family is not installed)."""
+    key = family_key(family or "")
+    if not key:
+        return None
+    try:
+        wanted = int(weight or 400)
+    except (TypeError, ValueError):
+        wanted = 700 if str(weight).lower() == "bold" else 400
+    return _resolve(key, wanted, bool(italic))
+
+@lru_cache(maxsize=4096)
+def _resolve(key: str, wanted: int, italic: bool) -> Optional[str]:
+    font_index()
+    faces = _faces.get(key)
+    if not faces:
+        return None
+    best = min(faces, key=lambda f: (f[2] != italic, abs(f[1] - wanted), f[3]))
+    return best[3]
+
+def font_buffer(path: str) -> bytes:
+    buf = _buffers.get(path)
+    if buf is None:
+        with open(path, "rb") as f:
+            buf = f.read()
+        _buffers[path] = buf
+    return buf
+
+class FontEmbedder:
+    """Embeds each font file once per PDF; later pages reference the same font object.
+
+    Fonts go in whole; glyphs are dropped by subset_embedded_fonts() at save time.
+    """
+
+    def __init__(self, pdf: fitz.Document):
+        self.pdf = pdf
+        self.xrefs: Dict[str, int] = {}
+        self.names: Dict[str, str] = {}
+        self._pages: Dict[int, set] = {}
+
+    def fontname(self, page: fitz.Page, path: str) -> str:
+        """Resource name to pass as ``fontname`` to page text calls."""
+        name = self.names.get(path)
+        if name is None:
+            name = self.names[path] = f"F{len(self.names)}"
+        on_page = self._pages.setdefault(page.xref, set())
+        if name in on_page:
+            return name
+        xref = self.xrefs.get(path)
+        if xref is None:
+            self.xrefs[path] = page.insert_font(fontname=name, fontbuffer=font_buffer(path))
+        else:
+            self._link(page, name, xref)
+        on_page.add(name)
+        return name
+
+    def _link(self, page: fitz.Page, name: str, xref: int) -> None:
+        owner, key = _font_resource(self.pdf, page.xref, name)
+        self.pdf.xref_set_key(owner, key, f"{xref} 0 R")
+
+def has_embedded_fonts(pdf: fitz.Document) -> bool:
+    for i in range(len(pdf)):
+        if any(f[1] != "n/a" for f in pdf.get_page_fonts(i)):
+            return True
+    return False
+
+def _font_program(pdf: fitz.Document, xref: int) -> Optional[str]:
+    """Reference of the embedded font file behind font ``xref`` (Type0 or simple)."""
+    kind, value = pdf.xref_get_key(xref, "DescendantFonts")
+    if kind == "array":
+        refs = re.findall(r"(\d+) 0 R", value)
+        if refs:
+            xref = int(refs[0])
+    for key in ("FontFile2", "FontFile3", "FontFile"):
+        kind, value = pdf.xref_get_key(xref, f"FontDescriptor/{key}")
+        if kind == "xref":
+            return value
+    return None
+
+def _share_font_objects(pdf: fitz.Document) -> None:
+    """Point every page at one font dictionary per embedded font program.
+
+    Pages merged from chunks/fragments each bring their own font dictionary
+    around the same (already deduplicated) font file; subset_fonts() would
+    build a separate subset for each of them.
+    """
+    canonical: Dict[Tuple[str, str], int] = {}
+    for i in range(len(pdf)):
+        for xref, ext, _type, basefont, name, _enc in pdf.get_page_fonts(i):
+            if ext == "n/a":
+                continue
+            program = _font_program(pdf, xref)
+            if program is None:
+                continue
+            keep = canonical.setdefault((basefont, program), xref)
+            if keep == xref:
+                continue
+            owner, key = _font_resource(pdf, pdf[i].xref, name)
+            pdf.xref_set_key(owner, key, f"{keep} 0 R")
+
+def _font_resource(pdf: fitz.Document, page_xref: int, name: str) -> Tuple[int, str]:
+    """(object xref, key path) of font ``name`` in a page's resources, following indirect dicts."""
+    kind, value = pdf.xref_get_key(page_xref, "Resources")
+    owner, prefix = (int(value.split()[0]), "") if kind == "xref" else (page_xref, "Resources/")
+    kind, value = pdf.xref_get_key(owner, prefix + "Font")
+    if kind == "xref":
+        return int(value.split()[0]), name
+    return owner, f"{prefix}Font/{name}"
+
+def subset_embedded_fonts(src_path: str, output_path: str, garbage: int = 3) -> None:
+    """Rewrite a saved PDF with every embedded font reduced to the glyphs used.
+
+    MuPDF subsets from the saved file (not a document under construction), so
+    callers save first (garbage=4 merges identical font programs) and pass it here.
+    """
+    with fitz.open(src_path) as pdf:
+        _share_font_objects(pdf)
+        pdf.subset_fonts()
+        pdf.save(output_path, garbage=garbage, deflate=True)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.models import Asset
+
+logger = logging.getLogger("magazine")
+
+# Per-page checkpoints of an import job, in one Redis hash per job id:
+#   p:<index> -> {"page": <document page>, "assets": [asset ids]}
+#   result    -> final job result once the project exists
+# A retried job (RQ Retry, or an abandoned job requeued after a worker crash)
+# keeps its id, so it picks up the pages already imported. Kept no longer than
+# the GC grace period, after which unreferenced import assets may be swept.
+
+def _redis():
+    from app.core.queue import redis_conn
+    return redis_conn
+
+def _key(job_id: str) -> str:
+    return f"import:ckpt:{job_id}"
+
+def _ttl() -> int:
+    return max(1, settings.GC_MIN_AGE_HOURS) * 3600
+
+def load_checkpoint(db: Session, job_id: str) -> Tuple[Dict[int, Tuple[Dict[str, Any], List[str]]], Optional[Dict[str, Any]]]:
+    """``(resume, result)``: pages already imported (whose assets still exist) and a stored final result."""
+    try:
+        raw = _redis().hgetall(_key(job_id))
+    except Exception:
+        logger.exception("Import checkpoints unavailable")
+        return {}, None
+    resume: Dict[int, Tuple[Dict[str, Any], List[str]]] = {}
+    result = None
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        data = json.loads(value)
+        if field == "result":
+            result = data
+        elif field.startswith("p:"):
+            resume[int(field[2:])] = (data["page"], data["assets"])
+    ids = {a for _page, assets in resume.values() for a in assets}
+    if ids:
+        have = {a for (a,) in db.query(Asset.id).filter(Asset.id.in_(ids))}
+        resume = {i: v for i, v in resume.items() if all(a in have for a in v[1])}
+    return resume, result
+
+def save_page(job_id: str, index: int, page: Dict[str, Any], asset_ids: List[str]) -> None:
+    """Record one imported page (its assets must be committed first). Best effort."""
+    try:
+        r = _redis()
+        r.hset(_key(job_id), f"p:{index}", json.dumps({"page": page, "assets": asset_ids}, ensure_ascii=False))
+        r.expire(_key(job_id), _ttl())
+    except Exception:
+        logger.exception("Could not checkpoint page %s of import %s", index, job_id)
+
+def save_result(job_id: str, result: Dict[str, Any]) -> None:
+    """Replace the page checkpoints with the final result, so a rerun does not import twice."""
+    try:
+        pipe = _redis().pipeline()
+        pipe.delete(_key(job_id))
+        pipe.hset(_key(job_id), "result", json.dumps(result))
+        pipe.expire(_key(job_id), _ttl())
+        pipe.execute()
+    except Exception:
+        logger.exception("Could not record result of import %s", job_id)
@@ -1,178 +1,523 @@
 from __future__ import annotations
 
+import hashlib
+import io
+import json
+import logging
 import os
-from typing import Callable, Dict, Any
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Any, List, Sequence, Set
 
 import fitz  # PyMuPDF
+from PIL import Image
+
+from app.core.settings import settings
+from app.services.document_model import IMAGE, LINE, SHAPE, TEXT, Document, Page, compile_document
+from app.services.fonts import FontEmbedder, font_index, has_embedded_fonts, install_index, resolve_font, subset_embedded_fonts
+from app.services.storage_backends import DiskCache
+
+logger = logging.getLogger("magazine")
 
 MM_TO_PT = 72.0 / 25.4
 
 
+class ExportCancelled(Exception):
+    """Raised between pages once ``should_stop()`` returns True."""
+
+# Bump whenever page rendering changes so cached page fragments are not reused.
+RENDERER_VERSION = 3
+
+# Effective resolution each image gets inside its frame. Sources are only
+# downsampled (never upscaled) and only when clearly above the target.
+QUALITY_PROFILES: Dict[str, Dict[str, Any]] = {
+    "web": {"dpi": 96, "jpeg_quality": 72},
+    "screen": {"dpi": 150, "jpeg_quality": 82},
+    "print": {"dpi": 300, "jpeg_quality": 92},
+}
+RESAMPLE_THRESHOLD = 1.25
+# Below this many pages per process the pool start-up costs more than it saves.
+MIN_PAGES_PER_CHUNK = 4
+# Target sizes are rounded up to this step so near-identical frames share cache entries.
+SIZE_STEP = 64
+# Formats MuPDF embeds as-is; others (e.g. WebP import backgrounds) are always re-encoded.
+NATIVE_IMAGE_FORMATS = {"JPEG", "PNG", "JPEG2000", "TIFF", "BMP", "GIF", "PPM"}
+
+_resample_cache: DiskCache | None = None
+
+
 def _pt_bleed(mm: float) -> float:
     return float(mm or 0.0) * MM_TO_PT
 
 
-def _safe_color(rgb: Any) -> tuple[float, float, float]:
-    # Accept [0..1] or [0..255]
-    if not isinstance(rgb, (list, tuple)) or len(rgb) != 3:
-        return (0, 0, 0)
-    vals = []
-    for v in rgb:
+def _rgb(rgba) -> tuple[float, float, float] | None:
+    # Compiled colors are already resolved RGBA tuples (see app.services.styles).
+    return rgba[:3] if rgba else None
+
+
+def _image_cache() -> DiskCache:
+    global _resample_cache
+    if _resample_cache is None:
+        _resample_cache = DiskCache(os.path.join(settings.STORAGE_CACHE_DIR, "resampled"), settings.EXPORT_IMAGE_CACHE_MB * 1024 * 1024)
+    return _resample_cache
+
+
+def _resampled_image(path: str, rect: fitz.Rect, profile: Dict[str, Any]) -> str:
+    """Return a file for ``path`` downsampled to the profile DPI at ``rect`` size.
+
+    Results are cached on disk per (source, target size), so repeated exports
+    (and the same image in frames of similar size) reuse them. Falls back to
+    the original whenever resampling would not pay off, unless MuPDF cannot
+    embed its format.
+    """
+    dpi = float(profile["dpi"])
+    need_w = max(1, int(rect.width / 72.0 * dpi))
+    need_h = max(1, int(rect.height / 72.0 * dpi))
+    try:
+        with Image.open(path) as probe:
+            src_w, src_h = probe.size
+            native = probe.format in NATIVE_IMAGE_FORMATS
+    except Exception:
+        return path
+    # Uniform scale that still covers the frame in both directions (frames stretch the image).
+    factor = max(need_w / src_w, need_h / src_h)
+    if native and factor * RESAMPLE_THRESHOLD >= 1.0:
+        return path
+    long_side = max(src_w, src_h) * min(1.0, factor)
+    long_side = int(-(-long_side // SIZE_STEP) * SIZE_STEP)
+    if long_side >= max(src_w, src_h):
+        if native:
+            return path
+        long_side = max(src_w, src_h)
+
+    cache = _image_cache()
+    src_id = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    base = f"{src_id[:2]}/{src_id}_{long_side}_{profile['jpeg_quality']}"
+    for ext in (".jpg", ".png"):
+        hit = cache.get(base + ext)
+        if hit:
+            return hit
+
+    with Image.open(path) as im:
+        if im.format == "JPEG":
+            im.draft("RGB", (long_side, long_side))
+        im.load()
+        im.thumbnail((long_side, long_side), Image.LANCZOS)
+        buf = io.BytesIO()
+        if im.mode in ("RGBA", "LA", "P"):
+            im.save(buf, format="PNG", optimize=True)
+            ext = ".png"
+        else:
+            im.convert("RGB").save(buf, format="JPEG", quality=int(profile["jpeg_quality"]), optimize=True)
+            ext = ".jpg"
+    dst = cache.path(base + ext)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(buf.getvalue())
+    os.replace(tmp, dst)
+    cache.admit(base + ext, len(buf.getvalue()))
+    return dst
+
+
+def _overlay_page(page_w: float, page_h: float, bleed_pt: float, crop_marks: bool, watermark: bool) -> fitz.Document | None:
+    """Crop marks + watermark drawn once into a one-page PDF.
+
+    Every output page shows it via show_pdf_page(), which embeds the artwork
+    as a single Form XObject referenced from all pages.
+    """
+    marks = crop_marks and bleed_pt > 0
+    if not marks and not watermark:
+        return None
+    src = fitz.open()
+    p = src.new_page(width=page_w, height=page_h)
+    if marks:
+        m = bleed_pt
+        cm = 12
+        # top-left
+        p.draw_line((m, 0), (m, cm), color=(0, 0, 0), width=0.5)
+        p.draw_line((0, m), (cm, m), color=(0, 0, 0), width=0.5)
+        # top-right
+        p.draw_line((page_w - m, 0), (page_w - m, cm), color=(0, 0, 0), width=0.5)
+        p.draw_line((page_w - cm, m), (page_w, m), color=(0, 0, 0), width=0.5)
+        # bottom-left
+        p.draw_line((m, page_h - cm), (m, page_h), color=(0, 0, 0), width=0.5)
+        p.draw_line((0, page_h - m), (cm, page_h - m), color=(0, 0, 0), width=0.5)
+        # bottom-right
+        p.draw_line((page_w - m, page_h - cm), (page_w - m, page_h), color=(0, 0, 0), width=0.5)
+        p.draw_line((page_w - cm, page_h - m), (page_w, page_h - m), color=(0, 0, 0), width=0.5)
+    if watermark:
+        # insert_text only rotates by multiples of 90; tilt the text with a morph matrix.
+        origin = fitz.Point(page_w * 0.15, page_h * 0.5)
+        p.insert_text(
+            origin,
+            "PREVIEW",
+            fontsize=80,
+            color=(0.7, 0.7, 0.7),
+            render_mode=0,
+            morph=(origin, fitz.Matrix(25)),
+        )
+    return src
+
+
+def select_pages(page_count: int, pages: str | None = None, spread: int | None = None) -> List[int] | None:
+    """0-based page indices for a "1-4,12" range list and/or the spread around page ``spread``.
+
+    Spreads follow magazine imposition: page 1 (cover) stands alone, then
+    2-3, 4-5, ... Returns None for the whole document; raises ValueError for
+    malformed or out-of-range selections.
+    """
+    if not pages and not spread:
+        return None
+    wanted: set[int] = set()
+    for part in (pages or "").replace(" ", "").split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        try:
+            a = int(first)
+            b = int(last) if last else a
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}")
+        if a < 1 or b < a or b > page_count:
+            raise ValueError(f"Page range {part!r} outside 1-{page_count}")
+        wanted.update(range(a, b + 1))
+    if spread:
+        if not 1 <= spread <= page_count:
+            raise ValueError(f"Spread page {spread} outside 1-{page_count}")
+        left = spread if spread == 1 or spread % 2 == 0 else spread - 1
+        wanted.add(left)
+        if left > 1 and left + 1 <= page_count:
+            wanted.add(left + 1)
+    return [n - 1 for n in sorted(wanted)]
+
+
+def _asset_refs(pages: Sequence[Page]) -> Set[str]:
+    refs: Set[str] = set()
+    for page in pages:
+        refs |= page.asset_refs
+    return refs
+
+
+def _render_chunk(args: tuple) -> str:
+    """Process-pool entry point: render a slice of pages to a temp PDF file (path returned)."""
+    doc, paths, quality, bleed_mm, crop_marks, watermark, should_stop = args
+    pdf = _render_pages(doc, doc.pages, paths.get, quality, bleed_mm, crop_marks, watermark, should_stop=should_stop)
+    fd, out = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    pdf.save(out, garbage=3, deflate=True)
+    pdf.close()
+    return out
+
+
+def page_fingerprint(doc: Document, page: Page, paths: Dict[str, str | None], options: tuple) -> str:
+    """Hash of everything that determines how ``page`` renders.
+
+    Asset files are identified by path + size + mtime: blob paths embed the
+    content hash, so a changed image always changes the fingerprint.
+    """
+    assets = {}
+    for ref in page.asset_refs:
+        path = paths.get(ref)
         try:
-            fv = float(v)
-        except Exception:
-            fv = 0.0
-        if fv > 1.0:
-            fv = fv / 255.0
-        vals.append(max(0.0, min(1.0, fv)))
-    return (vals[0], vals[1], vals[2])
-
-
-def _collect_text(item: Dict[str, Any]) -> str:
-    runs = item.get("richTextRuns") or []
-    if isinstance(runs, list) and runs:
-        parts = []
-        for r in runs:
-            t = r.get("text") if isinstance(r, dict) else ""
-            if t:
-                parts.append(str(t))
-        return "".join(parts).strip()
-    return str(item.get("text") or "").strip()
+            st = os.stat(path) if path else None
+        except OSError:
+            st = None
+        assets[ref] = [path, st.st_size, int(st.st_mtime)] if st else None
+    payload = {
+        "v": RENDERER_VERSION,
+        "size": [doc.width, doc.height],
+        "styles": doc.styles,
+        "font": doc.font,
+        "page": page.source,
+        "assets": assets,
+        "options": list(options),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _render(doc, pages, resolve_asset_path, quality, bleed_mm, crop_marks, watermark, workers, progress=None, should_stop=None) -> tuple[fitz.Document, bool]:
+    """Render ``pages`` serially or in a process pool; returns (pdf, merged_from_chunks).
+
+    ``progress(n)`` is called as pages complete (per chunk when parallel);
+    ``should_stop`` must be picklable for the parallel path.
+    """
+    n_chunks = min(int(workers or 1), len(pages) // MIN_PAGES_PER_CHUNK)
+    if n_chunks <= 1:
+        return _render_pages(doc, pages, resolve_asset_path, quality, bleed_mm, crop_marks, watermark, progress, should_stop), False
+
+    # Workers cannot share the caller's resolver (DB session), so resolve up front.
+    paths = {ref: resolve_asset_path(ref) for ref in _asset_refs(pages)}
+    size = -(-len(pages) // n_chunks)
+    chunks = [pages[i:i + size] for i in range(0, len(pages), size)]
+    parts: List[str | None] = [None] * len(chunks)
+    try:
+        # Children get the parent's font index instead of rescanning FONT_DIRS.
+        with ProcessPoolExecutor(max_workers=n_chunks, initializer=install_index, initargs=(font_index(),)) as ex:
+            futures = {ex.submit(_render_chunk, (doc.with_pages(chunk), paths, quality, bleed_mm, crop_marks, watermark, should_stop)): n for n, chunk in enumerate(chunks)}
+            try:
+                for fut in as_completed(futures):
+                    n = futures[fut]
+                    parts[n] = fut.result()
+                    if progress:
+                        progress(len(chunks[n]))
+            except BaseException:
+                ex.shutdown(wait=True, cancel_futures=True)
+                for fut, n in futures.items():
+                    if parts[n] is None and fut.done() and not fut.cancelled() and fut.exception() is None:
+                        parts[n] = fut.result()
+                raise
+        pdf = fitz.open()
+        for part in parts:
+            with fitz.open(part) as src:
+                pdf.insert_pdf(src)
+    finally:
+        for part in parts:
+            if part:
+                os.remove(part)
+    return pdf, True
+
+
+def _build_pdf(
+    document: Dict[str, Any] | Document,
+    resolve_asset_path: Callable[[str], str | None],
+    quality: str,
+    bleed_mm: float,
+    crop_marks: bool,
+    watermark: bool,
+    workers: int,
+    fragments: Any,
+    page_indices: List[int] | None = None,
+    progress: Callable[[int], None] | None = None,
+    should_stop: Callable[[], bool] | None = None,
+) -> tuple[fitz.Document, int]:
+    """Assemble the output document; returns (pdf, garbage level to save with)."""
+    doc = document if isinstance(document, Document) else compile_document(document)
+    pages = list(doc.pages)
+    if page_indices is not None:
+        pages = [pages[i] for i in page_indices]
+    if fragments is None:
+        pdf, merged = _render(doc, pages, resolve_asset_path, quality, bleed_mm, crop_marks, watermark, workers, progress, should_stop)
+        # garbage=4 also collapses identical image/XObject streams coming from different chunks.
+        return pdf, 4 if merged else 3
+
+    paths = {ref: resolve_asset_path(ref) for ref in _asset_refs(pages)}
+    options = (str(quality or "web").lower(), float(bleed_mm or 0.0), bool(crop_marks), bool(watermark))
+    hashes = [page_fingerprint(doc, page, paths, options) for page in pages]
+    cached: List[str | None] = [fragments.get(h) for h in hashes]
+    todo = [i for i, path in enumerate(cached) if path is None]
+    if progress and len(todo) < len(pages):
+        progress(len(pages) - len(todo))
+    rendered = None
+    if todo:
+        rendered, _merged = _render(doc, [pages[i] for i in todo], paths.get, quality, bleed_mm, crop_marks, watermark, workers, progress, should_stop)
+        for j, i in enumerate(todo):
+            with fitz.open() as one:
+                one.insert_pdf(rendered, from_page=j, to_page=j)
+                fragments.put(hashes[i], one.tobytes(garbage=3, deflate=True))
+
+    # Pages are copied in order, one source page at a time; fragments are read from disk.
+    pdf = fitz.open()
+    pos = {i: j for j, i in enumerate(todo)}
+    for i, path in enumerate(cached):
+        if path is None:
+            pdf.insert_pdf(rendered, from_page=pos[i], to_page=pos[i])
+        else:
+            with fitz.open(path) as src:
+                pdf.insert_pdf(src)
+    if rendered is not None:
+        rendered.close()
+    return pdf, 4
 
 
 def export_document_to_pdf(
-    document: Dict[str, Any],
+    document: Dict[str, Any] | Document,
     resolve_asset_path: Callable[[str], str | None],
     quality: str = "web",
     bleed_mm: float = 3.0,
     crop_marks: bool = False,
     watermark: bool = False,
+    workers: int = 1,
+    fragments: Any = None,
+    page_indices: List[int] | None = None,
+    progress: Callable[[int], None] | None = None,
+    should_stop: Callable[[], bool] | None = None,
 ) -> bytes:
-    """Render the scene-graph document into a PDF.
+    """Render the scene-graph document (dict or compiled Document) into a PDF.
 
     This is intentionally pragmatic: it outputs a correct PDF for previews/prints,
     but does not aim for perfect typography at this stage.
+
+    ``quality`` selects a QUALITY_PROFILES entry (web, screen, print): every
+    image is downsampled to that effective DPI for its frame.
+
+    With ``workers > 1`` pages are split into contiguous chunks rendered in a
+    process pool and merged in order; page content is identical to the serial
+    path (duplicate images across chunks are merged again on save).
+
+    ``fragments`` (get(hash) -> path | None, put(hash, bytes)) enables
+    incremental export: each page is fingerprinted, unchanged pages come from
+    the cache as single-page PDFs and only the rest are rendered.
+
+    ``page_indices`` (see select_pages) limits the output to those pages;
+    nothing else is rendered or resolved.
+
+    ``progress(n)`` is told whenever ``n`` more pages are done; ``should_stop()``
+    is polled before every page and raises ExportCancelled when it returns True.
+    """
+    pdf, garbage = _build_pdf(document, resolve_asset_path, quality, bleed_mm, crop_marks, watermark, workers, fragments, page_indices, progress, should_stop)
+    try:
+        if not has_embedded_fonts(pdf):
+            return pdf.tobytes(garbage=garbage, deflate=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "export.pdf")
+            _save(pdf, garbage, out)
+            with open(out, "rb") as f:
+                return f.read()
+    finally:
+        pdf.close()
+
+
+def export_document_to_file(document: Dict[str, Any] | Document, resolve_asset_path: Callable[[str], str | None], output_path: str, **options: Any) -> int:
+    """export_document_to_pdf() written straight to ``output_path``; returns the file size.
+
+    The PDF is serialized by MuPDF into the file, never as a Python bytes object.
+    Takes the same keyword options as export_document_to_pdf().
     """
+    pdf, garbage = _build_pdf(
+        document,
+        resolve_asset_path,
+        options.get("quality", "web"),
+        options.get("bleed_mm", 3.0),
+        options.get("crop_marks", False),
+        options.get("watermark", False),
+        options.get("workers", 1),
+        options.get("fragments"),
+        options.get("page_indices"),
+        options.get("progress"),
+        options.get("should_stop"),
+    )
+    try:
+        _save(pdf, garbage, output_path)
+    finally:
+        pdf.close()
+    return os.path.getsize(output_path)
 
-    settings = document.get("settings") or {}
-    pages = document.get("pages") or []
 
-    # Default A4 points
-    base_w = float(settings.get("pageWidth") or 595.0)
-    base_h = float(settings.get("pageHeight") or 842.0)
+def _save(pdf: fitz.Document, garbage: int, output_path: str) -> None:
+    """Save, subsetting embedded fonts to the glyphs actually used."""
+    if not has_embedded_fonts(pdf):
+        pdf.save(output_path, garbage=garbage, deflate=True)
+        return
+    # Pages from different chunks/fragments carry their own copy of each font;
+    # garbage=4 merges those first so every font is subset (and stored) once.
+    staged = f"{output_path}.fonts"
+    pdf.save(staged, garbage=4, deflate=True)
+    try:
+        subset_embedded_fonts(staged, output_path)
+    finally:
+        os.remove(staged)
+
+
+def _render_pages(
+    doc: Document,
+    pages: Sequence[Page],
+    resolve_asset_path: Callable[[str], str | None],
+    quality: str,
+    bleed_mm: float,
+    crop_marks: bool,
+    watermark: bool,
+    progress: Callable[[int], None] | None = None,
+    should_stop: Callable[[], bool] | None = None,
+) -> fitz.Document:
+    profile = QUALITY_PROFILES.get(str(quality or "web").lower(), QUALITY_PROFILES["web"])
 
     bleed_pt = _pt_bleed(float(bleed_mm or 0.0))
-    page_w = base_w + 2 * bleed_pt
-    page_h = base_h + 2 * bleed_pt
+    page_w = doc.width + 2 * bleed_pt
+    page_h = doc.height + 2 * bleed_pt
 
     pdf = fitz.open()
+    overlay = _overlay_page(page_w, page_h, bleed_pt, crop_marks, watermark)
+    fonts = FontEmbedder(pdf)
+    # Each distinct image file is embedded once; later frames reference the same xref.
+    image_xrefs: Dict[str, int] = {}
+    resampled: Dict[tuple, str] = {}
 
     for page in pages:
+        if should_stop is not None and should_stop():
+            if overlay is not None:
+                overlay.close()
+            pdf.close()
+            raise ExportCancelled()
         p = pdf.new_page(width=page_w, height=page_h)
 
-        # Draw page background if provided
-        bg = page.get("background")
-        if isinstance(bg, dict) and bg.get("fill"):
-            fill = _safe_color(bg.get("fill"))
-            p.draw_rect(fitz.Rect(0, 0, page_w, page_h), color=None, fill=fill)
-
-        for layer in (page.get("layers") or []):
-            if not isinstance(layer, dict):
-                continue
-            if not layer.get("visible", True) or layer.get("locked"):
-                # even if locked, we still render; 'locked' only affects editing.
-                pass
-
-            for item in (layer.get("items") or []):
-                if not isinstance(item, dict):
+        if page.background:
+            p.draw_rect(fitz.Rect(0, 0, page_w, page_h), color=None, fill=_rgb(page.background), fill_opacity=page.background[3])
+
+        # Hidden and locked layers are rendered too ('locked' only affects editing).
+        for item in page.items:
+            x = item.x + bleed_pt
+            y = item.y + bleed_pt
+            r = fitz.Rect(x, y, x + item.w, y + item.h)
+            kind = item.kind
+
+            if kind == SHAPE:
+                fill, stroke = item.fill, item.stroke
+                if fill is None and stroke is None:
                     continue
-                t = item.get("type")
-                rect = item.get("rect") or {}
-                x = float(rect.get("x") or 0.0) + bleed_pt
-                y = float(rect.get("y") or 0.0) + bleed_pt
-                w = float(rect.get("w") or 0.0)
-                h = float(rect.get("h") or 0.0)
-                r = fitz.Rect(x, y, x + w, y + h)
-
-                if t in ("Shape", "Rect", "Rectangle"):
-                    fill = _safe_color(item.get("fill") or [0, 0, 0]) if item.get("fill") else None
-                    stroke = _safe_color(item.get("stroke") or [0, 0, 0]) if item.get("stroke") else None
-                    sw = float(item.get("strokeWidth") or 0.0)
-                    p.draw_rect(r, color=stroke, fill=fill, width=sw)
-
-                elif t in ("Line",):
-                    stroke = _safe_color(item.get("stroke") or [0, 0, 0])
-                    sw = float(item.get("strokeWidth") or 1.0)
-                    x2 = float(item.get("x2") or (x + w))
-                    y2 = float(item.get("y2") or (y + h))
-                    p.draw_line(fitz.Point(x, y), fitz.Point(x2, y2), color=stroke, width=sw)
-
-                elif t in ("ImageFrame", "LockedLogoStamp"):
-                    asset_id = item.get("assetRef") or item.get("assetId")
-                    if not asset_id:
-                        continue
-                    path = resolve_asset_path(str(asset_id))
-                    if path and os.path.exists(path):
-                        try:
-                            p.insert_image(r, filename=path, keep_proportion=False)
-                        except Exception:
-                            # Ignore broken images
-                            pass
-
-                elif t == "TextFrame":
-                    txt = _collect_text(item)
-                    if not txt:
-                        continue
-                    # Basic typography
-                    color = _safe_color(item.get("color") or item.get("fill") or [0, 0, 0])
-                    fontsize = float(item.get("fontSize") or 12)
-                    align = item.get("align") or "left"
-                    align_map = {"left": 0, "center": 1, "right": 2, "justify": 3}
-                    a = align_map.get(str(align).lower(), 0)
+                p.draw_rect(
+                    r, color=_rgb(stroke), fill=_rgb(fill), width=item.stroke_width,
+                    stroke_opacity=stroke[3] if stroke else 1, fill_opacity=fill[3] if fill else 1,
+                )
+
+            elif kind == LINE:
+                x2 = item.x2 or (x + item.w)
+                y2 = item.y2 or (y + item.h)
+                p.draw_line(fitz.Point(x, y), fitz.Point(x2, y2), color=_rgb(item.stroke), width=item.stroke_width, stroke_opacity=item.stroke[3])
+
+            elif kind == IMAGE:
+                if not item.asset_ref:
+                    continue
+                path = resolve_asset_path(item.asset_ref)
+                if path and os.path.exists(path):
                     try:
-                        p.insert_textbox(
-                            r,
-                            txt,
-                            fontsize=fontsize,
-                            fontname="helv",
-                            color=color,
-                            align=a,
-                        )
+                        rkey = (path, round(item.w), round(item.h))
+                        if rkey not in resampled:
+                            resampled[rkey] = _resampled_image(path, r, profile)
+                        path = resampled[rkey]
+                        xref = image_xrefs.get(path)
+                        if xref:
+                            p.insert_image(r, xref=xref, keep_proportion=False)
+                        else:
+                            image_xrefs[path] = p.insert_image(r, filename=path, keep_proportion=False)
                     except Exception:
+                        # Ignore broken images
                         pass
 
-        # Crop marks (very simple)
-        if crop_marks and bleed_pt > 0:
-            m = bleed_pt
-            cm = 12
-            # top-left
-            p.draw_line((m, 0), (m, cm), color=(0, 0, 0), width=0.5)
-            p.draw_line((0, m), (cm, m), color=(0, 0, 0), width=0.5)
-            # top-right
-            p.draw_line((page_w - m, 0), (page_w - m, cm), color=(0, 0, 0), width=0.5)
-            p.draw_line((page_w - cm, m), (page_w, m), color=(0, 0, 0), width=0.5)
-            # bottom-left
-            p.draw_line((m, page_h - cm), (m, page_h), color=(0, 0, 0), width=0.5)
-            p.draw_line((0, page_h - m), (cm, page_h - m), color=(0, 0, 0), width=0.5)
-            # bottom-right
-            p.draw_line((page_w - m, page_h - cm), (page_w - m, page_h), color=(0, 0, 0), width=0.5)
-            p.draw_line((page_w - cm, page_h - m), (page_w, page_h - m), color=(0, 0, 0), width=0.5)
-
-        if watermark:
-            p.insert_text(
-                (page_w * 0.15, page_h * 0.5),
-                "PREVIEW",
-                fontsize=80,
-                rotate=25,
-                color=(0.7, 0.7, 0.7),
-                render_mode=0,
-                overlay=True,
-            )
-
-    # Optimize slightly
-    if quality == "web":
-        pdf.saveIncr()
-
-    out = pdf.tobytes()
-    pdf.close()
-    return out
+            elif kind == TEXT:
+                if not item.text:
+                    continue
+                # Basic typography; families that are not installed fall back to
+                # the club font, then to Helvetica.
+                font_path = resolve_font(item.font_family, item.font_weight, item.italic) or resolve_font(doc.font, item.font_weight, item.italic)
+                text_args = dict(fontsize=item.font_size, color=_rgb(item.color), fill_opacity=item.color[3], align=item.align)
+                try:
+                    p.insert_textbox(r, item.text, fontname=fonts.fontname(p, font_path) if font_path else "helv", **text_args)
+                except Exception:
+                    if not font_path:
+                        logger.exception("Could not render a text frame")
+                        continue
+                    logger.warning("Font %s failed, falling back to Helvetica", font_path, exc_info=True)
+                    try:
+                        p.insert_textbox(r, item.text, fontname="helv", **text_args)
+                    except Exception:
+                        logger.exception("Could not render a text frame")
+
+        if overlay is not None:
+            p.show_pdf_page(p.rect, overlay, 0, overlay=True)
+        if progress is not None:
+            progress(1)
+
+    if overlay is not None:
+        overlay.close()
+    return pdf
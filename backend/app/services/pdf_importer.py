@@ -1,52 +1,350 @@
 from __future__ import annotations
-from typing import Dict, Any, List, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Deque, Dict, Any, FrozenSet, List, Optional, Tuple
+import hashlib
+import os
 import uuid
 import fitz
+from PIL import Image
 from sqlalchemy.orm import Session
 
+from app.core.settings import settings
 from app.models.models import Asset
-from app.services.storage import save_local_file
+from app.services.storage import discard_tmp, hash_file, new_tmp_path, store_asset_file
 
 A4_W, A4_H = 595.2756, 841.8898
+# Pages per pool task: small enough to balance uneven pages, large enough that
+# re-opening the PDF in the worker stays negligible.
+PAGES_PER_TASK = 4
+# Tasks submitted ahead of the merge, per worker: enough to keep workers busy,
+# bounded so extracted pages (temp files) never pile up on long PDFs.
+TASKS_AHEAD_PER_WORKER = 2
+# Background encoding: photographic pages (embedded images covering at least
+# PHOTO_COVERAGE of the page) go lossy, flat art / text stays PNG.
+PHOTO_COVERAGE = 0.2
+MIME = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp"}
+# extract_image() formats that can be stored as they are, by our extension.
+RAW_EXT = {"png": "png", "jpeg": "jpg", "jpg": "jpg", "webp": "webp"}
+# "vector" mode: pages with more drawing operations than this are rasterized anyway.
+MAX_VECTOR_ITEMS = 300
+IMPORT_MODES = ("safe", "vector")
+# Quality for JPEG/JPX images that cannot be kept as embedded (CMYK, /Decode).
+JPEG_REENCODE_QUALITY = 90
 
-def _render_page_image(doc: fitz.Document, page_index: int, scale: float=2.0) -> bytes:
-    page = doc.load_page(page_index)
-    mat = fitz.Matrix(scale, scale)
-    pix = page.get_pixmap(matrix=mat, alpha=False)
-    return pix.tobytes("png")
+def import_parallelism(workers: int | None = None) -> int:
+    n = int(workers or settings.IMPORT_PARALLELISM or os.cpu_count() or 1)
+    return max(1, min(n, os.cpu_count() or 1))
+
+def raster_scale(page_w: float, page_h: float) -> float:
+    """Pixels per point for a background raster: IMPORT_RASTER_DPI, capped at IMPORT_RASTER_MAX_PX."""
+    scale = max(1, settings.IMPORT_RASTER_DPI) / 72.0
+    longest = max(page_w, page_h) * scale
+    if settings.IMPORT_RASTER_MAX_PX and longest > settings.IMPORT_RASTER_MAX_PX:
+        scale *= settings.IMPORT_RASTER_MAX_PX / longest
+    return scale
+
+def _image_coverage(page: fitz.Page, infos: List[Dict[str, Any]]) -> float:
+    area = abs(page.rect) or 1.0
+    covered = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in infos)
+    return min(1.0, covered / area)
+
+def _render_page_image(page: fitz.Page, photo: bool) -> Tuple[str, str]:
+    """Background raster as ``(tmp_path, ext)``: JPEG/WebP for photographic pages, PNG otherwise."""
+    scale = raster_scale(float(page.rect.width), float(page.rect.height))
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    if not photo:
+        tmp = new_tmp_path(".png")
+        pix.save(tmp, output="png")
+        return tmp, "png"
+    quality = int(settings.IMPORT_PHOTO_QUALITY)
+    if (settings.IMPORT_PHOTO_FORMAT or "").lower() == "webp":
+        tmp = new_tmp_path(".webp")
+        Image.frombytes("RGB", (pix.width, pix.height), pix.samples).save(tmp, format="WEBP", quality=quality, method=4)
+        return tmp, "webp"
+    tmp = new_tmp_path(".jpg")
+    pix.save(tmp, output="jpg", jpg_quality=quality)
+    return tmp, "jpg"
+
+def _save_tmp(data: bytes, ext: str = "png") -> str:
+    tmp = new_tmp_path(f".{ext}")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    return tmp
+
+def _spooled(path: str, ext: str = "png") -> Tuple[str, str, int, str]:
+    sha, size = hash_file(path)
+    return path, sha, size, ext
+
+def _hex(rgb) -> str | None:
+    if not rgb:
+        return None
+    return "#" + "".join(f"{max(0, min(255, round(c * 255))):02x}" for c in rgb[:3])
+
+def _vector_items(page: fitz.Page, page_w: float, page_h: float) -> List[Dict[str, Any]] | None:
+    """Shapes and lines for a page drawn only with rectangles and straight lines (else None)."""
+    drawings = page.get_drawings()
+    if sum(len(d["items"]) for d in drawings) > MAX_VECTOR_ITEMS:
+        return None
+    sx, sy = A4_W / page_w, A4_H / page_h
+    items: List[Dict[str, Any]] = []
+    for d in drawings:
+        stroke = _hex(d.get("color")) if "s" in (d.get("type") or "") else None
+        fill = _hex(d.get("fill")) if "f" in (d.get("type") or "") else None
+        width = float(d.get("width") or 0) * sx
+        opacity = (d.get("fill_opacity") if fill else d.get("stroke_opacity"))
+        for it in d["items"]:
+            if it[0] == "re":
+                o = {"type":"Shape", "rect": _map_rect(fitz.Rect(it[1]), page_w, page_h), "fill": fill, "stroke": stroke, "strokeWidth": width if stroke else 0}
+            elif it[0] == "l":
+                p1, p2 = it[1], it[2]
+                # rect goes from the start to the end point (w/h may be negative).
+                r = {"x": float(p1.x * sx), "y": float(p1.y * sy), "w": float((p2.x - p1.x) * sx), "h": float((p2.y - p1.y) * sy)}
+                o = {"type":"Line", "rect": r, "stroke": stroke or "#000000", "strokeWidth": width or 1.0}
+            else:
+                # Curves / quads: keep the raster background for this page.
+                return None
+            if opacity is not None and opacity < 1:
+                o["opacity"] = float(opacity)
+            items.append(o)
+    return items
 
 def _map_rect(r: fitz.Rect, page_w: float, page_h: float):
     sx = A4_W / page_w
     sy = A4_H / page_h
     return {"x": float(r.x0 * sx), "y": float(r.y0 * sy), "w": float((r.x1 - r.x0) * sx), "h": float((r.y1 - r.y0) * sy)}
 
-def _mk_asset(db: Session, club_id: str, png_bytes: bytes, base_name: str) -> str:
-    # Use the same id on disk and in the DB so every pipeline (editor, exporter, importer) can resolve assets reliably.
-    asset_id, _path = save_local_file(png_bytes, f"{base_name}.png")
-    db.add(Asset(id=asset_id, club_id=club_id, filename=f"{base_name}.png", mime="image/png", storage_path=asset_id, is_catalog=False))
-    return asset_id
+def _passthrough(doc: fitz.Document, xref: int, raw: Dict[str, Any]) -> bool:
+    """True when the embedded stream can be stored as-is (browsers and the exporter read it).
 
-def import_pdf_to_document(db: Session, club_id: str, pdf_bytes: bytes, mode: str="safe", preset: str="smart") -> Tuple[Dict[str, Any], List[str]]:
-    """Import PDF into native-ish document.
+    Only plain gray/RGB baseline JPEG qualifies: JPX is not shown by most
+    browsers, CMYK JPEGs render wrongly, and a soft mask or /Decode array
+    would be lost without re-rendering the image.
+    """
+    if raw.get("ext") != "jpeg" or raw.get("colorspace") not in (1, 3) or raw.get("smask"):
+        return False
+    return doc.xref_get_key(xref, "Decode")[0] == "null"
 
-    - Always creates a background raster of each page (safe mode).
-    - Extracts text blocks into editable TextFrames.
-    - Extracts embedded images into ImageFrames when possible.
+def _convert_image(doc: fitz.Document, xref: int) -> Tuple[bytes, str, str] | None:
+    """``(image bytes, content hash, ext)`` of an embedded image, None if it cannot be stored.
+
+    Plain JPEG streams are kept as embedded (hash over the stream); anything
+    else is decoded (hash over the decoded pixels) and re-encoded: JPEG for
+    other lossy photos, PNG for the rest.
     """
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages=[]
-    created_asset_ids: List[str] = []
+    raw = doc.extract_image(xref)
+    im_bytes = raw.get("image")
+    if not im_bytes:
+        return None
+    if _passthrough(doc, xref, raw):
+        return im_bytes, hashlib.sha1(im_bytes).hexdigest(), "jpg"
+    # Convert to PNG via pixmap for consistency
+    try:
+        pix = fitz.Pixmap(doc, xref)
+        if pix.colorspace and pix.colorspace.n > 3:  # CMYK etc
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        if raw.get("smask"):
+            # Keep the transparency the PDF applies through the soft mask.
+            pix = fitz.Pixmap(pix, fitz.Pixmap(doc, raw["smask"]))
+        h = hashlib.sha1(f"{pix.width}x{pix.height}x{pix.n}:".encode())
+        h.update(pix.samples_mv)
+        if raw.get("ext") in ("jpeg", "jpx") and not pix.alpha:
+            # Already lossy photos stay JPEG; PNG would multiply their size.
+            return pix.tobytes("jpg", jpg_quality=JPEG_REENCODE_QUALITY), h.hexdigest(), "jpg"
+        return pix.tobytes("png"), h.hexdigest(), "png"
+    except Exception:
+        # Undecodable: keep the stream only when browsers read it as-is (JPX, JBIG2, CCITT... are skipped).
+        ext = RAW_EXT.get(raw.get("ext"))
+        if ext is None:
+            return None
+        return im_bytes, hashlib.sha1(im_bytes).hexdigest(), ext
 
-    for i in range(doc.page_count):
-        page = doc.load_page(i)
-        page_w, page_h = float(page.rect.width), float(page.rect.height)
+def _extract_page(doc: fitz.Document, i: int, mode: str = "safe", owned: FrozenSet[int] = frozenset(), pixels: Optional[set] = None) -> Dict[str, Any]:
+    """Everything the document needs from page ``i``; rasters go to hashed temp files.
 
-        # Background raster
-        bg_png = _render_page_image(doc, i, scale=2.0)
-        bg_asset_id = _mk_asset(db, club_id, bg_png, f"import_bg_p{i+1}")
-        created_asset_ids.append(bg_asset_id)
+    Runs in pool workers, so it touches neither the DB nor the blob store.
+    In "vector" mode a page without images whose drawings are only rectangles
+    and lines gets no background raster: its drawings become Shapes/Lines and
+    its text frames keep their size and color.
+
+    Only images in ``owned`` (the ones first used on this page) are converted;
+    others are listed by xref and resolved against the import-wide map.
+    ``pixels`` collects the pixel hashes written by this task, so an identical
+    image under another xref is not encoded twice.
+    """
+    page = doc.load_page(i)
+    page_w, page_h = float(page.rect.width), float(page.rect.height)
+    infos = page.get_image_info()
+    shapes = _vector_items(page, page_w, page_h) if mode == "vector" and not infos else None
+    if shapes is None:
+        bg = _spooled(*_render_page_image(page, photo=_image_coverage(page, infos) >= PHOTO_COVERAGE))
+    else:
+        bg = None
+    out: Dict[str, Any] = {"bg": bg, "shapes": shapes or [], "texts": [], "images": []}
+    try:
+        # Text extraction
+        td = page.get_text("dict")
+        for b in td.get("blocks", []):
+            if b.get("type") != 0:
+                continue
+            # block bbox
+            x0,y0,x1,y1 = b.get("bbox", [0,0,0,0])
+            lines=[]
+            for ln in b.get("lines", []):
+                segs=[sp.get("text","") for sp in ln.get("spans", [])]
+                if segs:
+                    lines.append("".join(segs))
+            text = "\n".join([l.strip() for l in lines if l.strip()])
+            if not text:
+                continue
+            style: Dict[str, Any] = {}
+            if bg is None:
+                # Nothing underneath: the frame itself must look like the source text.
+                span = next(sp for ln in b["lines"] for sp in ln.get("spans", []))
+                size = float(span.get("size") or 12)
+                style = {"fontSize": round(size * A4_H / page_h, 2), "color": "#%06x" % int(span.get("color") or 0)}
+                if span.get("flags", 0) & 16:
+                    style["fontWeight"] = 700
+                if span.get("flags", 0) & 2:
+                    style["fontStyle"] = "italic"
+                # Text boxes need a little slack or the last line does not fit when re-set.
+                x1, y1 = x1 + size * 0.5, y1 + size * 0.5
+            out["texts"].append((_map_rect(fitz.Rect(x0,y0,x1,y1), page_w, page_h), text, style))
+    except Exception:
+        pass
+    try:
+        # Image extraction (embedded): (xref, spooled file | None, pixel hash | None, rects)
+        pixels = set() if pixels is None else pixels
+        seen=set()
+        for img in page.get_images(full=True):
+            xref = img[0]
+            if xref in seen:
+                continue
+            seen.add(xref)
+            rects = [_map_rect(r, page_w, page_h) for r in page.get_image_rects(xref)[:4]]
+            spooled = phash = None
+            if xref in owned:
+                converted = _convert_image(doc, xref)
+                if converted is not None:
+                    im_bytes, phash, ext = converted
+                    if phash not in pixels:
+                        pixels.add(phash)
+                        spooled = _spooled(_save_tmp(im_bytes, ext), ext)
+            if rects or phash:
+                out["images"].append((xref, spooled, phash, rects))
+    except Exception:
+        pass
+    return out
+
+def _extract_pages(args: Tuple[str, Tuple[int, ...], str, FrozenSet[int]]) -> List[Dict[str, Any]]:
+    """Process-pool entry point: open the PDF independently and extract the given pages."""
+    path, indices, mode, owned = args
+    results: List[Dict[str, Any]] = []
+    pixels: set = set()
+    try:
+        with fitz.open(path, filetype="pdf") as doc:
+            for i in indices:
+                res = _extract_page(doc, i, mode, owned, pixels)
+                res["index"] = i
+                results.append(res)
+                # MuPDF keeps the fonts/images it decoded for the page in its
+                # resource store (up to 256 MB per process); drop them so memory
+                # stays per page whatever the page count.
+                fitz.TOOLS.store_shrink(100)
+    except BaseException:
+        _discard_results(results)
+        raise
+    return results
+
+def _discard_results(results: List[Dict[str, Any]]) -> None:
+    for r in results:
+        if r["bg"]:
+            discard_tmp(r["bg"][0])
+        for _xref, spooled, _phash, _rects in r["images"]:
+            if spooled:
+                discard_tmp(spooled[0])
+
+def _mk_asset(db: Session, club_id: str, spooled: Tuple[str, str, int, str], base_name: str) -> str:
+    # Re-importing the same PDF produces identical rasters, which land on the same blob.
+    tmp, sha, size, ext = spooled
+    return store_asset_file(db, tmp, sha, size, f"{base_name}.{ext}", MIME[ext], club_id=club_id, kind="import").id
+
+class _ImportedImages:
+    """Import-wide image map: xref -> pixel hash -> asset, one Asset per distinct image.
+
+    Converted files wait here until a page actually frames them; whatever is
+    never used is discarded at the end. Images stored by pages of an earlier,
+    interrupted run are known by xref and by content (see seed()).
+    """
+
+    def __init__(self, db: Session, club_id: str, created_asset_ids: List[str]):
+        self.db, self.club_id, self.created = db, club_id, created_asset_ids
+        self.xref_pixels: Dict[int, str] = {}
+        self.assets: Dict[str, str] = {}
+        self.pending: Dict[str, Tuple[str, str, int, str]] = {}
+        self.xref_assets: Dict[int, str] = {}
+        self.by_content: Dict[str, str] = {}
 
-        bg_item = {
+    def seed(self, resume: Dict[int, Tuple[Dict[str, Any], List[str]]]) -> None:
+        """Reuse the images of resumed pages: by xref (from their frame ids) and by file hash."""
+        ids = set()
+        for page, asset_ids in resume.values():
+            ids.update(asset_ids)
+            for layer in page.get("layers") or []:
+                for it in layer.get("items") or []:
+                    if it.get("role") != "imported_image":
+                        continue
+                    # Frame ids are "im-<page>-<xref>-<n>" (_build_page).
+                    parts = str(it.get("id") or "").split("-")
+                    if len(parts) == 4 and parts[2].isdigit() and it.get("assetRef"):
+                        self.xref_assets[int(parts[2])] = it["assetRef"]
+        if ids:
+            rows = self.db.query(Asset.id, Asset.content_hash).filter(Asset.id.in_(ids), Asset.kind == "import")
+            self.by_content = {sha: aid for aid, sha in rows if sha}
+
+    def offer(self, xref: int, spooled, phash: str | None) -> None:
+        if phash is None:
+            return
+        self.xref_pixels[xref] = phash
+        if spooled is None:
+            return
+        if phash in self.assets or phash in self.pending:
+            discard_tmp(spooled[0])
+        else:
+            self.pending[phash] = spooled
+
+    def asset_for(self, xref: int) -> str | None:
+        if xref in self.xref_assets:
+            return self.xref_assets[xref]
+        phash = self.xref_pixels.get(xref)
+        if phash is None:
+            return None
+        asset_id = self.assets.get(phash)
+        if asset_id is None:
+            spooled = self.pending.pop(phash, None)
+            if spooled is None:
+                return None
+            asset_id = self.by_content.get(spooled[1])
+            if asset_id is not None:
+                discard_tmp(spooled[0])
+            else:
+                asset_id = _mk_asset(self.db, self.club_id, spooled, f"import_img_{xref}")
+                self.created.append(asset_id)
+            self.assets[phash] = asset_id
+        return asset_id
+
+    def discard(self) -> None:
+        for spooled in self.pending.values():
+            discard_tmp(spooled[0])
+        self.pending.clear()
+
+def _build_page(db: Session, club_id: str, i: int, res: Dict[str, Any], created_asset_ids: List[str], images: _ImportedImages) -> Dict[str, Any]:
+    bg_items: List[Dict[str,Any]] = []
+    if res["bg"]:
+        bg_asset_id = _mk_asset(db, club_id, res["bg"], f"import_bg_p{i+1}")
+        created_asset_ids.append(bg_asset_id)
+        bg_items.append({
             "id": f"bg-{i}",
             "type":"ImageFrame",
             "rect":{"x":0,"y":0,"w":A4_W,"h":A4_H},
@@ -55,89 +353,166 @@ def import_pdf_to_document(db: Session, club_id: str, pdf_bytes: bytes, mode: st
             "crop":{"x":0,"y":0,"w":1,"h":1},
             "locked": True,
             "role":"pdf_background"
-        }
+        })
 
-        overlay_items: List[Dict[str,Any]] = []
+    overlay_items: List[Dict[str,Any]] = []
+    for shape in res["shapes"]:
+        kind = "sh" if shape["type"] == "Shape" else "ln"
+        overlay_items.append({"id": f"{kind}-{i}-{len(overlay_items)}", **shape, "role": "imported_vector"})
+    for rect, text, style in res["texts"]:
+        overlay_items.append({
+            "id": f"tx-{i}-{len(overlay_items)}",
+            "type":"TextFrame",
+            "rect": rect,
+            "text":[{"text": text, "marks": {}}],
+            "styleRef":"Body",
+            "padding": 6,
+            **style,
+        })
+    for xref, spooled, phash, rects in res["images"]:
+        images.offer(xref, spooled, phash)
+        asset_id = images.asset_for(xref) if rects else None
+        if asset_id is None:
+            continue
+        for rr in rects:
+            if rr["w"] < 10 or rr["h"] < 10:
+                continue
+            overlay_items.append({
+                "id": f"im-{i}-{xref}-{len(overlay_items)}",
+                "type":"ImageFrame",
+                "rect": rr,
+                "assetRef": asset_id,
+                "fitMode":"cover",
+                "crop":{"x":0,"y":0,"w":1,"h":1},
+                "role":"imported_image",
+            })
 
-        # Text extraction
-        try:
-            td = page.get_text("dict")
-            for b in td.get("blocks", []):
-                if b.get("type") != 0:
-                    continue
-                # block bbox
-                x0,y0,x1,y1 = b.get("bbox", [0,0,0,0])
-                rect = _map_rect(fitz.Rect(x0,y0,x1,y1), page_w, page_h)
-                # build text
-                lines=[]
-                for ln in b.get("lines", []):
-                    segs=[]
-                    for sp in ln.get("spans", []):
-                        segs.append(sp.get("text",""))
-                    if segs:
-                        lines.append("".join(segs))
-                text = "\n".join([l.strip() for l in lines if l.strip()])
-                if not text:
-                    continue
-                overlay_items.append({
-                    "id": f"tx-{i}-{len(overlay_items)}",
-                    "type":"TextFrame",
-                    "rect": rect,
-                    "text":[{"text": text, "marks": {}}],
-                    "styleRef":"Body",
-                    "padding": 6,
-                })
-        except Exception:
-            pass
-
-        # Image extraction (embedded)
+    # Layers: background locked, overlay editable
+    layers=[
+        {"id":"bg","name":"PDF Fondo","visible":True,"locked":True,"items":bg_items},
+        {"id":"overlay","name":"Detectado","visible":True,"locked":False,"items":overlay_items},
+    ]
+    return {"id": f"p-{i}", "sectionType":"Imported", "layers": layers}
+
+def _merge(db: Session, club_id: str, results, resume: Dict[int, Tuple[Dict[str, Any], List[str]]], page_count: int,
+           pages: List[Dict[str, Any]], images: _ImportedImages, pending: List[List[Dict[str, Any]]], on_page) -> None:
+    """Turn extracted pages into document pages + assets, in page order, around the resumed ones."""
+    created_asset_ids = images.created
+    def _resumed_until(stop: int) -> None:
+        while len(pages) < stop and len(pages) in resume:
+            page, ids = resume[len(pages)]
+            pages.append(page)
+            created_asset_ids.extend(ids)
+
+    for chunk in results:
+        pending.append(chunk)
+        for res in chunk:
+            i = res["index"]
+            _resumed_until(i)
+            first = len(created_asset_ids)
+            pages.append(_build_page(db, club_id, i, res, created_asset_ids, images))
+            if on_page is not None:
+                on_page(i, pages[-1], created_asset_ids[first:])
+        pending.pop()
+    _resumed_until(page_count)
+
+def import_pdf_to_document(db: Session, club_id: str, pdf: bytes | str, mode: str="safe", preset: str="smart", workers: int | None = None,
+                           resume: Dict[int, Tuple[Dict[str, Any], List[str]]] | None = None, on_page=None) -> Tuple[Dict[str, Any], List[str]]:
+    """Import PDF into native-ish document.
+
+    ``pdf`` is either the raw bytes or a path to a PDF on disk (preferred for
+    uploads: MuPDF reads it lazily instead of keeping a second copy in memory).
+
+    - "safe" mode: a background raster of each page, at IMPORT_RASTER_DPI,
+      JPEG/WebP when the page is photographic and PNG otherwise.
+    - "vector" mode: like safe, but pages of only text, rectangles and lines
+      are rebuilt as native items without a raster.
+    - Extracts text blocks into editable TextFrames.
+    - Extracts embedded images into ImageFrames when possible.
+
+    Pages are extracted by up to ``workers`` processes (default
+    IMPORT_PARALLELISM: 1, i.e. serial; 0 = all cores), each opening the PDF
+    on its own; results are merged in page order, so the document does not
+    depend on it.
+    Memory stays flat in the page count: the PDF is read lazily from disk,
+    each page's MuPDF resources are released once it is extracted and only a
+    few tasks run ahead of the merge.
+
+    ``resume`` maps page index -> (page, asset ids) of pages imported by an
+    earlier, interrupted run; only the other pages are extracted.
+    ``on_page(index, page, asset_ids)`` is called as each new page is built
+    (its assets added to ``db`` but not committed), e.g. to checkpoint it.
+    """
+    resume = resume or {}
+    own_tmp = None
+    if not isinstance(pdf, str):
+        # Workers open the PDF by path.
+        own_tmp = pdf_path = new_tmp_path(".pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(pdf)
+    else:
+        pdf_path = pdf
+    created_asset_ids: List[str] = []
+    images = _ImportedImages(db, club_id, created_asset_ids)
+    images.seed(resume)
+    try:
+        with fitz.open(pdf_path, filetype="pdf") as doc:
+            page_count = doc.page_count
+            todo = [i for i in range(page_count) if i not in resume]
+            # Each embedded image is converted once, by the task of the first page using it
+            # (not at all when a resumed page already stored it).
+            first_use: Dict[int, int] = {}
+            for i in todo:
+                for img in doc.get_page_images(i):
+                    if img[0] not in images.xref_assets:
+                        first_use.setdefault(img[0], i)
+        tasks = []
+        for s in range(0, len(todo), PAGES_PER_TASK):
+            indices = tuple(todo[s:s + PAGES_PER_TASK])
+            owned = frozenset(x for x, i in first_use.items() if indices[0] <= i <= indices[-1])
+            tasks.append((pdf_path, indices, mode, owned))
+        n_workers = min(import_parallelism(workers), len(tasks))
+
+        pages=[]
+        pending: List[List[Dict[str, Any]]] = []
         try:
-            imgs = page.get_images(full=True)
-            seen=set()
-            for img in imgs:
-                xref = img[0]
-                if xref in seen:
-                    continue
-                seen.add(xref)
-                rects = page.get_image_rects(xref)
-                if not rects:
-                    continue
-                raw = doc.extract_image(xref)
-                im_bytes = raw.get("image")
-                if not im_bytes:
-                    continue
-                # Convert to PNG via pixmap for consistency
-                try:
-                    pix = fitz.Pixmap(doc, xref)
-                    if pix.n >= 5:  # CMYK etc
-                        pix = fitz.Pixmap(fitz.csRGB, pix)
-                    im_bytes = pix.tobytes("png")
-                except Exception:
-                    pass
-                asset_id = _mk_asset(db, club_id, im_bytes, f"import_img_{i+1}_{xref}")
-                created_asset_ids.append(asset_id)
-                for r in rects[:4]:
-                    rr = _map_rect(r, page_w, page_h)
-                    if rr["w"] < 10 or rr["h"] < 10:
-                        continue
-                    overlay_items.append({
-                        "id": f"im-{i}-{xref}-{len(overlay_items)}",
-                        "type":"ImageFrame",
-                        "rect": rr,
-                        "assetRef": asset_id,
-                        "fitMode":"cover",
-                        "crop":{"x":0,"y":0,"w":1,"h":1},
-                        "role":"imported_image",
-                    })
-        except Exception:
-            pass
-
-        # Layers: background locked, overlay editable
-        layers=[
-            {"id":"bg","name":"PDF Fondo","visible":True,"locked":True,"items":[bg_item]},
-            {"id":"overlay","name":"Detectado","visible":True,"locked":False,"items":overlay_items},
-        ]
-        pages.append({"id": f"p-{i}", "sectionType":"Imported", "layers": layers})
+            if n_workers <= 1:
+                results = map(_extract_pages, tasks)
+                _merge(db, club_id, results, resume, page_count, pages, images, pending, on_page)
+            else:
+                with ProcessPoolExecutor(max_workers=n_workers) as ex:
+                    # Consumed in submission order: earlier pages are stored while later ones
+                    # are extracted, with at most TASKS_AHEAD_PER_WORKER tasks per worker in flight.
+                    futures: Deque[Future] = deque()
+                    queued = iter(tasks)
+
+                    def _results():
+                        for t in islice(queued, n_workers * TASKS_AHEAD_PER_WORKER):
+                            futures.append(ex.submit(_extract_pages, t))
+                        while futures:
+                            chunk = futures[0].result()
+                            futures.popleft()
+                            for t in islice(queued, 1):
+                                futures.append(ex.submit(_extract_pages, t))
+                            yield chunk
+
+                    try:
+                        _merge(db, club_id, _results(), resume, page_count, pages, images, pending, on_page)
+                    except BaseException:
+                        ex.shutdown(wait=True, cancel_futures=True)
+                        for f in futures:
+                            if f.done() and not f.cancelled() and f.exception() is None:
+                                pending.append(f.result())
+                        raise
+        except BaseException:
+            for results in pending:
+                _discard_results(results)
+            raise
+        finally:
+            images.discard()
+    finally:
+        if own_tmp:
+            discard_tmp(own_tmp)
 
     out_doc = {
         "id": str(uuid.uuid4()),
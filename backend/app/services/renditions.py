@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.models import Asset
+from app.services.storage import get_local_path, store_asset
+
+logger = logging.getLogger("magazine")
+
+# Longest side in px. The original itself is the implicit largest rendition.
+RENDITION_SIZES: Dict[str, int] = {"thumb": 256, "screen": 1600}
+
+def generate_renditions(db: Session, asset: Asset) -> List[Asset]:
+    """Create the missing sized renditions for an image asset (not committed).
+
+    The original is decoded once (JPEG via draft mode, already reduced) and
+    each smaller size is derived from the previous one.
+    """
+    if asset.kind in ("rendition", "export") or not (asset.mime or "").startswith("image/"):
+        return []
+    have = {r for (r,) in db.query(Asset.rendition).filter(Asset.parent_id == asset.id)}
+    todo = sorted(((n, px) for n, px in RENDITION_SIZES.items() if n not in have), key=lambda kv: -kv[1])
+    try:
+        path = get_local_path(asset.id, db)
+        im = Image.open(path)
+    except (FileNotFoundError, OSError):
+        return []
+    created: List[Asset] = []
+    with im:
+        asset.width, asset.height = im.size
+        if not todo:
+            return []
+        largest = todo[0][1]
+        if im.format == "JPEG":
+            im.draft("RGB", (largest, largest))
+        im.load()
+        work = im
+        stem = os.path.splitext(asset.filename or "asset")[0]
+        for name, px in todo:
+            if max(work.size) <= px:
+                # Source already fits: consumers fall back to the original.
+                continue
+            work = work.copy()
+            work.thumbnail((px, px), Image.LANCZOS)
+            has_alpha = work.mode in ("RGBA", "LA", "P")
+            buf = io.BytesIO()
+            if has_alpha:
+                work.save(buf, format="PNG", optimize=True)
+                ext, mime = "png", "image/png"
+            else:
+                work.convert("RGB").save(buf, format="JPEG", quality=85, optimize=True)
+                ext, mime = "jpg", "image/jpeg"
+            r = store_asset(db, buf.getvalue(), f"{stem}_{name}.{ext}", mime, club_id=asset.club_id, is_catalog=asset.is_catalog, kind="rendition")
+            r.parent_id, r.rendition = asset.id, name
+            r.width, r.height = work.size
+            created.append(r)
+    return created
+
+def pick_rendition(db: Session, asset_id: str, min_px: int | None) -> str:
+    """Id of the smallest rendition whose longest side is >= ``min_px`` (else the original)."""
+    if not min_px:
+        return asset_id
+    rows = db.query(Asset.id, Asset.width, Asset.height).filter(Asset.parent_id == asset_id).all()
+    best = None
+    for rid, w, h in rows:
+        side = max(w or 0, h or 0)
+        if side >= min_px and (best is None or side < best[1]):
+            best = (rid, side)
+    return best[0] if best else asset_id
+
+def rendition_map(db: Session, asset_ids: Iterable[str], name: str) -> Dict[str, str]:
+    """``{original_id: rendition_id}`` for every id that has rendition ``name`` (one query)."""
+    ids = [a for a in set(asset_ids) if a]
+    if not ids:
+        return {}
+    rows = db.query(Asset.parent_id, Asset.id).filter(Asset.parent_id.in_(ids), Asset.rendition == name).all()
+    return {parent: rid for parent, rid in rows}
+
+def enqueue_renditions(asset_ids: Iterable[str]) -> Optional[str]:
+    """Schedule rendition generation on the worker. Best effort: never fails the caller."""
+    ids = [a for a in asset_ids if a]
+    if not ids:
+        return None
+    try:
+        from app.core.queue import q
+        from app.jobs import renditions_job
+        return q.enqueue(renditions_job, ids, settings.DATABASE_URL, job_timeout=900).get_id()
+    except Exception:
+        logger.exception("Could not enqueue renditions (originals will be served).")
+        return None
@@ -1,34 +1,311 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import os
+import shutil
 import uuid
-from typing import Tuple
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
 from app.core.settings import settings
+from app.models.models import Asset, Blob
+from app.services.storage_backends import get_backend
+
+logger = logging.getLogger("magazine")
+
+# asset_id -> absolute path. Stored files never move once written, so hits are
+# only re-validated with a cheap stat() instead of going back to the DB.
+_PATH_CACHE: Dict[str, str] = {}
+_PATH_CACHE_MAX = 20000
+CHUNK_SIZE = 1024 * 1024
+
+class UploadTooLarge(ValueError):
+    pass
 
 def ensure_dirs():
     os.makedirs(settings.STORAGE_LOCAL_DIR, exist_ok=True)
 
-def save_local_file(content: bytes, filename: str) -> Tuple[str, str]:
+def shard_key(asset_id: str, ext: str) -> str:
+    """Relative storage key for an asset: ``ab/cd/<asset_id><ext>``.
+
+    The two shard levels come from a hash of the id, so directories stay small
+    (65536 buckets) no matter how many files the store holds.
+    """
+    h = hashlib.sha1(asset_id.encode("utf-8")).hexdigest()
+    return f"{h[:2]}/{h[2:4]}/{asset_id}{ext}"
+
+def key_to_path(key: str) -> str:
+    return os.path.join(settings.STORAGE_LOCAL_DIR, *key.split("/"))
+
+def _remember(asset_id: str, path: str) -> None:
+    if len(_PATH_CACHE) >= _PATH_CACHE_MAX:
+        _PATH_CACHE.clear()
+    _PATH_CACHE[asset_id] = path
+
+def blob_key(sha256: str, ext: str) -> str:
+    """Relative storage key for a content-addressed blob: ``ab/cd/<sha256><ext>``."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+def new_tmp_path(suffix: str = ".part") -> str:
+    d = os.path.join(settings.STORAGE_LOCAL_DIR, "tmp")
+    os.makedirs(d, exist_ok=True)
+    return os.path.join(d, f"{uuid.uuid4().hex}{suffix}")
+
+def spool_to_storage(src: BinaryIO, max_bytes: int | None = None) -> Tuple[str, str, int]:
+    """Copy a file object into a temp file under the storage dir, chunk by chunk.
+
+    Returns ``(tmp_path, sha256, size)``. Memory use is bounded by CHUNK_SIZE;
+    raises UploadTooLarge (and removes the temp file) once ``max_bytes`` is exceeded.
+    """
+    tmp = new_tmp_path()
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                h.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        discard_tmp(tmp)
+        raise
+    return tmp, h.hexdigest(), size
+
+def hash_file(path: str) -> Tuple[str, int]:
+    """``(sha256, size)`` of a file, read in CHUNK_SIZE pieces."""
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            h.update(chunk)
+    return h.hexdigest(), size
+
+def discard_tmp(tmp_path: str) -> None:
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+def _register_blob(db: Session, sha: str, size: int, filename: str, put: Callable[[str], None]) -> Tuple[str, str]:
     ensure_dirs()
-    ext = os.path.splitext(filename)[1].lower() or ".bin"
-    asset_id = uuid.uuid4().hex
-    path = os.path.join(settings.STORAGE_LOCAL_DIR, f"{asset_id}{ext}")
-    with open(path, "wb") as f:
-        f.write(content)
-    return asset_id, path
-
-def get_local_path(asset_id_or_path: str) -> str:
+    backend = get_backend()
+    stored = None  # key this call wrote, if any (``put`` may consume its source)
+    for _attempt in range(3):
+        # Locked until commit, so a concurrent release / GC cannot drop it under us.
+        blob = db.query(Blob).filter(Blob.sha256 == sha).with_for_update().one_or_none()
+        if blob is not None:
+            res = db.execute(update(Blob).where(Blob.sha256 == sha).values(refcount=Blob.refcount + 1))
+            if res.rowcount == 0:
+                # Deleted between the read and the update: register it again.
+                db.expunge(blob)
+                continue
+            if stored and stored != blob.storage_path:
+                # Lost the insert race after writing our own copy.
+                if backend.exists(blob.storage_path):
+                    backend.delete(stored)
+                else:
+                    blob.storage_path = stored
+            elif not backend.exists(blob.storage_path):
+                put(blob.storage_path)
+            return sha, blob.storage_path
+        if stored is None:
+            ext = os.path.splitext(filename)[1].lower() or ".bin"
+            stored = blob_key(sha, ext)
+            if backend.exists(stored):
+                # An object without a row may be about to be deleted by whoever
+                # dropped the row (files go after the commit): never adopt it.
+                stored = blob_key(sha, f".{uuid.uuid4().hex[:8]}{ext}")
+            put(stored)
+        try:
+            with db.begin_nested():
+                db.add(Blob(sha256=sha, storage_path=stored, size=size, refcount=1))
+            return sha, stored
+        except IntegrityError:
+            # Another writer registered the same content concurrently.
+            continue
+    raise RuntimeError(f"Could not register blob {sha}")
+
+def acquire_blob(db: Session, content: bytes, filename: str) -> Tuple[str, str]:
+    """Take a reference on the blob holding ``content``; return ``(sha256, storage_key)``.
+
+    Bytes are only written the first time a given content hash is seen, so
+    storage volume and write I/O scale with unique content.
+    """
+    sha = hashlib.sha256(content).hexdigest()
+    return _register_blob(db, sha, len(content), filename, lambda key: get_backend().put_bytes(key, content))
+
+def acquire_blob_from_tmp(db: Session, tmp_path: str, sha: str, size: int, filename: str) -> Tuple[str, str]:
+    """Like acquire_blob, for a file spooled by spool_to_storage.
+
+    The temp file is renamed into place (atomic; a multipart upload for S3) or
+    dropped if the content is already stored.
+    """
+    try:
+        return _register_blob(db, sha, size, filename, lambda key: get_backend().put_file(key, tmp_path))
+    finally:
+        discard_tmp(tmp_path)
+
+def release_blob(db: Session, sha256: str) -> bool:
+    """Drop one reference; drop the blob once nothing points at it.
+
+    Returns True when the blob was dropped. Its file is deleted only after
+    ``db`` commits (see drop_blob).
+    """
+    db.execute(update(Blob).where(Blob.sha256 == sha256).values(refcount=Blob.refcount - 1))
+    blob = db.query(Blob).filter(Blob.sha256 == sha256).with_for_update().populate_existing().one_or_none()
+    if blob is None or blob.refcount > 0:
+        return False
+    drop_blob(db, blob)
+    return True
+
+_DELETE_AFTER_COMMIT = "blob_keys_to_delete"
+
+def drop_blob(db: Session, blob: Blob) -> None:
+    """Delete a Blob row; its backend object goes once the transaction commits.
+
+    A rollback keeps the row, so it keeps the file too.
+    """
+    db.delete(blob)
+    db.info.setdefault(_DELETE_AFTER_COMMIT, []).append(blob.storage_path)
+
+@event.listens_for(Session, "after_commit")
+def _delete_committed_blobs(db: Session) -> None:
+    if db.in_nested_transaction():
+        return
+    keys = db.info.pop(_DELETE_AFTER_COMMIT, None)
+    if not keys:
+        return
+    backend = get_backend()
+    for key in keys:
+        try:
+            backend.delete(key)
+        except Exception:
+            logger.exception("Could not delete blob object %s", key)
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_uncommitted_blobs(db: Session, transaction) -> None:
+    if transaction.parent is None:
+        db.info.pop(_DELETE_AFTER_COMMIT, None)
+
+def store_asset(db: Session, content: bytes, filename: str, mime: str, club_id: str | None = None, is_catalog: bool = False, kind: str = "upload") -> Asset:
+    """Create an Asset row backed by a shared content-addressed blob.
+
+    The row is added to ``db`` but not committed.
+    """
+    sha, key = acquire_blob(db, content, filename)
+    return _new_asset(db, sha, key, filename, mime, club_id, is_catalog, kind)
+
+def store_asset_file(db: Session, tmp_path: str, sha: str, size: int, filename: str, mime: str, club_id: str | None = None, is_catalog: bool = False, kind: str = "upload") -> Asset:
+    """store_asset() for a temp file (spool_to_storage() or new_tmp_path() + hash_file())."""
+    sha, key = acquire_blob_from_tmp(db, tmp_path, sha, size, filename)
+    return _new_asset(db, sha, key, filename, mime, club_id, is_catalog, kind)
+
+def _new_asset(db: Session, sha: str, key: str, filename: str, mime: str, club_id: str | None, is_catalog: bool, kind: str) -> Asset:
+    asset = Asset(id=uuid.uuid4().hex, club_id=club_id, filename=filename, mime=mime,
+                  storage_path=key, content_hash=sha, is_catalog=is_catalog, kind=kind)
+    db.add(asset)
+    return asset
+
+def delete_asset(db: Session, asset: Asset) -> None:
+    """Remove an Asset row and release its blob reference (not committed)."""
+    for child in db.query(Asset).filter(Asset.parent_id == asset.id).all():
+        delete_asset(db, child)
+    _PATH_CACHE.pop(asset.id, None)
+    sha = asset.content_hash
+    legacy_path = None
+    if not sha:
+        # Pre-blob rows own their file outright.
+        legacy_path = _path_from_row(asset.id, asset.storage_path, asset.filename) or _scan_shard(asset.id)
+    db.delete(asset)
+    db.flush()
+    if sha:
+        release_blob(db, sha)
+    elif legacy_path:
+        discard_tmp(legacy_path)
+
+def _path_from_row(asset_id: str, storage_path: str, filename: str) -> Optional[str]:
+    sp = (storage_path or "").strip()
+    # Current layout: relative blob key (fetched into the local cache for S3).
+    if sp and not os.path.isabs(sp) and sp != asset_id:
+        p = get_backend().fetch(sp)
+        if p:
+            return p
+    # Older rows stored an absolute path.
+    if sp and os.path.isabs(sp) and os.path.exists(sp):
+        return sp
+    # Older rows stored the bare asset_id and the file lived in the flat root.
+    ext = os.path.splitext(filename or "")[1].lower() or ".bin"
+    p = os.path.join(settings.STORAGE_LOCAL_DIR, f"{asset_id}{ext}")
+    if os.path.exists(p):
+        return p
+    return None
+
+def _scan_shard(asset_id: str) -> Optional[str]:
+    # Files written without an Asset row: only the id's own shard bucket is listed.
+    shard_dir = os.path.dirname(key_to_path(shard_key(asset_id, "")))
+    try:
+        names = os.listdir(shard_dir)
+    except FileNotFoundError:
+        return None
+    for fn in names:
+        if os.path.splitext(fn)[0] == asset_id:
+            return os.path.join(shard_dir, fn)
+    return None
+
+def resolve_many(db: Session, asset_ids: Iterable[str]) -> Dict[str, str]:
+    """Resolve many asset ids with a single indexed query.
+
+    Ids that cannot be resolved are left out of the result.
+    """
+    out: Dict[str, str] = {}
+    missing = []
+    for a in {str(x).strip() for x in asset_ids if x}:
+        p = _PATH_CACHE.get(a)
+        if p and os.path.exists(p):
+            out[a] = p
+        else:
+            missing.append(a)
+    if not missing:
+        return out
+    rows = db.query(Asset.id, Asset.storage_path, Asset.filename).filter(Asset.id.in_(missing)).all()
+    for aid, sp, fn in rows:
+        p = _path_from_row(aid, sp, fn)
+        if p:
+            out[aid] = p
+            _remember(aid, p)
+    for a in missing:
+        if a not in out:
+            p = _scan_shard(a)
+            if p:
+                out[a] = p
+                _remember(a, p)
+    return out
+
+def get_local_path(asset_id_or_path: str, db: Session | None = None) -> str:
     """Return an absolute path for a stored asset.
 
     Historical versions stored either:
     - asset_id (uuid hex) in DB, or
     - an absolute path in DB.
 
-    This function supports both for backward compatibility.
+    Both are still supported. Lookups go through the ``assets`` table (the
+    storage index) and never list the storage root, so the cost stays constant
+    as storage grows.
     """
-    ensure_dirs()
-
     s = (asset_id_or_path or "").strip()
     if not s:
         raise FileNotFoundError("<empty>")
@@ -37,13 +314,60 @@ def get_local_path(asset_id_or_path: str) -> str:
     if os.path.isabs(s) and os.path.exists(s):
         return s
 
-    # If it's a file inside the storage dir (relative), use it.
+    p = _PATH_CACHE.get(s)
+    if p and os.path.exists(p):
+        return p
+
+    own_session = db is None
+    if own_session:
+        from app.core.db import SessionLocal
+        db = SessionLocal()
+    try:
+        found = resolve_many(db, [s]).get(s)
+    finally:
+        if own_session:
+            db.close()
+    if found:
+        return found
+
+    # A relative path inside the storage dir.
     candidate = os.path.join(settings.STORAGE_LOCAL_DIR, s)
-    if os.path.exists(candidate):
+    if os.path.isfile(candidate):
         return candidate
-
-    # Otherwise treat it as asset_id prefix.
-    for fn in os.listdir(settings.STORAGE_LOCAL_DIR):
-        if fn.startswith(s):
-            return os.path.join(settings.STORAGE_LOCAL_DIR, fn)
     raise FileNotFoundError(s)
+
+@contextmanager
+def pinned_local_path(asset_id: str, db: Session | None = None) -> Iterator[str]:
+    """Local path of an asset that stays valid until the block exits.
+
+    Local files never move. With S3 the path is a DiskCache entry that the LRU
+    may evict at any time, so long jobs get their own hard link (or copy) of it.
+    """
+    path = get_local_path(asset_id, db)
+    if get_backend().name == "local":
+        yield path
+        return
+    tmp = new_tmp_path(os.path.splitext(path)[1])
+    try:
+        try:
+            os.link(path, tmp)
+        except FileNotFoundError:
+            # Evicted since get_local_path: fetch it again.
+            _PATH_CACHE.pop(asset_id, None)
+            shutil.copyfile(get_local_path(asset_id, db), tmp)
+        except OSError:
+            # Cache and storage dir on different filesystems.
+            shutil.copyfile(path, tmp)
+        yield tmp
+    finally:
+        discard_tmp(tmp)
+
+def presigned_url(db: Session, asset_id: str, filename: str | None = None) -> Optional[str]:
+    """Direct download URL for backends that support it (S3); None for local storage."""
+    backend = get_backend()
+    if backend.name == "local":
+        return None
+    asset = db.get(Asset, asset_id)
+    if not asset or not asset.content_hash:
+        return None
+    return backend.presigned_url(asset.storage_path, mime=asset.mime, filename=filename)
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from typing import Dict, Optional
+
+from app.core.settings import settings
+
+# Storage backends operate on relative blob keys ("ab/cd/<sha256>.png").
+# The DB (assets/blobs tables) is the index; backends only move bytes.
+
+def _local_key_path(root: str, key: str) -> str:
+    return os.path.join(root, *key.split("/"))
+
+class LocalBackend:
+    """Blobs live under STORAGE_LOCAL_DIR (a volume shared by API and worker)."""
+
+    name = "local"
+
+    def local_path(self, key: str) -> str:
+        return _local_key_path(settings.STORAGE_LOCAL_DIR, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    def put_bytes(self, key: str, content: bytes) -> None:
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    def put_file(self, key: str, src_path: str) -> None:
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src_path, path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def fetch(self, key: str) -> Optional[str]:
+        path = self.local_path(key)
+        return path if os.path.exists(path) else None
+
+    def presigned_url(self, key: str, mime: str | None = None, filename: str | None = None) -> Optional[str]:
+        return None
+
+class DiskCache:
+    """Size-bounded LRU of downloaded objects (worker hot set).
+
+    Recency is the file mtime, refreshed on every hit, so the cache survives
+    worker restarts and is shared by forked job processes.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    def path(self, key: str) -> str:
+        return _local_key_path(self.root, key)
+
+    def get(self, key: str) -> Optional[str]:
+        p = self.path(key)
+        try:
+            os.utime(p)
+        except FileNotFoundError:
+            return None
+        return p
+
+    def admit(self, key: str, size: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(e["size"] for e in self._entries())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for dirpath, _dirs, files in os.walk(self.root):
+            for fn in files:
+                p = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                yield {"path": p, "size": st.st_size, "mtime": st.st_mtime}
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e["mtime"])
+        total = sum(e["size"] for e in entries)
+        target = int(self.max_bytes * 0.8)
+        for e in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(e["path"])
+                total -= e["size"]
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+class S3Backend:
+    """S3-compatible object storage (AWS S3, MinIO, ...).
+
+    Large files go up as multipart uploads; reads are served to browsers via
+    presigned GET URLs and to the exporter through a local DiskCache.
+    """
+
+    name = "s3"
+
+    def __init__(self):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        cfg = Config(signature_version="s3v4", s3={"addressing_style": "path"})
+        common = dict(
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY or None,
+            aws_secret_access_key=settings.S3_SECRET_KEY or None,
+            config=cfg,
+        )
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client("s3", endpoint_url=settings.S3_ENDPOINT_URL or None, **common)
+        # Presigned URLs must use a host the browser can reach (e.g. localhost:9000 vs minio:9000).
+        public = settings.S3_PUBLIC_ENDPOINT_URL or settings.S3_ENDPOINT_URL or None
+        self.presign_client = self.client if public == (settings.S3_ENDPOINT_URL or None) else boto3.client("s3", endpoint_url=public, **common)
+        mb = 1024 * 1024
+        self.transfer = TransferConfig(multipart_threshold=8 * mb, multipart_chunksize=8 * mb, max_concurrency=4)
+        self.cache = DiskCache(settings.STORAGE_CACHE_DIR, settings.STORAGE_CACHE_MB * mb)
+
+    def _object_key(self, key: str) -> str:
+        prefix = settings.S3_PREFIX.strip("/")
+        return f"{prefix}/{key}" if prefix else key
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_bytes(self, key: str, content: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=content)
+
+    def put_file(self, key: str, src_path: str) -> None:
+        try:
+            self.client.upload_file(src_path, self.bucket, self._object_key(key), Config=self.transfer)
+        finally:
+            try:
+                os.remove(src_path)
+            except FileNotFoundError:
+                pass
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        try:
+            os.remove(self.cache.path(key))
+        except FileNotFoundError:
+            pass
+
+    def fetch(self, key: str) -> Optional[str]:
+        from botocore.exceptions import ClientError
+        hit = self.cache.get(key)
+        if hit:
+            return hit
+        dst = self.cache.path(key)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+        try:
+            self.client.download_file(self.bucket, self._object_key(key), tmp, Config=self.transfer)
+        except ClientError:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+            return None
+        os.replace(tmp, dst)
+        self.cache.admit(key, os.path.getsize(dst))
+        return dst
+
+    def presigned_url(self, key: str, mime: str | None = None, filename: str | None = None) -> Optional[str]:
+        params: Dict[str, str] = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if mime:
+            params["ResponseContentType"] = mime
+        if filename:
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+        # Blobs are immutable, so the browser may cache whatever the URL returns.
+        params["ResponseCacheControl"] = "private, max-age=31536000, immutable"
+        return self.presign_client.generate_presigned_url("get_object", Params=params, ExpiresIn=settings.S3_PRESIGN_SECONDS)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                mode = (settings.STORAGE_MODE or "local").lower()
+                if mode == "local":
+                    _backend = LocalBackend()
+                elif mode == "s3":
+                    _backend = S3Backend()
+                else:
+                    raise RuntimeError(f"Unknown STORAGE_MODE: {settings.STORAGE_MODE}")
+    return _backend
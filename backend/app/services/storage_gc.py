@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import exists, or_
+from sqlalchemy.orm import Session, aliased
+
+from app.core.settings import settings
+from app.models.models import Asset, Blob, Club, Project, Template
+from app.services.export_cache import sweep_fragments
+from app.services.storage import delete_asset, discard_tmp, drop_blob
+
+# Asset ids are uuid4 hex. Any such token anywhere in a document counts as a
+# reference (assetRef, brandKit, future fields): over-retaining is harmless,
+# deleting something still in use is not.
+_ID_RE = re.compile(r"[0-9a-f]{32}")
+_SHARD_RE = re.compile(r"[0-9a-f]{2}")
+
+# One collector at a time (cron and --enqueue may overlap). The TTL is also the
+# RQ job timeout, so a killed run only blocks the next one until then.
+GC_LOCK_KEY = "storage:gc:lock"
+GC_LOCK_TTL = 3600
+
+class GCAlreadyRunning(RuntimeError):
+    pass
+
+@contextmanager
+def gc_lock() -> Iterator[None]:
+    """Hold the collector lock (Redis SET NX) or raise GCAlreadyRunning."""
+    from app.core.queue import redis_conn
+    token = uuid.uuid4().hex
+    if not redis_conn.set(GC_LOCK_KEY, token, nx=True, ex=GC_LOCK_TTL):
+        raise GCAlreadyRunning("Storage GC is already running")
+    try:
+        yield
+    finally:
+        # Only release our own lock (it may have expired and been taken since).
+        with redis_conn.pipeline() as pipe:
+            try:
+                pipe.watch(GC_LOCK_KEY)
+                held = pipe.get(GC_LOCK_KEY)
+                if (held.decode() if isinstance(held, bytes) else held) == token:
+                    pipe.multi()
+                    pipe.delete(GC_LOCK_KEY)
+                    pipe.execute()
+            except Exception:
+                pass
+
+def referenced_asset_ids(db: Session, batch_size: int = 200) -> Set[str]:
+    """Every asset id mentioned by a project, template or club.
+
+    Documents are streamed in batches and scanned as text, never parsed.
+    """
+    refs: Set[str] = set()
+    for model in (Project, Template):
+        q = db.query(model.document_json).execution_options(yield_per=batch_size)
+        for (doc_json,) in q:
+            refs.update(_ID_RE.findall(doc_json or ""))
+    for (logo,) in db.query(Club.locked_logo_asset_id).filter(Club.locked_logo_asset_id.isnot(None)):
+        refs.add(logo)
+    return refs
+
+def referenced_since(db: Session, since: datetime, candidates: Set[str]) -> Set[str]:
+    """The ``candidates`` referenced by projects/templates saved since ``since`` or by a club logo.
+
+    Closes the gap between the referenced_asset_ids() snapshot and a batch's
+    deletes: a project saved meanwhile may have placed an orphan asset.
+    """
+    if not candidates:
+        return set()
+    refs: Set[str] = set()
+    for model, changed in ((Project, Project.updated_at), (Template, Template.created_at)):
+        for (doc_json,) in db.query(model.document_json).filter(changed >= since):
+            refs.update(candidates.intersection(_ID_RE.findall(doc_json or "")))
+    refs.update(logo for (logo,) in db.query(Club.locked_logo_asset_id).filter(Club.locked_logo_asset_id.in_(candidates)))
+    return refs
+
+def _sweep(db: Session, q, keep: Set[str], stats: Dict[str, int], key: str, batch_size: int, max_batches: int | None, dry_run: bool,
+           recheck: Optional[Callable[[Set[str]], Set[str]]] = None) -> None:
+    last_id = ""
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = q.filter(Asset.id > last_id).order_by(Asset.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        batches += 1
+        if recheck is not None:
+            keep = keep | recheck({a.id for a in rows if a.id not in keep})
+        for a in rows:
+            if a.id in keep:
+                continue
+            stats[key] += 1
+            if not dry_run:
+                delete_asset(db, a)
+        # One short transaction per batch keeps row locks brief.
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+
+def collect_garbage(db: Session, batch_size: int | None = None, max_batches: int | None = None, dry_run: bool = False) -> Dict[str, int]:
+    """Reclaim storage in bounded batches.
+
+    - export artifacts older than EXPORT_TTL_HOURS
+    - non-catalog assets no project/template/club references (import rasters
+      of failed or deleted imports, replaced uploads) once older than
+      GC_MIN_AGE_HOURS, so in-flight uploads are never touched
+    - blobs left with a zero refcount and stale upload temp files
+    - files in the local shards that no blob or asset row owns (exports and
+      uploads written before the blob store), once older than GC_MIN_AGE_HOURS
+    - export page fragments unused for FRAGMENT_TTL_HOURS
+    """
+    batch_size = batch_size or settings.GC_BATCH_SIZE
+    now = datetime.utcnow()
+    # Saves stamped from another host's clock may lag a little behind ours.
+    snapshot_at = now - timedelta(minutes=5)
+    min_age = now - timedelta(hours=settings.GC_MIN_AGE_HOURS)
+    stats = {"expired_exports": 0, "unreferenced_assets": 0, "orphan_renditions": 0, "orphan_blobs": 0, "orphan_files": 0, "tmp_files": 0, "stale_fragments": 0}
+
+    exports = db.query(Asset).filter(Asset.kind == "export", Asset.created_at < now - timedelta(hours=settings.EXPORT_TTL_HOURS))
+    _sweep(db, exports, set(), stats, "expired_exports", batch_size, max_batches, dry_run)
+
+    keep = referenced_asset_ids(db)
+    unused = db.query(Asset).filter(
+        Asset.is_catalog == False,  # noqa: E712
+        or_(Asset.kind.is_(None), Asset.kind.notin_(["export", "rendition"])),
+        Asset.created_at < min_age,
+    )
+    _sweep(db, unused, keep, stats, "unreferenced_assets", batch_size, max_batches, dry_run,
+           recheck=lambda ids: referenced_since(db, snapshot_at, ids))
+
+    # Renditions go with their original (delete_asset cascades); these lost it some other way.
+    parent = aliased(Asset)
+    orphans = db.query(Asset).filter(Asset.kind == "rendition", Asset.created_at < min_age, ~exists().where(parent.id == Asset.parent_id))
+    _sweep(db, orphans, set(), stats, "orphan_renditions", batch_size, max_batches, dry_run)
+
+    for (sha,) in db.query(Blob.sha256).filter(Blob.refcount <= 0).limit(batch_size).all():
+        # Re-checked under the row lock: _register_blob may have taken it back meanwhile.
+        blob = (db.query(Blob).filter(Blob.sha256 == sha, Blob.refcount <= 0)
+                .with_for_update(skip_locked=True).one_or_none())
+        if blob is None:
+            continue
+        stats["orphan_blobs"] += 1
+        if not dry_run:
+            # The object itself goes after the commit (see drop_blob).
+            drop_blob(db, blob)
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+
+    cutoff = time.time() - settings.GC_MIN_AGE_HOURS * 3600
+    if (settings.STORAGE_MODE or "local").lower() == "local":
+        stats["orphan_files"] = _sweep_orphan_files(db, keep, snapshot_at, cutoff, batch_size, dry_run)
+
+    tmp_dir = os.path.join(settings.STORAGE_LOCAL_DIR, "tmp")
+    if os.path.isdir(tmp_dir):
+        with os.scandir(tmp_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    stats["tmp_files"] += 1
+                    if not dry_run:
+                        discard_tmp(entry.path)
+    if (settings.STORAGE_MODE or "local").lower() == "local":
+        stats["stale_fragments"] = sweep_fragments(dry_run)
+    return stats
+
+def _shard_files(root: str, cutoff: float) -> Iterator[Tuple[str, str]]:
+    """``(key, path)`` of files under ``ab/cd/`` last modified before ``cutoff``."""
+    for top in sorted(os.listdir(root)) if os.path.isdir(root) else ():
+        if not _SHARD_RE.fullmatch(top) or not os.path.isdir(os.path.join(root, top)):
+            continue
+        for sub in sorted(os.listdir(os.path.join(root, top))):
+            d = os.path.join(root, top, sub)
+            if not _SHARD_RE.fullmatch(sub) or not os.path.isdir(d):
+                continue
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        yield f"{top}/{sub}/{entry.name}", entry.path
+
+def _sweep_orphan_files(db: Session, keep: Set[str], snapshot_at: datetime, cutoff: float, batch_size: int, dry_run: bool) -> int:
+    n = 0
+    batch: List[Tuple[str, str]] = []
+    for item in _shard_files(settings.STORAGE_LOCAL_DIR, cutoff):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            n += _drop_unowned(db, batch, keep, snapshot_at, dry_run)
+            batch = []
+    if batch:
+        n += _drop_unowned(db, batch, keep, snapshot_at, dry_run)
+    return n
+
+def _drop_unowned(db: Session, files: List[Tuple[str, str]], keep: Set[str], snapshot_at: datetime, dry_run: bool) -> int:
+    keys = [k for k, _p in files]
+    paths = [os.path.abspath(p) for _k, p in files]
+    # Blob files are named by sha256, pre-blob files by asset id.
+    stems = {os.path.basename(k).split(".")[0] for k in keys}
+    owned = {sp for (sp,) in db.query(Blob.storage_path).filter(Blob.storage_path.in_(keys))}
+    owned.update(sp for (sp,) in db.query(Asset.storage_path).filter(Asset.storage_path.in_(keys + paths)))
+    ids = {aid for (aid,) in db.query(Asset.id).filter(Asset.id.in_(stems))}
+    ids |= keep & stems
+    ids |= referenced_since(db, snapshot_at, stems - ids)
+    db.rollback()
+    n = 0
+    for (key, path), abspath in zip(files, paths):
+        if key in owned or abspath in owned or os.path.basename(key).split(".")[0] in ids:
+            continue
+        n += 1
+        if not dry_run:
+            discard_tmp(path)
+    return n
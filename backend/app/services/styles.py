@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+# Style/color resolution shared by the renderers. Documents carry colors as
+# hex ("#0b1220", "#fff", "#0b1220cc"), css "rgb()/rgba()", [r, g, b(, a)]
+# lists (0..1 or 0..255) or the name of an entry in styles.colorTokens.
+# Everything resolves to an (r, g, b, a) tuple of floats in 0..1.
+
+RGBA = Tuple[float, float, float, float]
+
+BLACK: RGBA = (0.0, 0.0, 0.0, 1.0)
+
+_FUNC_RE = re.compile(r"^rgba?\(\s*([^)]*)\)$")
+_NONE = {"", "none", "transparent"}
+
+
+def _channel(v: Any, scale: float) -> float:
+    s = str(v).strip()
+    if s.endswith("%"):
+        f = float(s[:-1]) / 100.0
+    else:
+        f = float(s) / scale
+    return max(0.0, min(1.0, f))
+
+
+@lru_cache(maxsize=1024)
+def parse_color(value: str) -> Optional[RGBA]:
+    """Parse a hex / rgb() / rgba() string (None when not a color literal)."""
+    s = value.strip().lower()
+    if s.startswith("#"):
+        h = s[1:]
+        if len(h) in (3, 4):
+            h = "".join(c * 2 for c in h)
+        if len(h) not in (6, 8):
+            return None
+        try:
+            n = [int(h[i:i + 2], 16) / 255.0 for i in range(0, len(h), 2)]
+        except ValueError:
+            return None
+        return (n[0], n[1], n[2], n[3] if len(n) == 4 else 1.0)
+    m = _FUNC_RE.match(s)
+    if not m:
+        return None
+    parts = [p for p in re.split(r"[\s,/]+", m.group(1)) if p]
+    if len(parts) not in (3, 4):
+        return None
+    try:
+        rgb = [_channel(p, 255.0) for p in parts[:3]]
+        a = _channel(parts[3], 1.0) if len(parts) == 4 else 1.0
+    except ValueError:
+        return None
+    return (rgb[0], rgb[1], rgb[2], a)
+
+
+def _from_list(value: Any) -> Optional[RGBA]:
+    if len(value) not in (3, 4):
+        return None
+    try:
+        vals = [float(v) for v in value]
+    except (TypeError, ValueError):
+        return None
+    # Accept [0..1] or [0..255]
+    scale = 255.0 if any(v > 1.0 for v in vals[:3]) else 1.0
+    rgb = [max(0.0, min(1.0, v / scale)) for v in vals[:3]]
+    a = vals[3] if len(vals) == 4 else 1.0
+    a = max(0.0, min(1.0, a / 255.0 if a > 1.0 else a))
+    return (rgb[0], rgb[1], rgb[2], a)
+
+
+class StyleResolver:
+    """Resolves colors and text styles against one document's ``styles``.
+
+    Results are memoized per resolver, i.e. once per compiled document.
+    """
+
+    # Typography keys a TextFrame may override on top of styles.textStyles[styleRef].
+    TEXT_KEYS = ("fontFamily", "fontWeight", "fontStyle", "fontSize", "color")
+
+    def __init__(self, styles: Dict[str, Any] | None):
+        styles = styles if isinstance(styles, dict) else {}
+        self.text_styles: Dict[str, Any] = styles.get("textStyles") or {}
+        self.color_tokens: Dict[str, Any] = styles.get("colorTokens") or {}
+        self._colors: Dict[Any, Optional[RGBA]] = {}
+        self._text: Dict[Any, Dict[str, Any]] = {}
+
+    def color(self, value: Any, opacity: float = 1.0, default: Optional[RGBA] = None) -> Optional[RGBA]:
+        """Effective RGBA of ``value`` with ``opacity`` folded into alpha (``default`` if unset/invalid)."""
+        key = tuple(value) if isinstance(value, list) else value
+        try:
+            rgba = self._colors[key]
+        except (KeyError, TypeError):
+            rgba = self._resolve(value, 0)
+            try:
+                self._colors[key] = rgba
+            except TypeError:
+                pass
+        if rgba is None:
+            rgba = default
+        if rgba is None or opacity >= 1.0:
+            return rgba
+        return (rgba[0], rgba[1], rgba[2], rgba[3] * max(0.0, opacity))
+
+    def _resolve(self, value: Any, depth: int) -> Optional[RGBA]:
+        if isinstance(value, (list, tuple)):
+            return _from_list(value)
+        if not isinstance(value, str) or value.strip().lower() in _NONE:
+            return None
+        rgba = parse_color(value)
+        if rgba is not None or depth > 4:
+            return rgba
+        # Token reference: "accent", "$accent", "{{colorTokens.accent}}"
+        name = value.strip().strip("{}$ ")
+        if name.startswith("colorTokens."):
+            name = name[len("colorTokens."):]
+        token = self.color_tokens.get(name)
+        return self._resolve(token, depth + 1) if token is not None else None
+
+    def text_style(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """styles.textStyles[styleRef] with the item's own overrides applied."""
+        ref = item.get("styleRef")
+        key = ref if isinstance(ref, str) else None
+        base = self._text.get(key)
+        if base is None:
+            base = self.text_styles.get(key) if key else None
+            base = self._text[key] = base if isinstance(base, dict) else {}
+        overrides = {k: item[k] for k in self.TEXT_KEYS if item.get(k) is not None}
+        # TextFrames written by the generator/importer put their color in 'fill'.
+        if "color" not in overrides and item.get("fill") is not None:
+            overrides["color"] = item["fill"]
+        return {**base, **overrides} if overrides else base
+
+
+def opacity_of(item: Dict[str, Any]) -> float:
+    try:
+        v = float(item.get("opacity", 1.0))
+    except (TypeError, ValueError):
+        return 1.0
+    return max(0.0, min(1.0, v))
@@ -2,11 +2,14 @@ from __future__ import annotations
 from rq import Worker, Queue, Connection
 import redis
 from app.core.settings import settings
+from app.services.fonts import preload_fonts
 
 listen = ["default"]
 redis_conn = redis.from_url(settings.REDIS_URL)
 
 if __name__ == "__main__":
+    # Work horses are forked per job: whatever is loaded here is inherited by all of them.
+    preload_fonts(settings.FONT_PRELOAD_MB * 1024 * 1024)
     with Connection(redis_conn):
         worker = Worker(map(Queue, listen))
         worker.work()
@@ -0,0 +1,33 @@
+"""Reclaim storage: expired exports, unreferenced assets, orphan blobs.
+
+Usage (from backend/):
+    python -m scripts.gc_storage [--dry-run] [--max-batches N]   # run inline
+    python -m scripts.gc_storage --enqueue                        # run on the RQ worker
+
+Meant to be run periodically (cron). Work is done in GC_BATCH_SIZE batches,
+each in its own short transaction; a run that finds another one in progress
+(Redis lock) exits without doing anything.
+"""
+from __future__ import annotations
+import argparse, json
+from app.core.settings import settings
+from app.jobs import storage_gc_job
+from app.services.storage_gc import GC_LOCK_TTL
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--max-batches", type=int, default=None)
+    ap.add_argument("--enqueue", action="store_true")
+    args = ap.parse_args()
+    if args.enqueue:
+        import redis
+        from rq import Queue
+        q = Queue("default", connection=redis.from_url(settings.REDIS_URL))
+        job = q.enqueue(storage_gc_job, settings.DATABASE_URL, args.max_batches, args.dry_run, job_timeout=GC_LOCK_TTL)
+        print("Enqueued GC job:", job.get_id())
+        return
+    print(json.dumps(storage_gc_job(settings.DATABASE_URL, args.max_batches, args.dry_run)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""One-shot migration of a flat storage dir into the sharded layout.
+
+Usage (from backend/):  python -m scripts.migrate_storage [--dry-run]
+
+First brings the schema up to date (the ``blobs`` table and the columns added
+to ``assets`` since the first release; also on --dry-run, which needs them to
+query). Then moves every file sitting directly in STORAGE_LOCAL_DIR to
+``ab/cd/<id><ext>`` and rewrites ``assets.storage_path`` to the new relative
+key, and folds every asset without a ``content_hash`` into the
+content-addressed blob store, removing duplicate copies. Safe to re-run.
+"""
+from __future__ import annotations
+import os, sys
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.schema import upgrade_schema
+from app.core.settings import settings
+from app.models.models import Asset
+from app.services.storage import shard_key, key_to_path, get_local_path, acquire_blob
+
+BATCH = 500
+
+def main(dry_run: bool = False):
+    root = settings.STORAGE_LOCAL_DIR
+    engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+    added = upgrade_schema(engine)
+    if added:
+        print(f"Added asset columns: {', '.join(added)}")
+    SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    db = SessionLocal()
+    moved = updated = 0
+    try:
+        pending: dict[str, str] = {}
+        with os.scandir(root) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                asset_id, ext = os.path.splitext(entry.name)
+                key = shard_key(asset_id, ext.lower())
+                if not dry_run:
+                    dst = key_to_path(key)
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    os.replace(entry.path, dst)
+                moved += 1
+                pending[asset_id] = key
+                if len(pending) >= BATCH:
+                    updated += _update_rows(db, pending, dry_run)
+                    pending = {}
+        if pending:
+            updated += _update_rows(db, pending, dry_run)
+        # Rows that still point into the old flat root (absolute, relative or bare
+        # id) but whose file is already sharded, e.g. moved by an earlier run.
+        updated += _normalise_rows(db, dry_run)
+        if not dry_run:
+            db.commit()
+            deduped = _fold_into_blobs(db)
+        else:
+            deduped = 0
+        print(f"Moved files: {moved}  Updated asset rows: {updated}  Folded into blobs: {deduped}" + ("  (dry run)" if dry_run else ""))
+    finally:
+        db.close()
+
+def _update_rows(db, keys: dict[str, str], dry_run: bool) -> int:
+    n = 0
+    for a in db.query(Asset).filter(Asset.id.in_(list(keys))).all():
+        a.storage_path = keys[a.id]
+        n += 1
+    if not dry_run:
+        db.commit()
+    return n
+
+def _sharded_key(a: Asset) -> str | None:
+    """Shard key of a legacy row's file, if the row does not point at it yet."""
+    sp = (a.storage_path or "").strip().replace("\\", "/")
+    stem, ext = os.path.splitext(sp.rsplit("/", 1)[-1])
+    if stem != a.id:
+        return None
+    for e in dict.fromkeys(x.lower() for x in (ext, os.path.splitext(a.filename or "")[1], ".bin") if x):
+        key = shard_key(a.id, e)
+        if key == sp:
+            return None
+        if os.path.isfile(key_to_path(key)):
+            return key
+    return None
+
+def _normalise_rows(db, dry_run: bool) -> int:
+    n = 0
+    last_id = ""
+    while True:
+        batch = (db.query(Asset).filter(Asset.content_hash.is_(None), Asset.id > last_id)
+                 .order_by(Asset.id).limit(BATCH).all())
+        if not batch:
+            return n
+        last_id = batch[-1].id
+        for a in batch:
+            key = _sharded_key(a)
+            if key:
+                a.storage_path = key
+                n += 1
+        if not dry_run:
+            db.commit()
+
+def _fold_into_blobs(db) -> int:
+    n = 0
+    last_id = ""
+    while True:
+        batch = (db.query(Asset).filter(Asset.content_hash.is_(None), Asset.id > last_id)
+                 .order_by(Asset.id).limit(BATCH).all())
+        if not batch:
+            return n
+        last_id = batch[-1].id
+        for a in batch:
+            try:
+                old = get_local_path(a.id, db)
+            except FileNotFoundError:
+                continue
+            with open(old, "rb") as f:
+                content = f.read()
+            sha, key = acquire_blob(db, content, a.filename or old)
+            a.content_hash = sha
+            a.storage_path = key
+            if os.path.abspath(old) != os.path.abspath(key_to_path(key)):
+                os.remove(old)
+            n += 1
+        db.commit()
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv[1:])
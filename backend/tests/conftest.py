@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+import tempfile
+
+# Settings and the engine are created at import time: point them at a scratch
+# SQLite DB and storage dir before anything under app/ is imported.
+_ROOT = tempfile.mkdtemp(prefix="magazine-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_ROOT}/test.db"
+os.environ["STORAGE_MODE"] = "local"
+os.environ["STORAGE_LOCAL_DIR"] = os.path.join(_ROOT, "storage")
+os.environ["STORAGE_CACHE_DIR"] = os.path.join(_ROOT, "cache")
+
+import pytest  # noqa: E402
+
+@pytest.fixture
+def storage_dir(tmp_path, monkeypatch):
+    """A fresh local storage root (and empty path cache) for one test."""
+    from app.core.settings import settings
+    from app.services import storage
+    monkeypatch.setattr(settings, "STORAGE_LOCAL_DIR", str(tmp_path / "storage"))
+    monkeypatch.setattr(settings, "STORAGE_CACHE_DIR", str(tmp_path / "cache"))
+    storage._PATH_CACHE.clear()
+    return tmp_path / "storage"
+
+@pytest.fixture
+def db(storage_dir):
+    """A session on empty tables."""
+    from app.core.db import Base, SessionLocal, engine
+    from app.core.schema import upgrade_schema
+    Base.metadata.drop_all(bind=engine)
+    upgrade_schema(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """An in-memory Redis behind app.core.queue (RQ queue, cancel flags, caches, locks)."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from rq import Queue
+    from app.core import queue
+    conn = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(queue, "redis_conn", conn)
+    monkeypatch.setattr(queue, "q", Queue("default", connection=conn))
+    return conn
+
+@pytest.fixture
+def api(db, fake_redis, monkeypatch):
+    """TestClient on the app, signed in as the owner of ``api.club``."""
+    from fastapi.testclient import TestClient
+    from app.api.deps import get_current_user
+    from app.api.routes import export
+    from app.core import queue
+    from app.core.db import get_db
+    from app.main import app
+    from app.models.models import Club, User
+    user = User(email="owner@example.com", password_hash="-")
+    db.add(user)
+    db.flush()
+    club = Club(owner_id=user.id, name="Club")
+    db.add(club)
+    db.commit()
+    # Routes import the queue by name.
+    monkeypatch.setattr(export, "q", queue.q)
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: user
+    client = TestClient(app)
+    client.user, client.club = user, club
+    try:
+        yield client
+    finally:
+        app.dependency_overrides.clear()
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Build a PDF from page kinds; returns its path.
+
+    - "photo": a full-page JPEG (a new image per page)
+    - "flat": text and a filled rectangle only
+    - "shared": text plus a small frame of one JPEG shared by every such page
+    - "cmyk": a small CMYK JPEG
+    """
+    import io
+    import fitz
+    from PIL import Image
+
+    def jpeg(color, size=(1400, 1000), mode="RGB") -> bytes:
+        buf = io.BytesIO()
+        Image.new(mode, size, color).save(buf, format="JPEG", quality=85)
+        return buf.getvalue()
+
+    shared = jpeg((30, 160, 90), size=(600, 400))
+
+    def build(kinds, name="source.pdf") -> str:
+        pdf = fitz.open()
+        for n, kind in enumerate(kinds):
+            page = pdf.new_page()
+            if kind == "photo":
+                page.insert_image(page.rect, stream=jpeg((n * 20 % 256, 90, 160)))
+            elif kind == "cmyk":
+                page.insert_image(fitz.Rect(50, 50, 350, 250), stream=jpeg((0, 80, 160, 20), size=(300, 200), mode="CMYK"))
+            else:
+                page.draw_rect(fitz.Rect(40, 400, 300, 500), color=None, fill=(0.2, 0.3, 0.8))
+                if kind == "shared":
+                    page.insert_image(fitz.Rect(50, 50, 250, 183), stream=shared)
+            page.insert_text((50, 320), f"Page {n + 1}", fontsize=14)
+        path = str(tmp_path / name)
+        pdf.save(path)
+        pdf.close()
+        return path
+
+    build.shared_jpeg = shared
+    return build
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import os
+
+from app.core.db import SessionLocal
+from app.models.models import Asset, Blob
+from app.services import storage
+
+def _path(key: str) -> str:
+    return storage.key_to_path(key)
+
+def test_same_content_shares_one_blob(db):
+    a = storage.store_asset(db, b"logo bytes", "a.png", "image/png")
+    b = storage.store_asset(db, b"logo bytes", "b.png", "image/png")
+    c = storage.store_asset(db, b"other", "c.png", "image/png")
+    db.commit()
+    assert a.content_hash == b.content_hash != c.content_hash
+    assert a.storage_path == b.storage_path
+    assert db.get(Blob, a.content_hash).refcount == 2
+    assert db.get(Blob, c.content_hash).refcount == 1
+    assert open(_path(a.storage_path), "rb").read() == b"logo bytes"
+
+def test_release_deletes_only_the_last_reference(db):
+    a = storage.store_asset(db, b"shared", "a.png", "image/png")
+    b = storage.store_asset(db, b"shared", "b.png", "image/png")
+    db.commit()
+    sha, path = a.content_hash, _path(a.storage_path)
+
+    storage.delete_asset(db, a)
+    db.commit()
+    assert db.get(Blob, sha).refcount == 1
+    assert os.path.exists(path)
+
+    storage.delete_asset(db, b)
+    assert os.path.exists(path)  # nothing is deleted before the commit
+    db.commit()
+    assert db.get(Blob, sha) is None
+    assert not os.path.exists(path)
+
+def test_rollback_keeps_blob_and_file(db):
+    sha, key = storage.acquire_blob(db, b"keep me", "k.bin")
+    db.commit()
+    assert storage.release_blob(db, sha) is True
+    db.rollback()
+    assert db.get(Blob, sha).refcount == 1
+    assert os.path.exists(_path(key))
+    # The rolled back deletion is forgotten, not replayed by a later commit.
+    db.commit()
+    assert os.path.exists(_path(key))
+
+def test_reacquire_after_release(db):
+    sha, key = storage.acquire_blob(db, b"again", "a.bin")
+    db.commit()
+    storage.release_blob(db, sha)
+    db.commit()
+    sha2, key2 = storage.acquire_blob(db, b"again", "a.bin")
+    db.commit()
+    assert sha2 == sha and db.get(Blob, sha).refcount == 1
+    assert open(_path(key2), "rb").read() == b"again"
+
+def test_orphan_object_is_not_adopted(db):
+    # An object whose row is gone may still be waiting for its post-commit delete.
+    sha, key = storage.acquire_blob(db, b"orphan", "o.bin")
+    db.commit()
+    db.query(Blob).filter(Blob.sha256 == sha).delete()
+    db.commit()
+    _sha, key2 = storage.acquire_blob(db, b"orphan", "o.bin")
+    db.commit()
+    assert key2 != key
+    os.remove(_path(key))
+    assert open(_path(key2), "rb").read() == b"orphan"
+
+def test_row_deleted_between_read_and_increment(db, monkeypatch):
+    sha, key = storage.acquire_blob(db, b"racy", "r.bin")
+    db.commit()
+    execute = db.execute
+    def racing_execute(stmt, *args, **kwargs):
+        if "UPDATE blobs" in str(stmt) and not racing_execute.done:
+            racing_execute.done = True
+            other = SessionLocal()
+            other.query(Blob).filter(Blob.sha256 == sha).delete()
+            other.commit()
+            other.close()
+        return execute(stmt, *args, **kwargs)
+    racing_execute.done = False
+    monkeypatch.setattr(db, "execute", racing_execute)
+    sha2, key2 = storage.acquire_blob(db, b"racy", "r.bin")
+    db.commit()
+    blob = db.get(Blob, sha)
+    assert blob is not None and blob.refcount == 1 and blob.storage_path == key2
+    assert open(_path(key2), "rb").read() == b"racy"
+
+def test_store_asset_file_consumes_tmp(db):
+    tmp = storage.new_tmp_path(".png")
+    with open(tmp, "wb") as f:
+        f.write(b"spooled")
+    sha, size = storage.hash_file(tmp)
+    first = storage.store_asset_file(db, tmp, sha, size, "s.png", "image/png")
+    tmp2 = storage.new_tmp_path(".png")
+    with open(tmp2, "wb") as f:
+        f.write(b"spooled")
+    second = storage.store_asset_file(db, tmp2, sha, size, "s.png", "image/png")
+    db.commit()
+    assert not os.path.exists(tmp) and not os.path.exists(tmp2)
+    assert first.storage_path == second.storage_path
+    assert db.get(Blob, sha).refcount == 2 and db.query(Asset).count() == 2
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app.core import queue
+from app.models.models import Project
+from app.services import storage
+from app.services.export_cache import cached_export, coalesce_export, export_cache_key, remember_export
+
+DOC = {"pages": [{"layers": [{"items": [{"type": "TextFrame", "text": "Hola"}]}]}], "settings": {"bleedMm": 3}}
+
+def _key(doc=DOC, logo="logo", options=None, font="Inter", dumps=json.dumps):
+    return export_cache_key(dumps(doc), logo, options or {"quality": "web"}, font)
+
+def test_key_ignores_json_formatting():
+    assert _key() == _key(dumps=lambda d: json.dumps(d, indent=2, sort_keys=True))
+
+@pytest.mark.parametrize("change", [
+    {"doc": {**DOC, "pages": []}},
+    {"logo": "other"},
+    {"font": "Oswald"},
+    {"options": {"quality": "print"}},
+    {"options": {"quality": "web", "pages": "1-2"}},
+    {"options": {"quality": "web", "watermark": True}},
+])
+def test_key_changes_with_output(change):
+    assert _key(**change) != _key()
+
+def test_key_ignores_non_output_options():
+    assert _key(options={"quality": "web", "parallelism": 8, "cache_key": "x"}) == _key()
+
+def test_coalescing_claims_once(fake_redis):
+    enqueued = []
+    first, started = coalesce_export("k", enqueued.append)
+    assert started and enqueued == [first]
+    assert coalesce_export("k", enqueued.append) == (first, False)
+    assert enqueued == [first]
+
+def test_finished_job_without_export_releases_the_slot(fake_redis):
+    job = queue.q.enqueue(len, "x", job_id="stale")
+    fake_redis.set("export:inflight:k", job.id)
+    job.set_status("failed")
+    job_id, started = coalesce_export("k", lambda jid: None)
+    assert started and job_id != "stale"
+
+def test_cached_export_needs_the_asset(db, fake_redis):
+    asset = storage.store_asset(db, b"%PDF-1.4", "r.pdf", "application/pdf", kind="export")
+    db.commit()
+    fake_redis.set("export:inflight:k", "job")
+    remember_export("k", asset.id)
+    assert cached_export(db, "k") == asset.id
+    assert not fake_redis.exists("export:inflight:k")
+    storage.delete_asset(db, asset)
+    db.commit()
+    assert cached_export(db, "k") is None
+
+def test_export_route_coalesces_then_serves_the_cache(api, db):
+    proj = Project(club_id=api.club.id, name="Revista", document_json=json.dumps(DOC))
+    db.add(proj)
+    db.commit()
+    first = api.post(f"/api/export/{proj.id}", json={}).json()
+    second = api.post(f"/api/export/{proj.id}", json={}).json()
+    assert first["coalesced"] is False and second["coalesced"] is True
+    assert second["job_id"] == first["job_id"]
+    assert api.get(f"/api/export/job/{first['job_id']}").json()["status"] == "queued"
+
+    # The worker finishes: the next request is answered from the cache.
+    job = queue.q.fetch_job(first["job_id"])
+    export = storage.store_asset(db, b"%PDF-1.4 done", "Revista.pdf", "application/pdf", club_id=api.club.id, kind="export")
+    db.commit()
+    remember_export(job.args[2]["cache_key"], export.id)
+    hit = api.post(f"/api/export/{proj.id}", json={}).json()
+    assert hit["cached"] is True and hit["job_id"] == f"cached-{export.id}"
+    status = api.get(f"/api/export/job/{hit['job_id']}").json()
+    assert status["status"] == "finished" and status["export_asset_id"] == export.id
+    assert api.post(f"/api/export/job/{hit['job_id']}/cancel").json()["status"] == "finished"
+
+    # Different options are a different export.
+    assert api.post(f"/api/export/{proj.id}", json={"quality": "print"}).json()["job_id"] != hit["job_id"]
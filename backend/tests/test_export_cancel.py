@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from rq import SimpleWorker
+
+from app.core import queue
+from app.core.settings import settings
+from app.jobs import export_project_job
+from app.models.models import Asset, Project
+from app.services.pdf_exporter import ExportCancelled, export_document_to_file
+
+DOC = {"pages": [{"layers": [{"items": [{"type": "TextFrame", "text": f"Page {i}"}]}]} for i in range(6)]}
+
+def test_should_stop_is_polled_before_every_page(tmp_path):
+    done = []
+    with pytest.raises(ExportCancelled):
+        export_document_to_file(DOC, lambda ref: None, str(tmp_path / "out.pdf"),
+                                progress=done.append, should_stop=lambda: sum(done) >= 2)
+    assert sum(done) == 2
+    assert not (tmp_path / "out.pdf").exists()
+
+def test_progress_reaches_every_page(tmp_path):
+    done = []
+    export_document_to_file(DOC, lambda ref: None, str(tmp_path / "out.pdf"), progress=done.append, should_stop=lambda: False)
+    assert sum(done) == 6
+
+def _enqueue(api, db):
+    proj = Project(club_id=api.club.id, name="Revista", document_json=json.dumps(DOC))
+    db.add(proj)
+    db.commit()
+    return queue.q.enqueue(export_project_job, proj.id, api.club.id, {"quality": "web"}, settings.DATABASE_URL, meta={"club_id": api.club.id})
+
+def test_cancel_flag_stops_a_running_export(api, db, fake_redis):
+    job = _enqueue(api, db)
+    # The flag is what a running job sees; raise it before the worker picks the job up.
+    queue.request_cancel(job.id)
+    SimpleWorker([queue.q], connection=fake_redis).work(burst=True)
+    job.refresh()
+    assert job.result == {"ok": False, "cancelled": True, "pages_done": 0}
+    assert db.query(Asset).filter(Asset.kind == "export").count() == 0
+    assert api.get(f"/api/export/job/{job.id}").json()["status"] == "cancelled"
+
+def test_uncancelled_export_finishes(api, db, fake_redis):
+    job = _enqueue(api, db)
+    SimpleWorker([queue.q], connection=fake_redis).work(burst=True)
+    job.refresh()
+    assert job.result["ok"] and job.result["pages"] == 6
+    assert job.meta["progress"] == 100 and job.meta["pages_done"] == 6
+
+def test_cancel_route_drops_queued_jobs(api, db, fake_redis):
+    job = _enqueue(api, db)
+    assert api.post(f"/api/export/job/{job.id}/cancel").json() == {"status": "cancelled"}
+    assert queue.cancel_requested(job.id)
+    assert api.get(f"/api/export/job/{job.id}").json()["status"] == "cancelled"
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services import fonts
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    faces = []
+    for family, weight, italic, name in [("inter", 400, False, "Inter-Regular.ttf"), ("inter", 700, False, "Inter-Bold.ttf"),
+                                          ("inter", 400, True, "Inter-Italic.ttf"), ("oswald", 500, False, "Oswald.ttf")]:
+        path = tmp_path / name
+        path.write_bytes(name.encode() * 100)
+        faces.append((family, weight, italic, str(path)))
+    monkeypatch.setattr(fonts, "_buffers", {})
+    fonts.install_index(faces)
+    yield faces
+    fonts.install_index([])
+    monkeypatch.setattr(fonts, "_index", None)
+
+@pytest.mark.parametrize("family, weight, italic, expected", [
+    ("Inter", 400, False, "Inter-Regular.ttf"),
+    ("inter", "700", False, "Inter-Bold.ttf"),
+    ("Inter", 600, False, "Inter-Bold.ttf"),        # closest weight
+    ("Inter", "bold", True, "Inter-Italic.ttf"),    # italic beats weight
+    ("Oswald", None, False, "Oswald.ttf"),
+])
+def test_resolve_font(index, family, weight, italic, expected):
+    assert fonts.resolve_font(family, weight, italic).endswith(expected)
+
+def test_unknown_family(index):
+    assert fonts.resolve_font("Comic Sans") is None
+    assert fonts.resolve_font("") is None
+
+def test_resolution_is_memoized_and_reset_with_the_index(index, monkeypatch):
+    fonts.resolve_font("Inter")
+    hits = fonts._resolve.cache_info().hits
+    fonts.resolve_font("Inter", 400, False)
+    assert fonts._resolve.cache_info().hits == hits + 1
+    fonts.install_index(index[-1:])
+    assert fonts.resolve_font("Inter") is None
+
+def test_preload_reads_buffers_within_budget(index, monkeypatch):
+    sizes = [len(open(p, "rb").read()) for *_f, p in index]
+    assert fonts.preload_fonts(sizes[0] + sizes[1]) == sizes[0] + sizes[1]
+    assert set(fonts._buffers) == {index[0][3], index[1][3]}
+    # Preloaded bytes are served from memory.
+    monkeypatch.setattr("builtins.open", None)
+    assert fonts.font_buffer(index[0][3]).startswith(b"Inter-Regular")
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import copy
+import os
+
+import fitz
+import pytest
+
+from app.services.export_cache import PageFragmentCache, sweep_fragments
+from app.services.pdf_exporter import export_document_to_file
+
+def _doc(n: int = 3) -> dict:
+    return {"pages": [{"layers": [{"items": [
+        {"type": "TextFrame", "text": f"Page {i}", "rect": {"x": 40, "y": 40, "w": 300, "h": 60}},
+        {"type": "Shape", "fill": "#336699", "rect": {"x": 40, "y": 120, "w": 200, "h": 100}},
+    ]}]} for i in range(n)]}
+
+def _export(doc, tmp_path, name="out.pdf", **options):
+    fragments = PageFragmentCache()
+    out = str(tmp_path / name)
+    export_document_to_file(doc, lambda ref: None, out, fragments=fragments, **options)
+    with fitz.open(out) as pdf:
+        texts = [pdf[i].get_text().strip() for i in range(len(pdf))]
+    return fragments.stats(), texts
+
+def test_unchanged_pages_come_from_the_cache(storage_dir, tmp_path):
+    doc = _doc()
+    assert _export(doc, tmp_path)[0] == {"cache_hits": 0, "cache_misses": 3}
+    stats, texts = _export(doc, tmp_path, "again.pdf")
+    assert stats == {"cache_hits": 3, "cache_misses": 0}
+    assert texts == ["Page 0", "Page 1", "Page 2"]
+
+def test_only_the_changed_page_is_rendered(storage_dir, tmp_path):
+    doc = _doc()
+    _export(doc, tmp_path)
+    changed = copy.deepcopy(doc)
+    changed["pages"][1]["layers"][0]["items"][0]["text"] = "Edited"
+    stats, texts = _export(changed, tmp_path, "edited.pdf")
+    assert stats == {"cache_hits": 2, "cache_misses": 1}
+    assert texts == ["Page 0", "Edited", "Page 2"]
+
+@pytest.mark.parametrize("options", [{"quality": "print"}, {"bleed_mm": 5.0}, {"watermark": True}])
+def test_output_options_are_part_of_the_key(storage_dir, tmp_path, options):
+    doc = _doc()
+    _export(doc, tmp_path)
+    assert _export(doc, tmp_path, "other.pdf", **options)[0] == {"cache_hits": 0, "cache_misses": 3}
+
+def test_changed_image_file_misses(storage_dir, tmp_path):
+    img = tmp_path / "a.png"
+    fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False).save(str(img))
+    doc = {"pages": [{"layers": [{"items": [{"type": "ImageFrame", "assetRef": "a", "rect": {"x": 0, "y": 0, "w": 100, "h": 100}}]}]}]}
+    fragments = PageFragmentCache()
+    export_document_to_file(doc, {"a": str(img)}.get, str(tmp_path / "1.pdf"), fragments=fragments)
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+    pix.save(str(img))
+    export_document_to_file(doc, {"a": str(img)}.get, str(tmp_path / "2.pdf"), fragments=fragments)
+    assert fragments.stats() == {"cache_hits": 0, "cache_misses": 2}
+
+def test_sweep_removes_fragments_unused_for_the_ttl(storage_dir, tmp_path):
+    _export(_doc(2), tmp_path)
+    paths = [os.path.join(d, f) for d, _s, files in os.walk(storage_dir / "fragments") for f in files]
+    assert len(paths) == 2
+    os.utime(paths[0], (0, 0))
+    assert sweep_fragments(dry_run=True) == 1 and os.path.exists(paths[0])
+    assert sweep_fragments() == 1
+    assert not os.path.exists(paths[0]) and os.path.exists(paths[1])
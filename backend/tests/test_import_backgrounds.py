@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import pytest
+from PIL import Image
+
+from app.models.models import Asset
+from app.services import storage
+from app.services.pdf_importer import A4_H, A4_W, import_pdf_to_document, raster_scale
+
+def _backgrounds(db, document):
+    out = []
+    for page in document["pages"]:
+        refs = [it["assetRef"] for layer in page["layers"] for it in layer["items"] if it.get("role") == "pdf_background"]
+        out.append(db.get(Asset, refs[0]) if refs else None)
+    return out
+
+@pytest.mark.parametrize("fmt, mime, pil", [("jpeg", "image/jpeg", "JPEG"), ("webp", "image/webp", "WEBP")])
+def test_photo_pages_go_lossy_flat_pages_stay_png(db, make_pdf, monkeypatch, fmt, mime, pil):
+    monkeypatch.setattr(storage.settings, "IMPORT_PHOTO_FORMAT", fmt)
+    document, _ids = import_pdf_to_document(db, "c", make_pdf(["photo", "flat", "shared"]))
+    photo, flat, shared = _backgrounds(db, document)
+    assert photo.mime == mime
+    # A small picture on a text page does not make the page photographic.
+    assert flat.mime == shared.mime == "image/png"
+    with Image.open(storage.get_local_path(photo.id, db)) as im:
+        assert im.format == pil
+
+def test_raster_follows_dpi_and_pixel_cap(db, make_pdf, monkeypatch):
+    monkeypatch.setattr(storage.settings, "IMPORT_RASTER_DPI", 72)
+    document, _ids = import_pdf_to_document(db, "c", make_pdf(["flat"]))
+    (bg,) = _backgrounds(db, document)
+    with Image.open(storage.get_local_path(bg.id, db)) as im:
+        assert im.size == (595, 842)
+    monkeypatch.setattr(storage.settings, "IMPORT_RASTER_DPI", 600)
+    monkeypatch.setattr(storage.settings, "IMPORT_RASTER_MAX_PX", 1000)
+    assert round(max(A4_W, A4_H) * raster_scale(A4_W, A4_H)) == 1000
+
+def test_vector_mode_skips_the_raster_for_flat_pages(db, make_pdf):
+    document, _ids = import_pdf_to_document(db, "c", make_pdf(["flat", "photo"]), mode="vector")
+    flat, photo = _backgrounds(db, document)
+    assert flat is None and photo is not None
+    items = [it for layer in document["pages"][0]["layers"] for it in layer["items"]]
+    (shape,) = [it for it in items if it["type"] == "Shape"]
+    assert shape["fill"] == "#334dcc" and shape["rect"]["w"] == pytest.approx(260, abs=1)
+    assert any(it["type"] == "TextFrame" and it.get("fontSize") for it in items)
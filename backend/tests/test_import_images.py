@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import io
+
+import fitz
+from PIL import Image
+
+from app.models.models import Asset
+from app.services.pdf_importer import import_pdf_to_document
+
+def _image_refs(document):
+    return [[it["assetRef"] for layer in page["layers"] for it in layer["items"] if it.get("role") == "imported_image"]
+            for page in document["pages"]]
+
+def _png(im: Image.Image, level: int) -> bytes:
+    buf = io.BytesIO()
+    im.save(buf, format="PNG", compress_level=level)
+    return buf.getvalue()
+
+def test_image_shared_by_pages_is_stored_once(db, make_pdf):
+    document, ids = import_pdf_to_document(db, "c", make_pdf(["shared", "flat", "shared", "shared"]))
+    refs = _image_refs(document)
+    assert refs[1] == [] and len({r for page in refs for r in page}) == 1
+    assert len(ids) == 4 + 1
+
+def test_identical_pixels_under_different_xrefs_are_stored_once(db, tmp_path):
+    im = Image.effect_noise((120, 80), 50).convert("RGB")
+    pdf = fitz.open()
+    for level in (1, 9):
+        # Different streams (so different xrefs), same pixels.
+        pdf.new_page().insert_image(fitz.Rect(50, 50, 290, 210), stream=_png(im, level))
+    path = str(tmp_path / "twice.pdf")
+    pdf.save(path)
+    with fitz.open(path) as check:
+        assert check.get_page_images(0)[0][0] != check.get_page_images(1)[0][0]
+    document, _ids = import_pdf_to_document(db, "c", path)
+    (a,), (b,) = _image_refs(document)
+    assert a == b
+
+def test_resumed_pages_share_their_images(db, make_pdf):
+    path = make_pdf(["shared", "photo", "shared", "flat", "shared"])
+    per_page = {}
+    first, _ids = import_pdf_to_document(db, "c", path, on_page=lambda i, page, ids: per_page.update({i: (page, ids)}))
+    db.commit()
+    before = db.query(Asset).count()
+    resume = {i: per_page[i] for i in (0, 1)}
+    document, ids = import_pdf_to_document(db, "c", path, resume=resume)
+    refs = _image_refs(document)
+    # Later pages frame the image stored by the resumed page 1, not a new copy.
+    assert refs[2] == refs[4] == refs[0] == _image_refs(first)[0]
+    new = db.query(Asset).count() - before
+    assert new == 3  # only the three new backgrounds
+    assert set(ids) >= set(resume[0][1]) | set(resume[1][1])
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import io
+import os
+
+import fitz
+import pytest
+from PIL import Image
+
+from app.core.settings import settings
+from app.services import pdf_importer
+
+def _rss_mb() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 2**20
+
+@pytest.fixture
+def noisy_pdf(tmp_path):
+    """Twelve pages, each a full-page 1400x1000 photo that does not compress away."""
+    pdf = fitz.open()
+    for _ in range(12):
+        buf = io.BytesIO()
+        Image.effect_noise((1400, 1000), 80).convert("RGB").save(buf, format="JPEG", quality=80)
+        pdf.new_page().insert_image(fitz.Rect(0, 0, 595, 842), stream=buf.getvalue())
+    path = str(tmp_path / "photos.pdf")
+    pdf.save(path)
+    return path
+
+def _extract(path, indices):
+    pdf_importer._discard_results(pdf_importer._extract_pages((path, tuple(indices), "safe", frozenset(range(1000)))))
+
+def test_store_is_shrunk_after_every_page(noisy_pdf, monkeypatch, storage_dir):
+    calls = []
+    monkeypatch.setattr(pdf_importer.fitz.TOOLS, "store_shrink", lambda pct: calls.append(pct))
+    _extract(noisy_pdf, range(4))
+    assert calls == [100] * 4
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc to read RSS")
+def test_memory_stays_flat_across_pages(noisy_pdf, monkeypatch, storage_dir):
+    monkeypatch.setattr(settings, "IMPORT_RASTER_DPI", 36)
+    _extract(noisy_pdf, range(3))  # warm up allocator and MuPDF tables
+    before = _rss_mb()
+    _extract(noisy_pdf, range(3, 12))
+    # Without store_shrink the nine decoded photos stay cached (~45 MB here).
+    assert _rss_mb() - before < 16
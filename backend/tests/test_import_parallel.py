@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from app.models.models import Asset
+from app.services import pdf_importer
+from app.services.pdf_importer import PAGES_PER_TASK, import_pdf_to_document
+
+KINDS = ["photo", "shared", "flat", "shared", "photo", "flat", "shared", "flat", "photo"]
+
+def _by_content(db, document):
+    """The document with asset ids replaced by content hashes (ids differ per run)."""
+    hashes = dict(db.query(Asset.id, Asset.content_hash))
+    return [[(it["id"], it["type"], hashes.get(it.get("assetRef")), it.get("rect")) for layer in page["layers"] for it in layer["items"]]
+            for page in document["pages"]]
+
+def test_parallel_import_matches_serial(db, make_pdf, monkeypatch):
+    # More than one task per worker, and more workers than this machine may have.
+    assert len(KINDS) > 2 * PAGES_PER_TASK
+    monkeypatch.setattr(pdf_importer.os, "cpu_count", lambda: 4)
+    path = make_pdf(KINDS)
+    serial, serial_ids = import_pdf_to_document(db, "c", path, workers=1)
+    parallel, parallel_ids = import_pdf_to_document(db, "c", path, workers=3)
+    assert len(parallel["pages"]) == len(KINDS)
+    assert _by_content(db, parallel) == _by_content(db, serial)
+    assert len(parallel_ids) == len(serial_ids) == len(set(parallel_ids))
+    # A background per page, each photo as an image frame, the shared image once.
+    assert len(serial_ids) == len(KINDS) + KINDS.count("photo") + 1
+
+def test_default_is_serial(monkeypatch):
+    monkeypatch.setattr(pdf_importer.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(pdf_importer.settings, "IMPORT_PARALLELISM", 1)
+    assert pdf_importer.import_parallelism() == 1
+    monkeypatch.setattr(pdf_importer.settings, "IMPORT_PARALLELISM", 0)
+    assert pdf_importer.import_parallelism() == 8
+    assert pdf_importer.import_parallelism(16) == 8
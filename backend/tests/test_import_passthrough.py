@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import io
+
+import fitz
+import pytest
+from PIL import Image
+
+from app.models.models import Asset
+from app.services import pdf_importer, storage
+from app.services.pdf_importer import _convert_image, import_pdf_to_document
+
+def _images(db, document):
+    ids = [it["assetRef"] for page in document["pages"] for layer in page["layers"] for it in layer["items"] if it.get("role") == "imported_image"]
+    return [db.get(Asset, a) for a in ids]
+
+def test_plain_jpeg_is_stored_byte_for_byte(db, make_pdf):
+    document, _ids = import_pdf_to_document(db, "c", make_pdf(["shared"]))
+    (asset,) = _images(db, document)
+    assert asset.mime == "image/jpeg"
+    with open(storage.get_local_path(asset.id, db), "rb") as f:
+        assert f.read() == make_pdf.shared_jpeg
+
+def test_cmyk_jpeg_is_converted_to_rgb(db, make_pdf):
+    document, _ids = import_pdf_to_document(db, "c", make_pdf(["cmyk"]))
+    (asset,) = _images(db, document)
+    assert asset.mime == "image/jpeg"
+    with Image.open(storage.get_local_path(asset.id, db)) as im:
+        assert im.mode == "RGB" and im.size == (300, 200)
+
+def test_jpeg_with_soft_mask_keeps_its_transparency(db, tmp_path):
+    photo, mask = io.BytesIO(), io.BytesIO()
+    Image.new("RGB", (200, 100), (200, 40, 40)).save(photo, format="JPEG")
+    Image.new("L", (200, 100), 128).save(mask, format="PNG")
+    pdf = fitz.open()
+    pdf.new_page().insert_image(fitz.Rect(50, 50, 250, 150), stream=photo.getvalue(), mask=mask.getvalue())
+    path = str(tmp_path / "masked.pdf")
+    pdf.save(path)
+    document, _ids = import_pdf_to_document(db, "c", path)
+    (asset,) = _images(db, document)
+    assert asset.mime == "image/png"
+    with Image.open(storage.get_local_path(asset.id, db)) as im:
+        assert im.mode in ("RGBA", "LA") and im.getchannel("A").getextrema() == (128, 128)
+
+class _Undecodable:
+    """A document whose image MuPDF can list but not decode."""
+
+    def __init__(self, ext):
+        self.ext = ext
+
+    def extract_image(self, xref):
+        return {"image": b"raw stream", "ext": self.ext, "colorspace": 3, "smask": 0}
+
+    def xref_get_key(self, xref, key):
+        return ("null", "null")
+
+@pytest.mark.parametrize("ext, expected", [("png", "png"), ("jpx", None), ("jbig2", None)])
+def test_undecodable_streams_are_kept_only_when_browsers_read_them(monkeypatch, ext, expected):
+    def broken(*args):
+        raise RuntimeError("cannot decode")
+    monkeypatch.setattr(pdf_importer.fitz, "Pixmap", broken)
+    converted = _convert_image(_Undecodable(ext), 7)
+    if expected is None:
+        assert converted is None
+    else:
+        assert converted[0] == b"raw stream" and converted[2] == expected
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from rq import Retry, SimpleWorker
+
+from app.core import queue
+from app.core.settings import settings
+from app.jobs import import_pdf_job
+from app.models.models import Asset, Club, Project, User
+from app.services import import_checkpoint, pdf_importer, storage
+
+KINDS = ["photo", "shared", "flat", "shared", "photo", "shared", "flat"]
+
+@pytest.fixture
+def club(db):
+    user = User(email="owner@example.com", password_hash="-")
+    db.add(user)
+    db.flush()
+    club = Club(owner_id=user.id, name="Club")
+    db.add(club)
+    db.commit()
+    return club
+
+def _upload(db, path: str) -> Asset:
+    with open(path, "rb") as f:
+        source = storage.store_asset(db, f.read(), "revista.pdf", "application/pdf", kind="upload")
+    db.commit()
+    return source
+
+def test_checkpoint_round_trip(db, fake_redis):
+    a = storage.store_asset(db, b"bg", "bg.png", "image/png", kind="import")
+    b = storage.store_asset(db, b"bg2", "bg2.png", "image/png", kind="import")
+    db.commit()
+    import_checkpoint.save_page("job", 0, {"id": "p-0"}, [a.id])
+    import_checkpoint.save_page("job", 1, {"id": "p-1"}, [b.id])
+    storage.delete_asset(db, b)
+    db.commit()
+    # Page 1 lost its asset (e.g. swept): it is imported again.
+    assert import_checkpoint.load_checkpoint(db, "job") == ({0: ({"id": "p-0"}, [a.id])}, None)
+    import_checkpoint.save_result("job", {"ok": True})
+    assert import_checkpoint.load_checkpoint(db, "job") == ({}, {"ok": True})
+
+def test_retried_job_resumes_after_the_last_checkpoint(db, fake_redis, club, make_pdf, monkeypatch):
+    source_id = _upload(db, make_pdf(KINDS)).id
+    built = []
+    build_page = pdf_importer._build_page
+    def crash_once_on_page_5(db_, club_id, i, *args):
+        built.append(i)
+        if i == 4 and built.count(4) == 1:
+            raise RuntimeError("worker died")
+        return build_page(db_, club_id, i, *args)
+    monkeypatch.setattr(pdf_importer, "_build_page", crash_once_on_page_5)
+
+    job = queue.q.enqueue(import_pdf_job, club.id, source_id, "revista.pdf", "safe", "smart", settings.DATABASE_URL, retry=Retry(max=1))
+    SimpleWorker([queue.q], connection=fake_redis).work(burst=True)
+    job.refresh()
+    assert job.result["ok"] and job.result["resumed_pages"] == 4
+    # Finished pages were not extracted or built again.
+    assert built == [0, 1, 2, 3, 4, 4, 5, 6]
+
+    db.expire_all()
+    proj = db.get(Project, job.result["project_id"])
+    pages = json.loads(proj.document_json)["pages"]
+    assert [p["id"] for p in pages] == [f"p-{i}" for i in range(len(KINDS))]
+    # Every page kept its text and background, and the source upload is gone.
+    assert all(any(it["type"] == "TextFrame" for layer in p["layers"] for it in layer["items"]) for p in pages)
+    assert db.get(Asset, source_id) is None
+    # The result replaced the page checkpoints, so a rerun returns it without importing.
+    assert import_checkpoint.load_checkpoint(db, job.id) == ({}, job.result)
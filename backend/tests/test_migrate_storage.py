@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+import uuid
+
+from app.models.models import Asset
+from app.services import storage
+from scripts import migrate_storage
+
+def _legacy(db, storage_dir, storage_path_for, ext=".png", flat=True) -> Asset:
+    aid = uuid.uuid4().hex
+    key = storage.shard_key(aid, ext)
+    path = os.path.join(storage_dir, f"{aid}{ext}") if flat else storage.key_to_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(aid.encode())
+    a = Asset(id=aid, filename=f"x{ext}", mime="image/png", storage_path=storage_path_for(aid, path))
+    db.add(a)
+    db.commit()
+    return a
+
+def test_relative_and_bare_paths_are_rewritten_to_shard_keys(db, storage_dir):
+    rel = _legacy(db, storage_dir, lambda aid, p: f"./data/storage/{aid}.png", flat=False)
+    bare = _legacy(db, storage_dir, lambda aid, p: aid, flat=False)
+    absolute = _legacy(db, storage_dir, lambda aid, p: os.path.join("/old/root", f"{aid}.png"), flat=False)
+    done = _legacy(db, storage_dir, lambda aid, p: storage.shard_key(aid, ".png"), flat=False)
+    other = _legacy(db, storage_dir, lambda aid, p: "somewhere/else.png", flat=False)
+    assert migrate_storage._normalise_rows(db, dry_run=False) == 3
+    for a in (rel, bare, absolute, done):
+        db.refresh(a)
+        assert a.storage_path == storage.shard_key(a.id, ".png")
+    db.refresh(other)
+    assert other.storage_path == "somewhere/else.png"
+
+def test_migration_shards_and_folds_flat_files(db, storage_dir):
+    rel = _legacy(db, storage_dir, lambda aid, p: f"./data/storage/{aid}.png")
+    absolute = _legacy(db, storage_dir, lambda aid, p: os.path.abspath(p))
+    migrate_storage.main()
+    db.expire_all()
+    assert not [e for e in os.scandir(storage_dir) if e.is_file()]
+    for a in (rel, absolute):
+        a = db.get(Asset, a.id)
+        assert a.content_hash and a.storage_path.startswith(a.content_hash[:2] + "/")
+        assert open(storage.get_local_path(a.id, db), "rb").read() == a.id.encode()
+    migrate_storage.main()  # re-running is a no-op
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services.pdf_exporter import select_pages
+
+def test_nothing_selected_means_whole_document():
+    assert select_pages(12) is None
+    assert select_pages(12, "", None) is None
+
+@pytest.mark.parametrize("pages, expected", [
+    ("3", [2]),
+    ("1-4", [0, 1, 2, 3]),
+    ("1-2,5,9-10", [0, 1, 4, 8, 9]),
+    (" 2 - 3 , 3 ", [1, 2]),       # spaces ignored, overlaps merged
+    ("7,2", [1, 6]),               # always in document order
+    ("1,,4", [0, 3]),              # empty parts skipped
+])
+def test_page_ranges(pages, expected):
+    assert select_pages(12, pages) == expected
+
+@pytest.mark.parametrize("pages", ["a", "1-b", "1-2-3", "-3"])
+def test_malformed_ranges(pages):
+    with pytest.raises(ValueError, match="Invalid page range|outside"):
+        select_pages(12, pages)
+
+@pytest.mark.parametrize("pages", ["0", "13", "4-2", "10-13"])
+def test_out_of_range(pages):
+    with pytest.raises(ValueError, match="outside 1-12"):
+        select_pages(12, pages)
+
+@pytest.mark.parametrize("spread, expected", [
+    (1, [0]),          # the cover stands alone
+    (2, [1, 2]),
+    (3, [1, 2]),
+    (12, [11]),        # last even page has no right-hand partner
+    (11, [9, 10]),
+])
+def test_spreads(spread, expected):
+    assert select_pages(12, spread=spread) == expected
+
+def test_spread_and_ranges_combine():
+    assert select_pages(12, "1,5", spread=6) == [0, 4, 5, 6]
+
+@pytest.mark.parametrize("spread", [13, -1])
+def test_spread_out_of_range(spread):
+    with pytest.raises(ValueError, match="Spread page"):
+        select_pages(12, spread=spread)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+from PIL import Image
+
+from app.models.models import Asset
+from app.services import storage
+from app.services.renditions import RENDITION_SIZES, generate_renditions, pick_rendition, rendition_map
+
+def _image(db, size, fmt="JPEG", mode="RGB") -> Asset:
+    buf = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128)[:len(mode)]).save(buf, format=fmt)
+    ext = "jpg" if fmt == "JPEG" else fmt.lower()
+    a = storage.store_asset(db, buf.getvalue(), f"photo.{ext}", f"image/{'jpeg' if fmt == 'JPEG' else ext}", club_id="c")
+    db.commit()
+    return a
+
+def test_large_photo_gets_every_rendition(db):
+    a = _image(db, (4000, 3000))
+    created = generate_renditions(db, a)
+    db.commit()
+    by_name = {r.rendition: r for r in created}
+    assert set(by_name) == set(RENDITION_SIZES)
+    for name, px in RENDITION_SIZES.items():
+        r = by_name[name]
+        assert (r.parent_id, r.kind, r.mime) == (a.id, "rendition", "image/jpeg")
+        assert max(r.width, r.height) == px
+        with Image.open(storage.get_local_path(r.id, db)) as im:
+            assert im.size == (r.width, r.height)
+    assert (a.width, a.height) == (4000, 3000)
+    # Already there: nothing new.
+    assert generate_renditions(db, a) == []
+
+def test_small_image_only_gets_smaller_sizes(db):
+    a = _image(db, (800, 600))
+    assert [r.rendition for r in generate_renditions(db, a)] == ["thumb"]
+    assert (a.width, a.height) == (800, 600)
+
+def test_alpha_stays_png(db):
+    a = _image(db, (2000, 1000), fmt="PNG", mode="RGBA")
+    assert {r.mime for r in generate_renditions(db, a)} == {"image/png"}
+
+@pytest.mark.parametrize("kind, mime", [("export", "application/pdf"), ("rendition", "image/jpeg"), ("upload", "application/pdf")])
+def test_non_images_and_derivatives_are_skipped(db, kind, mime):
+    a = storage.store_asset(db, b"%PDF-1.4", "x.pdf", mime, kind=kind)
+    assert generate_renditions(db, a) == []
+
+def test_pick_rendition_and_rendition_map(db):
+    a = _image(db, (4000, 3000))
+    by_name = {r.rendition: r.id for r in generate_renditions(db, a)}
+    db.commit()
+    assert pick_rendition(db, a.id, None) == a.id
+    assert pick_rendition(db, a.id, 200) == by_name["thumb"]
+    assert pick_rendition(db, a.id, 1000) == by_name["screen"]
+    assert pick_rendition(db, a.id, 2000) == a.id
+    assert rendition_map(db, [a.id, "missing", None], "screen") == {a.id: by_name["screen"]}
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import fitz
+import pytest
+from PIL import Image
+
+from app.services import pdf_exporter
+from app.services.pdf_exporter import QUALITY_PROFILES, SIZE_STEP, _resampled_image, export_document_to_file
+
+@pytest.fixture(autouse=True)
+def cache_dir(storage_dir, monkeypatch):
+    monkeypatch.setattr(pdf_exporter, "_resample_cache", None)
+
+def _photo(tmp_path, size=(3000, 2000), fmt="JPEG", name="photo.jpg") -> str:
+    path = str(tmp_path / name)
+    Image.new("RGB", size, (20, 120, 200)).save(path, format=fmt)
+    return path
+
+def _target(frame_pt: float, dpi: int) -> int:
+    need = int(frame_pt / 72.0 * dpi)
+    return -(-need // SIZE_STEP) * SIZE_STEP
+
+@pytest.mark.parametrize("quality", ["web", "screen", "print"])
+def test_downsampled_to_profile_dpi(tmp_path, quality):
+    src = _photo(tmp_path)
+    # 300 x 200 pt frame, same aspect as the source.
+    out = _resampled_image(src, fitz.Rect(0, 0, 300, 200), QUALITY_PROFILES[quality])
+    assert out != src
+    with Image.open(out) as im:
+        assert max(im.size) == _target(300, QUALITY_PROFILES[quality]["dpi"])
+        assert im.format == "JPEG"
+
+def test_never_upscaled(tmp_path):
+    src = _photo(tmp_path, size=(400, 300))
+    assert _resampled_image(src, fitz.Rect(0, 0, 300, 200), QUALITY_PROFILES["print"]) == src
+
+def test_close_to_target_is_left_alone(tmp_path):
+    # Within RESAMPLE_THRESHOLD of the web target (300pt @ 96 dpi = 400px).
+    src = _photo(tmp_path, size=(480, 320))
+    assert _resampled_image(src, fitz.Rect(0, 0, 300, 200), QUALITY_PROFILES["web"]) == src
+
+def test_non_native_formats_are_always_reencoded(tmp_path):
+    src = _photo(tmp_path, size=(400, 300), fmt="WEBP", name="bg.webp")
+    out = _resampled_image(src, fitz.Rect(0, 0, 300, 200), QUALITY_PROFILES["print"])
+    with Image.open(out) as im:
+        assert im.format == "JPEG" and im.size == (400, 300)
+
+def test_cache_key_is_source_size_and_quality(tmp_path, monkeypatch):
+    src = _photo(tmp_path)
+    web = QUALITY_PROFILES["web"]
+    first = _resampled_image(src, fitz.Rect(0, 0, 300, 200), web)
+    # Frames within one SIZE_STEP share the entry, and it is not encoded again.
+    saves = []
+    save = Image.Image.save
+    monkeypatch.setattr(Image.Image, "save", lambda self, *a, **k: (saves.append(a), save(self, *a, **k))[1])
+    assert _resampled_image(src, fitz.Rect(0, 0, 310, 205), web) == first
+    assert saves == []
+    assert _resampled_image(src, fitz.Rect(0, 0, 300, 200), {**web, "jpeg_quality": 50}) != first
+    assert _resampled_image(src, fitz.Rect(0, 0, 600, 400), web) != first
+    other = _photo(tmp_path, name="other.jpg")
+    assert _resampled_image(other, fitz.Rect(0, 0, 300, 200), web) != first
+
+def test_exported_image_follows_quality(tmp_path):
+    src = _photo(tmp_path)
+    doc = {"pages": [{"layers": [{"items": [{"type": "ImageFrame", "assetRef": "a", "rect": {"x": 0, "y": 0, "w": 300, "h": 200}}]}]}]}
+    widths = {}
+    for quality in ("web", "print"):
+        out = str(tmp_path / f"{quality}.pdf")
+        export_document_to_file(doc, {"a": src}.get, out, quality=quality)
+        with fitz.open(out) as pdf:
+            (img,) = pdf.get_page_images(0)
+            widths[quality] = img[2]
+    assert widths == {"web": _target(300, 96), "print": _target(300, 300)}
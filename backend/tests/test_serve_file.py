@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import os
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api.files import _parse_range, serve_file
+from app.core.settings import settings
+
+CONTENT = bytes(range(256)) * 10  # 2560 bytes
+ETAG = '"abc123"'
+
+@pytest.fixture
+def stored(storage_dir):
+    os.makedirs(storage_dir / "ab", exist_ok=True)
+    path = storage_dir / "ab" / "file.bin"
+    path.write_bytes(CONTENT)
+    return str(path)
+
+@pytest.fixture
+def client(stored):
+    app = FastAPI()
+
+    @app.get("/f")
+    def get_file(request: Request):
+        return serve_file(request, stored, "abc123", media_type="application/octet-stream", filename="a.bin")
+
+    return TestClient(app)
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 2559)),
+    ("bytes=-100", (2460, 2559)),
+    ("bytes=-5000", (0, 2559)),      # suffix longer than the file
+    ("bytes=2500-9999", (2500, 2559)),  # end clamped
+    ("bytes=-", None),
+    ("bytes=0-1,5-6", None),          # multi-range: whole file
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, 2560) == expected
+
+@pytest.mark.parametrize("header", ["bytes=2560-", "bytes=5-2", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        _parse_range(header, 2560)
+
+def test_full_response_headers(client):
+    r = client.get("/f")
+    assert r.status_code == 200 and r.content == CONTENT
+    assert r.headers["etag"] == ETAG
+    assert r.headers["accept-ranges"] == "bytes"
+    assert "immutable" in r.headers["cache-control"]
+    assert r.headers["content-disposition"] == 'attachment; filename="a.bin"'
+
+@pytest.mark.parametrize("inm", [ETAG, f'"x", {ETAG}', f"W/{ETAG}", "*"])
+def test_if_none_match(client, inm):
+    r = client.get("/f", headers={"If-None-Match": inm})
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == ETAG
+
+def test_if_none_match_other_etag(client):
+    assert client.get("/f", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_if_modified_since(client, stored):
+    mtime = os.stat(stored).st_mtime
+    assert client.get("/f", headers={"If-Modified-Since": formatdate(mtime + 60, usegmt=True)}).status_code == 304
+    assert client.get("/f", headers={"If-Modified-Since": formatdate(mtime - 60, usegmt=True)}).status_code == 200
+    # If-None-Match takes precedence over If-Modified-Since.
+    r = client.get("/f", headers={"If-None-Match": '"other"', "If-Modified-Since": formatdate(mtime + 60, usegmt=True)})
+    assert r.status_code == 200
+
+def test_range_request(client):
+    r = client.get("/f", headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.content == CONTENT[10:20]
+    assert r.headers["content-range"] == "bytes 10-19/2560"
+    assert r.headers["content-length"] == "10"
+
+def test_suffix_range(client):
+    r = client.get("/f", headers={"Range": "bytes=-3"})
+    assert r.status_code == 206 and r.content == CONTENT[-3:]
+    assert r.headers["content-range"] == "bytes 2557-2559/2560"
+
+def test_unsatisfiable_range(client):
+    r = client.get("/f", headers={"Range": "bytes=9999-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == "bytes */2560"
+
+def test_if_range(client):
+    r = client.get("/f", headers={"Range": "bytes=0-9", "If-Range": ETAG})
+    assert r.status_code == 206 and r.content == CONTENT[:10]
+    # A stale validator gets the whole (changed) representation.
+    r = client.get("/f", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert r.status_code == 200 and r.content == CONTENT
+
+@pytest.mark.parametrize("mode, header", [("x-accel", "x-accel-redirect"), ("x-sendfile", "x-sendfile")])
+def test_proxy_offload(client, stored, monkeypatch, mode, header):
+    monkeypatch.setattr(settings, "STORAGE_SERVE_MODE", mode)
+    r = client.get("/f", headers={"Range": "bytes=0-9"})
+    assert r.status_code == 200 and r.content == b""
+    assert r.headers["etag"] == ETAG
+    if mode == "x-accel":
+        assert r.headers[header] == "/_storage/ab/file.bin"
+    else:
+        assert r.headers[header] == os.path.abspath(stored)
+
+def test_non_ascii_filename(stored):
+    app = FastAPI()
+
+    @app.get("/f")
+    def get_file(request: Request):
+        return serve_file(request, stored, "abc123", filename="revista ñ.pdf")
+
+    r = TestClient(app).get("/f")
+    assert r.headers["content-disposition"] == "attachment; filename*=utf-8''revista%20%C3%B1.pdf"
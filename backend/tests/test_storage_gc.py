@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.db import SessionLocal
+from app.core.settings import settings
+from app.jobs import storage_gc_job
+from app.models.models import Asset, Blob, Project
+from app.services import storage, storage_gc
+from app.services.storage_gc import collect_garbage, gc_lock
+
+OLD = datetime.utcnow() - timedelta(days=30)
+
+def _asset(db, content: bytes, created_at=OLD) -> Asset:
+    a = storage.store_asset(db, content, "a.png", "image/png", club_id="c")
+    a.created_at = created_at
+    db.commit()
+    return a
+
+def _project(db, *asset_ids: str) -> Project:
+    doc = {"pages": [{"layers": [{"items": [{"type": "ImageFrame", "assetRef": a} for a in asset_ids]}]}]}
+    p = Project(club_id="c", name="p", document_json=json.dumps(doc))
+    db.add(p)
+    db.commit()
+    return p
+
+def _old_file(key: str, content: bytes = b"x") -> str:
+    path = storage.key_to_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    old = time.time() - 30 * 86400
+    os.utime(path, (old, old))
+    return path
+
+def test_orphan_asset_is_deleted(db):
+    a = _asset(db, b"orphan")
+    path = storage.key_to_path(a.storage_path)
+    stats = collect_garbage(db)
+    assert stats["unreferenced_assets"] == 1
+    assert db.query(Asset).count() == 0 and db.query(Blob).count() == 0
+    assert not os.path.exists(path)
+
+def test_referenced_asset_and_live_blob_are_kept(db):
+    used = _asset(db, b"shared")
+    dup = _asset(db, b"shared")
+    _project(db, used.id)
+    stats = collect_garbage(db)
+    assert stats["unreferenced_assets"] == 1
+    assert db.get(Asset, used.id) is not None and db.get(Asset, dup.id) is None
+    assert db.get(Blob, used.content_hash).refcount == 1
+    assert os.path.exists(storage.key_to_path(used.storage_path))
+
+def test_recent_assets_are_kept(db):
+    a = _asset(db, b"just uploaded", created_at=datetime.utcnow())
+    assert collect_garbage(db)["unreferenced_assets"] == 0
+    assert db.get(Asset, a.id) is not None
+
+def test_dry_run_deletes_nothing(db):
+    a = _asset(db, b"orphan")
+    blob = db.get(Blob, a.content_hash)
+    zero = storage.acquire_blob(db, b"zero", "z.bin")
+    db.commit()
+    db.query(Blob).filter(Blob.sha256 == zero[0]).update({"refcount": 0})
+    db.commit()
+    loose = _old_file(storage.shard_key(uuid.uuid4().hex, ".pdf"))
+    stats = collect_garbage(db, dry_run=True)
+    assert (stats["unreferenced_assets"], stats["orphan_blobs"], stats["orphan_files"]) == (1, 1, 1)
+    assert db.get(Asset, a.id) is not None and db.query(Blob).count() == 2
+    assert os.path.exists(storage.key_to_path(blob.storage_path)) and os.path.exists(loose)
+
+def test_asset_placed_during_the_run_is_kept(db, monkeypatch):
+    a = _asset(db, b"placed late")
+    snapshot = storage_gc.referenced_asset_ids
+    def snapshot_then_save(session):
+        refs = snapshot(session)
+        # A user saves a project placing the asset after the snapshot was taken.
+        other = SessionLocal()
+        _project(other, a.id)
+        other.close()
+        return refs
+    monkeypatch.setattr(storage_gc, "referenced_asset_ids", snapshot_then_save)
+    assert collect_garbage(db)["unreferenced_assets"] == 0
+    assert db.get(Asset, a.id) is not None
+
+def test_unowned_shard_files_are_swept(db):
+    owned = _asset(db, b"owned")
+    _project(db, owned.id)
+    legacy_export = _old_file(storage.shard_key(uuid.uuid4().hex, ".pdf"))
+    fresh = storage.key_to_path(storage.shard_key(uuid.uuid4().hex, ".pdf"))
+    os.makedirs(os.path.dirname(fresh), exist_ok=True)
+    open(fresh, "wb").close()
+    # Row-less but still mentioned by a document (pre-blob upload).
+    mentioned = uuid.uuid4().hex
+    kept = _old_file(storage.shard_key(mentioned, ".png"))
+    _project(db, mentioned)
+    os.utime(storage.key_to_path(owned.storage_path), (0, 0))
+    assert collect_garbage(db)["orphan_files"] == 1
+    assert not os.path.exists(legacy_export)
+    assert os.path.exists(fresh) and os.path.exists(kept)
+    assert os.path.exists(storage.key_to_path(owned.storage_path))
+
+def test_lock_prevents_concurrent_runs(db, fake_redis):
+    a = _asset(db, b"orphan")
+    with gc_lock():
+        with pytest.raises(storage_gc.GCAlreadyRunning):
+            with gc_lock():
+                pass
+        assert storage_gc_job(settings.DATABASE_URL) == {"ok": False, "error": "Storage GC is already running"}
+    db.expire_all()
+    assert db.get(Asset, a.id) is not None
+    result = storage_gc_job(settings.DATABASE_URL)
+    assert result["ok"] and result["unreferenced_assets"] == 1
+    assert not fake_redis.exists(storage_gc.GC_LOCK_KEY)
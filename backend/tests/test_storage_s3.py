@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import os
+import urllib.request
+
+import pytest
+
+moto_server = pytest.importorskip("moto.server")
+
+from app.core.settings import settings  # noqa: E402
+from app.models.models import Blob  # noqa: E402
+from app.services import storage, storage_backends  # noqa: E402
+from app.services.storage_backends import DiskCache  # noqa: E402
+
+MB = 1024 * 1024
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.stop()
+
+@pytest.fixture
+def s3(s3_endpoint, db, monkeypatch):
+    """STORAGE_MODE=s3 against the moto server, with an empty bucket per test."""
+    bucket = f"test-{os.urandom(4).hex()}"
+    for name, value in {
+        "STORAGE_MODE": "s3", "S3_ENDPOINT_URL": s3_endpoint, "S3_PUBLIC_ENDPOINT_URL": "",
+        "S3_BUCKET": bucket, "S3_PREFIX": "media", "S3_ACCESS_KEY": "test", "S3_SECRET_KEY": "test",
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(storage_backends, "_backend", None)
+    backend = storage_backends.get_backend()
+    backend.client.create_bucket(Bucket=bucket)
+    yield backend
+    monkeypatch.setattr(storage_backends, "_backend", None)
+
+def _keys(backend):
+    listing = backend.client.list_objects_v2(Bucket=backend.bucket)
+    return sorted(o["Key"] for o in listing.get("Contents", []))
+
+def test_acquire_blob_deduplicates_objects(s3, db):
+    sha, key = storage.acquire_blob(db, b"same bytes", "a.png")
+    sha2, key2 = storage.acquire_blob(db, b"same bytes", "b.png")
+    db.commit()
+    assert (sha, key) == (sha2, key2)
+    assert db.get(Blob, sha).refcount == 2
+    assert _keys(s3) == [f"media/{key}"]
+
+def test_large_file_uploads_multipart(s3, db):
+    tmp = storage.new_tmp_path(".bin")
+    with open(tmp, "wb") as f:
+        f.write(os.urandom(9 * MB))
+    sha, size = storage.hash_file(tmp)
+    asset = storage.store_asset_file(db, tmp, sha, size, "big.bin", "application/octet-stream")
+    db.commit()
+    assert not os.path.exists(tmp)
+    head = s3.client.head_object(Bucket=s3.bucket, Key=f"media/{asset.storage_path}")
+    assert head["ContentLength"] == 9 * MB
+    # Multipart ETags are "<md5 of part md5s>-<parts>".
+    assert head["ETag"].strip('"').endswith("-2")
+    assert storage.hash_file(storage.get_local_path(asset.id, db)) == (sha, size)
+
+def test_presigned_get(s3, db):
+    asset = storage.store_asset(db, b"%PDF-1.4 tiny", "doc.pdf", "application/pdf")
+    db.commit()
+    url = storage.presigned_url(db, asset.id, filename="doc.pdf")
+    with urllib.request.urlopen(url) as resp:
+        assert resp.read() == b"%PDF-1.4 tiny"
+        assert resp.headers["Content-Type"] == "application/pdf"
+        assert "doc.pdf" in resp.headers["Content-Disposition"]
+
+def test_fetch_is_served_from_disk_cache(s3, db, monkeypatch):
+    asset = storage.store_asset(db, b"cached", "c.png", "image/png")
+    db.commit()
+    downloads = []
+    download = s3.client.download_file
+    monkeypatch.setattr(s3.client, "download_file", lambda *a, **k: (downloads.append(a), download(*a, **k)))
+    first = s3.fetch(asset.storage_path)
+    second = s3.fetch(asset.storage_path)
+    assert first == second and open(first, "rb").read() == b"cached"
+    assert len(downloads) == 1
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    for i, key in enumerate(("a", "b", "c")):
+        with open(cache.path(key), "wb") as f:
+            f.write(b"x" * 400)
+        os.utime(cache.path(key), (i, i))
+        cache.admit(key, 400)
+    # Over budget after "c": trimmed to 80% by dropping the oldest ("a").
+    assert cache.get("a") is None
+    assert cache.get("b") and cache.get("c")
+
+def test_delete_removes_object_and_cache(s3, db):
+    asset = storage.store_asset(db, b"bye", "d.png", "image/png")
+    db.commit()
+    cached = s3.fetch(asset.storage_path)
+    key = asset.storage_path
+    storage.delete_asset(db, asset)
+    # Nothing is deleted before the commit.
+    assert s3.exists(key)
+    db.commit()
+    assert not s3.exists(key)
+    assert not os.path.exists(cached)
+    assert _keys(s3) == []
+
+def test_pinned_path_survives_cache_eviction(s3, db):
+    asset = storage.store_asset(db, b"%PDF-1.4 long import", "big.pdf", "application/pdf")
+    db.commit()
+    with storage.pinned_local_path(asset.id, db) as path:
+        # The LRU drops the cached copy in the middle of the job.
+        os.remove(s3.cache.path(asset.storage_path))
+        assert open(path, "rb").read() == b"%PDF-1.4 long import"
+    assert not os.path.exists(path)
+
+def test_pinned_path_refetches_an_entry_evicted_before_pinning(s3, db, monkeypatch):
+    asset = storage.store_asset(db, b"evicted early", "e.pdf", "application/pdf")
+    db.commit()
+    cached = storage.get_local_path(asset.id, db)
+    get_local_path = storage.get_local_path
+    evicted = []
+    def evict_after(asset_id, session=None):
+        p = get_local_path(asset_id, session)
+        if not evicted:
+            evicted.append(p)
+            os.remove(p)
+        return p
+    monkeypatch.setattr(storage, "get_local_path", evict_after)
+    with storage.pinned_local_path(asset.id, db) as path:
+        assert open(path, "rb").read() == b"evicted early"
+    assert evicted == [cached]
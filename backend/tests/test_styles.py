@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services.styles import BLACK, StyleResolver, opacity_of, parse_color
+
+RED = (1.0, 0.0, 0.0, 1.0)
+
+@pytest.mark.parametrize("value, expected", [
+    ("#ff0000", RED),
+    ("#F00", RED),
+    ("  #ff0000  ", RED),
+    ("#ff000080", (1.0, 0.0, 0.0, 128 / 255)),
+    ("#f008", (1.0, 0.0, 0.0, 0x88 / 255)),
+    ("rgb(255, 0, 0)", RED),
+    ("rgba(255,0,0,0.5)", (1.0, 0.0, 0.0, 0.5)),
+    ("rgb(100% 0% 0% / 50%)", (1.0, 0.0, 0.0, 0.5)),
+    ("rgb(300, -5, 0)", RED),  # channels are clamped
+])
+def test_parse_color(value, expected):
+    assert parse_color(value) == pytest.approx(expected)
+
+@pytest.mark.parametrize("value", ["", "red", "#12345", "#gggggg", "rgb(1,2)", "rgb(a,b,c)", "accent"])
+def test_parse_color_rejects_non_literals(value):
+    assert parse_color(value) is None
+
+@pytest.fixture
+def resolver():
+    return StyleResolver({
+        "colorTokens": {"accent": "#ff0000", "ink": "accent", "loop": "loop", "alias": "$ink"},
+        "textStyles": {"Body": {"fontFamily": "Inter", "fontSize": 13, "color": "ink"}},
+    })
+
+@pytest.mark.parametrize("value", ["accent", "$accent", "{{colorTokens.accent}}", "ink", "alias", [255, 0, 0], [1, 0, 0, 1]])
+def test_color_tokens_and_lists(resolver, value):
+    assert resolver.color(value) == pytest.approx(RED)
+
+@pytest.mark.parametrize("value", [None, "none", "transparent", "missing", "loop", [1, 2], 42])
+def test_unset_or_invalid_colors_use_default(resolver, value):
+    assert resolver.color(value) is None
+    assert resolver.color(value, default=BLACK) == BLACK
+
+def test_opacity_is_folded_into_alpha(resolver):
+    assert resolver.color("#ff000080", opacity=0.5)[3] == pytest.approx(0.5 * 128 / 255)
+    assert resolver.color([1, 0, 0, 128], opacity=0.5)[3] == pytest.approx(0.5 * 128 / 255)
+
+def test_colors_are_memoized_per_resolver(resolver):
+    first = resolver.color("accent")
+    resolver.color_tokens["accent"] = "#00ff00"
+    assert resolver.color("accent") is first
+    assert StyleResolver({"colorTokens": {"accent": "#00ff00"}}).color("accent") == pytest.approx((0.0, 1.0, 0.0, 1.0))
+
+def test_text_style_applies_item_overrides(resolver):
+    assert resolver.text_style({"styleRef": "Body"}) == {"fontFamily": "Inter", "fontSize": 13, "color": "ink"}
+    style = resolver.text_style({"styleRef": "Body", "fontSize": 20, "fontWeight": None})
+    assert style == {"fontFamily": "Inter", "fontSize": 20, "color": "ink"}
+    # Importer/generator frames carry their color in 'fill'; an explicit 'color' wins.
+    assert resolver.text_style({"styleRef": "Body", "fill": "#000"})["color"] == "#000"
+    assert resolver.text_style({"styleRef": "Body", "fill": "#000", "color": "accent"})["color"] == "accent"
+
+def test_text_style_unknown_ref(resolver):
+    assert resolver.text_style({"styleRef": "Nope"}) == {}
+    assert resolver.text_style({"styleRef": ["not", "a", "key"], "fontSize": 9}) == {"fontSize": 9}
+
+@pytest.mark.parametrize("item, expected", [({}, 1.0), ({"opacity": 0.25}, 0.25), ({"opacity": "0.5"}, 0.5), ({"opacity": 7}, 1.0), ({"opacity": -1}, 0.0), ({"opacity": "x"}, 1.0)])
+def test_opacity_of(item, expected):
+    assert opacity_of(item) == expected